@@ -0,0 +1,252 @@
+"""
+Thin Alpha Vantage client shared by the screener, the price refresh and the EUR/USD predictor.
+Calls are spread over a pool of API keys (ALPHA_VANTAGE_API_KEYS="k1,k2,...", or the single
+ALPHA_VANTAGE_API_KEY), each drawing from its own cross-process token bucket. Throttle payloads
+("Note" / "Information") cool the offending key down and are surfaced as AlphaVantageThrottled.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+import requests
+from dotenv import load_dotenv
+from rate_limiter import TokenBucket
+from av_cache import ResponseCache, get_response_cache
+
+load_dotenv()
+
+BASE_URL = 'https://www.alphavantage.co/query'
+
+# Free tier: 5 calls / minute. Premium plans raise this via the environment.
+# Quotas are per key: the pool throughput grows with the number of keys.
+CALLS_PER_MINUTE = float(os.getenv('ALPHA_VANTAGE_CALLS_PER_MINUTE', '5'))
+# Optional daily quota per key (0 = none), enforced as a slowly refilled bucket
+CALLS_PER_DAY = float(os.getenv('ALPHA_VANTAGE_CALLS_PER_DAY', '0'))
+THROTTLE_BACKOFF = float(os.getenv('ALPHA_VANTAGE_THROTTLE_BACKOFF', '60'))
+DAILY_THROTTLE_BACKOFF = float(os.getenv('ALPHA_VANTAGE_DAILY_THROTTLE_BACKOFF', '3600'))
+# Seconds before retrying an HTTP 5xx (times the attempt number)
+SERVER_ERROR_BACKOFF = float(os.getenv('ALPHA_VANTAGE_SERVER_ERROR_BACKOFF', '5'))
+
+_THROTTLE_PATTERN = re.compile(r'call frequency|rate limit|requests per (day|minute)|calls per (day|minute)', re.IGNORECASE)
+_DAILY_PATTERN = re.compile(r'per day|daily', re.IGNORECASE)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class AlphaVantageThrottled(Exception):
+    """The API answered with a throttle note instead of data."""
+
+    def __init__(self, message: str, retry_after: float = THROTTLE_BACKOFF):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def configured_api_keys() -> List[str]:
+    raw = os.getenv('ALPHA_VANTAGE_API_KEYS') or os.getenv('ALPHA_VANTAGE_API_KEY') or ''
+    return list(dict.fromkeys(key.strip() for key in raw.split(',') if key.strip()))
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Short stable identifier of a key, safe to log and to expose (the key itself never is)."""
+    return hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:8]
+
+
+class ApiKeyPool:
+    """
+    Round-robin over API keys. Each key has its own per-minute bucket (and optional
+    daily bucket), shared across processes through the bucket state files; a key that
+    gets a throttle note is blocked for the backoff while the others keep serving.
+    Usage counters are kept per process.
+    """
+
+    def __init__(self, keys: Iterable[Optional[str]], rate_per_minute: float = CALLS_PER_MINUTE,
+                 calls_per_day: float = CALLS_PER_DAY, state_dir: Optional[str] = None):
+        self.keys = list(dict.fromkeys(keys)) or [None]
+        self._minute = {k: TokenBucket(f"alpha_vantage_{key_id(k)}", rate_per_minute, state_dir=state_dir) for k in self.keys}
+        self._daily = {
+            k: TokenBucket(f"alpha_vantage_{key_id(k)}_day", calls_per_day / 1440.0, capacity=calls_per_day, state_dir=state_dir)
+            for k in self.keys
+        } if calls_per_day else {}
+        self._counters = {k: {'calls': 0, 'throttled': 0, 'errors': 0, 'last_used': None, 'cooldown_until': 0.0} for k in self.keys}
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _try_key(self, key) -> float:
+        wait = self._minute[key].try_acquire()
+        if wait > 0 or key not in self._daily:
+            return wait
+        wait = self._daily[key].try_acquire()
+        if wait > 0:
+            # Daily quota exhausted: the minute token was not used, give it back
+            self._minute[key].refund()
+        return wait
+
+    def acquire(self) -> Optional[str]:
+        """Block until one key has quota left and return it, starting after the last key used."""
+        while True:
+            with self._lock:
+                start = self._cursor
+                self._cursor = (self._cursor + 1) % len(self.keys)
+            waits = []
+            for i in range(len(self.keys)):
+                key = self.keys[(start + i) % len(self.keys)]
+                wait = self._try_key(key)
+                if wait <= 0:
+                    with self._lock:
+                        counters = self._counters[key]
+                        counters['calls'] += 1
+                        counters['last_used'] = datetime.now(timezone.utc).isoformat()
+                    return key
+                waits.append(wait)
+            time.sleep(min(waits))
+
+    def penalize(self, key, message: str = ''):
+        """Take `key` out of rotation: a minute for a frequency note, longer for a daily quota note."""
+        # The per-minute note also quotes the daily quota: only a note without "per minute" is a daily one
+        daily = bool(_DAILY_PATTERN.search(message or '')) and 'per minute' not in (message or '').lower()
+        backoff = DAILY_THROTTLE_BACKOFF if daily else THROTTLE_BACKOFF
+        self._minute[key].penalize(backoff)
+        with self._lock:
+            counters = self._counters[key]
+            counters['throttled'] += 1
+            counters['cooldown_until'] = max(counters['cooldown_until'], time.time() + backoff)
+
+    def record_error(self, key):
+        with self._lock:
+            self._counters[key]['errors'] += 1
+
+    def stats(self) -> List[dict]:
+        now = time.time()
+        with self._lock:
+            return [{
+                'key': key_id(key),
+                'calls': c['calls'],
+                'throttled': c['throttled'],
+                'errors': c['errors'],
+                'last_used': c['last_used'],
+                'cooldown_seconds': round(max(0.0, c['cooldown_until'] - now), 1),
+            } for key, c in self._counters.items()]
+
+
+def get_key_pool() -> ApiKeyPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ApiKeyPool(configured_api_keys())
+        return _pool
+
+
+def throttle_message(data) -> str:
+    """Return the throttle note of a payload, or '' if the payload is not a throttle answer."""
+    if not isinstance(data, dict):
+        return ''
+    for key in ('Note', 'Information'):
+        message = data.get(key)
+        if isinstance(message, str) and (key == 'Note' or _THROTTLE_PATTERN.search(message)):
+            return message
+    return ''
+
+
+class AlphaVantageClient:
+    def __init__(self, api_key: str = None, base_url: str = None, pool: ApiKeyPool = None, cache: ResponseCache = None):
+        # An explicit key gets a pool of its own; otherwise the process-wide pool from the environment
+        self.pool = pool or (ApiKeyPool([api_key]) if api_key else get_key_pool())
+        self.base_url = base_url or os.getenv('ALPHA_VANTAGE_BASE_URL', BASE_URL)
+        self.cache = cache or get_response_cache()
+
+    def _throttled(self, key, params: dict, note: str):
+        print(f"  ⏳ Alpha Vantage throttled {params.get('function')} {params.get('symbol', '')} "
+              f"(key {key_id(key)}): {note[:80]}")
+        self.pool.penalize(key, note)
+
+    def _decode(self, body: str, as_text: bool):
+        return body if as_text else json.loads(body)
+
+    def query(self, params: dict, retries: int = 0, as_text: bool = False):
+        """
+        Call the API with the first pool key that has quota left.
+        Throttled answers cool that key down and raise AlphaVantageThrottled
+        after `retries` extra attempts (each retry may use another key); HTTP 5xx
+        answers are retried the same way and end in requests.HTTPError. CSV endpoints are returned as text with `as_text`.
+        Responses are served from / recorded in the on-disk cache (CacheMiss in replay mode).
+        """
+        cached = self.cache.get(params)
+        if cached is not None:
+            return self._decode(cached, as_text)
+
+        for attempt in range(retries + 1):
+            key = self.pool.acquire()
+            try:
+                response = requests.get(self.base_url, params={**params, 'apikey': key}, timeout=30)
+            except requests.RequestException:
+                self.pool.record_error(key)
+                raise
+            if not response.ok:
+                # 5xx pages are HTML, not JSON: retry them like a transient error, then raise HTTPError
+                self.pool.record_error(key)
+                if response.status_code >= 500 and attempt < retries:
+                    time.sleep(SERVER_ERROR_BACKOFF * (attempt + 1))
+                    continue
+                response.raise_for_status()
+            body = response.text
+
+            if as_text and not body.lstrip().startswith('{'):
+                if response.status_code == 200:
+                    self.cache.put(params, body)
+                return body
+
+            data = response.json()
+            note = throttle_message(data)
+            if not note:
+                if response.status_code == 200 and 'Error Message' not in data:
+                    self.cache.put(params, body)
+                else:
+                    self.pool.record_error(key)
+                return body if as_text else data
+
+            self._throttled(key, params, note)
+            if attempt == retries:
+                raise AlphaVantageThrottled(note)
+
+    def stream_csv(self, params: dict) -> Iterator[Dict[str, str]]:
+        """
+        Stream a CSV endpoint (LISTING_STATUS, EARNINGS_CALENDAR...) and parse it row by row
+        as it arrives, without buffering the whole file. Large CSVs are not cached.
+        """
+        cached = self.cache.get(params)
+        if cached is not None:
+            yield from csv.DictReader(io.StringIO(cached))
+            return
+
+        key = self.pool.acquire()
+        with requests.get(self.base_url, params={**params, 'apikey': key}, stream=True, timeout=60) as response:
+            response.raise_for_status()
+            lines = response.iter_lines(decode_unicode=True)
+            first = next(lines, '')
+            if isinstance(first, bytes):
+                first = first.decode('utf-8')
+            if first.lstrip().startswith('{'):
+                # JSON answer instead of CSV: throttle note or error message
+                data = json.loads(first + ''.join(l.decode('utf-8') if isinstance(l, bytes) else l for l in lines))
+                note = throttle_message(data)
+                if note:
+                    self._throttled(key, params, note)
+                    raise AlphaVantageThrottled(note)
+                raise ValueError(f"Unexpected answer for {params.get('function')}: {data}")
+
+            def all_lines():
+                yield first
+                for line in lines:
+                    yield line.decode('utf-8') if isinstance(line, bytes) else line
+
+            yield from csv.DictReader(all_lines())
@@ -1,13 +1,18 @@
 from flask import Flask, jsonify, request, session, redirect, url_for, render_template_string
 import os
-import json
 import threading
 from functools import wraps
 from werkzeug.security import check_password_hash
-from database import get_session, CompanyAnalysis, User
+from database import get_session, CompanyAnalysis, User, UniverseMember
 from llm_service import LLMService
 from logic import AIScreener
 from founder_service import FounderService
+from jobs import JobTracker, job_summaries, retry_dead_letters
+from alpha_vantage import get_key_pool
+from universe import UNIVERSE_MODE, get_registry, company_share_classes
+from sharding import parse_shard, shard_from_env, shard_groups, shard_kind
+from membership import member_filter, memberships
+from sqlalchemy.orm import defer
 import markdown
 import frontmatter
 from datetime import datetime
@@ -173,8 +178,8 @@ def blog_post(slug):
 
 @app.route('/api/prompt', methods=['GET'])
 def get_prompt():
-    prompt = llm_service.get_current_prompt()
-    return jsonify({"prompt": prompt})
+    prompt, version = llm_service.current_prompt()
+    return jsonify({"prompt": prompt, "version": version})
 
 @app.route('/api/prompt', methods=['POST'])
 def update_prompt():
@@ -187,9 +192,11 @@ def update_prompt():
 
 @app.route('/api/reanalyze', methods=['POST'])
 def trigger_reanalysis():
+    # ?mode=batch : soumission au Batch API (tarif batch), scores appliqués par `python llm_batch.py poll`
+    batch = request.args.get('mode') == 'batch'
     def run_screen():
         screener = AIScreener()
-        screener.reanalyze_existing_data()
+        screener.reanalyze_existing_data(batch=batch)
     
     thread = threading.Thread(target=run_screen)
     thread.start()
@@ -203,14 +210,14 @@ def get_stats():
     try:
         db_count = session.query(CompanyAnalysis).count()
         
-        # Load SP500 count
-        json_path = os.path.join(os.path.dirname(__file__), 'sp500.json')
-        with open(json_path, 'r') as f:
-            all_companies = json.load(f)
+        if UNIVERSE_MODE == 'us_listed':
+            total = session.query(UniverseMember).filter_by(status='Active').count()
+        else:
+            total = len(get_registry())
         
         return jsonify({
             "analyzed": db_count,
-            "total": len(all_companies)
+            "total": total
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -219,10 +226,36 @@ def get_stats():
 
 @app.route('/api/companies')
 def get_companies():
-    """Endpoint pour récupérer les données des entreprises depuis la base de données"""
+    """Endpoint pour récupérer les données des entreprises depuis la base de données
+
+    Paramètres optionnels (univers complet) : ?limit=&offset=&sector=&index=
+    (index : code d'un indice / ETF de index_membership, ex. IGV)
+    Sans paramètre, renvoie toute la table comme avant.
+    """
     session = get_session()
     try:
-        companies = session.query(CompanyAnalysis).all()
+        # Les colonnes JSON volumineuses ne sont pas renvoyées au frontend
+        query = session.query(CompanyAnalysis).options(
+            defer(CompanyAnalysis.analysis_json), defer(CompanyAnalysis.analysis_inputs)
+        )
+        sector = request.args.get('sector')
+        if sector:
+            query = query.filter(CompanyAnalysis.sector.ilike(f"%{sector}%"))
+        index_code = request.args.get('index')
+        if index_code:
+            query = query.filter(member_filter(CompanyAnalysis.symbol, index_code))
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', type=int)
+        if limit is not None or offset is not None:
+            query = query.order_by(CompanyAnalysis.ai_impact_score.desc().nullslast(), CompanyAnalysis.symbol)
+            if offset:
+                query = query.offset(offset)
+            if limit is not None:
+                query = query.limit(limit)
+        companies = query.all()
+        # Appartenance aux indices / ETF en une seule requête
+        paginated = limit is not None or offset is not None
+        indexes = memberships(session, [c.symbol for c in companies] if paginated else None)
         results = []
         for c in companies:
             # Reconstruire le format attendu par le frontend
@@ -233,6 +266,10 @@ def get_companies():
                 "current_price": c.current_price,
                 "market_cap": c.market_cap,
                 "ai_impact_score": c.ai_impact_score,
+                "price_updated_at": c.price_updated_at.isoformat() if c.price_updated_at else None,
+                "fundamentals_updated_at": c.fundamentals_updated_at.isoformat() if c.fundamentals_updated_at else None,
+                "analysis_updated_at": c.analysis_updated_at.isoformat() if c.analysis_updated_at else None,
+                "analysis_prompt_version": c.analysis_prompt_version,
                 "analysis": {
                     "reasoning": c.reasoning,
                     "metrics": {
@@ -255,7 +292,8 @@ def get_companies():
                     "source": c.founder_source or "none",
                     "details": c.founder_details or "",
                     "is_igv": c.is_igv == "true"
-                }
+                },
+                "indexes": indexes.get(c.symbol, [])
             })
         return jsonify(results)
     except Exception as e:
@@ -275,6 +313,14 @@ def run_analysis():
     thread.start()
     return jsonify({"status": "started", "message": "Full update (Data + AI) started in background."})
 
+@app.route('/api/refresh_prices')
+def run_price_refresh():
+    """Endpoint pour le tier prix : rafraîchit les prix périmés sans appel LLM"""
+    from refresh_prices import refresh_all_prices
+    thread = threading.Thread(target=refresh_all_prices)
+    thread.start()
+    return jsonify({"status": "started", "message": "Price refresh started in background."})
+
 # --- FOUNDER DETECTION ROUTES ---
 
 @app.route('/api/founder/<ticker>')
@@ -291,15 +337,8 @@ def get_founder_info(ticker):
         result = founder_service.get_founder_status(ticker.upper(), company_name)
         
         # Save to DB
-        company.founders = result.get("founders", [])
-        company.current_ceo = result.get("currentCEO", "")
-        company.current_chairman = result.get("currentChairman", "")
-        company.is_founder_ceo = str(result.get("isFounderCEO", False)).lower()
-        company.is_founder_chairman = str(result.get("isFounderChairman", False)).lower()
-        company.founder_influence = result.get("founderInfluence", "none")
-        company.founder_bonus = result.get("founderBonus", 0)
-        company.founder_source = result.get("source", "none")
-        company.founder_details = result.get("details", "")
+        for column, value in founder_service.founder_columns(result).items():
+            setattr(company, column, value)
         session.commit()
         
         return jsonify(result)
@@ -312,11 +351,25 @@ def get_founder_info(ticker):
 @login_required
 def batch_founder_analysis():
     """Batch process all companies for founder status (runs in background)"""
+    # ?shard=i/N : chaque instance traite sa part de l'univers (défaut : SHARD)
+    try:
+        shard = parse_shard(request.args.get('shard')) or shard_from_env()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     def run_batch():
         db_session = get_session()
         try:
             companies = db_session.query(CompanyAnalysis).all()
+            by_symbol = {c.symbol: c for c in companies}
             service = FounderService(llm_service)
+            # Fondateurs d'un émetteur : une recherche, recopiée sur ses classes d'actions (GOOGL/GOOG...)
+            groups = shard_groups(company_share_classes(companies), shard)
+            
+            # Checkpoint par émetteur : un batch interrompu reprend là où il s'est arrêté
+            job = JobTracker.start_or_resume(shard_kind('founder_batch', shard), list(groups))
+            runnable = set(job.runnable())
+            companies = [by_symbol[primary] for primary in groups if primary in runnable]
             
             for i, company in enumerate(companies):
                 company_name = company.company_name or company.symbol
@@ -325,24 +378,26 @@ def batch_founder_analysis():
                 try:
                     result = service.get_founder_status(company.symbol, company_name)
                     
-                    company.founders = result.get("founders", [])
-                    company.current_ceo = result.get("currentCEO", "")
-                    company.current_chairman = result.get("currentChairman", "")
-                    company.is_founder_ceo = str(result.get("isFounderCEO", False)).lower()
-                    company.is_founder_chairman = str(result.get("isFounderChairman", False)).lower()
-                    company.founder_influence = result.get("founderInfluence", "none")
-                    company.founder_bonus = result.get("founderBonus", 0)
-                    company.founder_source = result.get("source", "none")
-                    company.founder_details = result.get("details", "")
+                    columns = service.founder_columns(result)
+                    for symbol in groups[company.symbol]:
+                        for column, value in columns.items():
+                            setattr(by_symbol[symbol], column, value)
                     
                     db_session.commit()
-                    print(f"  💾 Saved founder data for {company.symbol}")
+                    print(f"  💾 Saved founder data for {', '.join(groups[company.symbol])}")
+                    if company.founder_source == "none":
+                        job.mark_failed(company.symbol, "Could not determine founder status")
+                    else:
+                        job.mark_done(company.symbol)
                 except Exception as e:
+                    db_session.rollback()
+                    job.mark_failed(company.symbol, str(e))
                     print(f"  ❌ Error for {company.symbol}: {e}")
                 
                 import time
                 time.sleep(0.5)  # Rate limit for Wikidata
             
+            job.finish()
             print("\n✅ Batch founder analysis complete!")
         except Exception as e:
             print(f"Batch founder error: {e}")
@@ -355,6 +410,35 @@ def batch_founder_analysis():
 
 # --- END FOUNDER ROUTES ---
 
+# --- BATCH JOB ROUTES ---
+
+@app.route('/api/jobs')
+@login_required
+def list_jobs():
+    """Statut des jobs batch récents (checkpoints et dead-letter set)"""
+    try:
+        return jsonify(job_summaries())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/jobs/<kind>/retry', methods=['POST'])
+@login_required
+def retry_job_dead_letters(kind):
+    """Remet en file les symboles du dead-letter set pour le prochain run"""
+    try:
+        count = retry_dead_letters(kind)
+        return jsonify({"status": "success", "requeued": count})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/alpha_vantage/keys')
+@login_required
+def alpha_vantage_keys():
+    """Compteurs d'utilisation par clé Alpha Vantage (clés masquées) pour ce process"""
+    return jsonify(get_key_pool().stats())
+
+# --- END BATCH JOB ROUTES ---
+
 # Routes pour la prédiction EUR/USD
 @app.route('/eurusd')
 @login_required
@@ -0,0 +1,159 @@
+"""
+On-disk response cache for Alpha Vantage calls.
+
+Entries are content-addressed by (function, params) without the API key,
+gzip-compressed and written atomically so several processes can share one
+cache directory. Each function has its own TTL and the directory is kept
+under a size bound by evicting the least recently used entries.
+
+Modes (ALPHA_VANTAGE_CACHE):
+- "on"     : serve fresh entries, fetch and record misses (default)
+- "off"    : always hit the network
+- "replay" : serve any recorded entry regardless of age, never touch the network
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'alpha_vantage')
+
+# Durée de validité par fonction (secondes)
+DEFAULT_TTLS = {
+    'OVERVIEW': 24 * 3600,
+    'GLOBAL_QUOTE': 5 * 60,
+    'REALTIME_BULK_QUOTES': 60,
+    'FX_DAILY': 6 * 3600,
+    'TIME_SERIES_DAILY': 6 * 3600,
+    'LISTING_STATUS': 24 * 3600,
+}
+FALLBACK_TTL = 3600
+
+
+class CacheMiss(Exception):
+    """Replay mode was asked for a response that was never recorded."""
+
+
+class ResponseCache:
+    def __init__(self, cache_dir: str = None, mode: str = None, max_bytes: int = None, ttls: dict = None):
+        self.cache_dir = cache_dir or os.getenv('ALPHA_VANTAGE_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.mode = (mode or os.getenv('ALPHA_VANTAGE_CACHE', 'on')).lower()
+        self.max_bytes = max_bytes or int(float(os.getenv('ALPHA_VANTAGE_CACHE_MAX_MB', '200')) * 1024 * 1024)
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._size = None
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == 'replay'
+
+    def key(self, params: dict) -> str:
+        clean = {k: str(v) for k, v in params.items() if k != 'apikey'}
+        return hashlib.sha256(json.dumps(clean, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def ttl(self, function: str) -> float:
+        override = os.getenv(f"ALPHA_VANTAGE_CACHE_TTL_{function}")
+        return float(override) if override else self.ttls.get(function, FALLBACK_TTL)
+
+    def get(self, params: dict) -> Optional[str]:
+        """Return the recorded body for `params`, or None. Raises CacheMiss in replay mode."""
+        if not self.enabled:
+            return None
+        path = self._path(self.key(params))
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is not None and (self.replay or time.time() - entry['stored_at'] < self.ttl(params.get('function', ''))):
+            self.stats['hits'] += 1
+            try:
+                os.utime(path)  # recency for LRU eviction
+            except OSError:
+                pass
+            return entry['body']
+
+        self.stats['misses'] += 1
+        if self.replay:
+            raise CacheMiss(f"No recorded response for {params.get('function')} {params.get('symbol', '')}")
+        return None
+
+    def put(self, params: dict, body: str):
+        if not self.enabled or self.replay:
+            return
+        path = self._path(self.key(params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            'function': params.get('function'),
+            'params': {k: v for k, v in params.items() if k != 'apikey'},
+            'stored_at': time.time(),
+            'body': body,
+        }
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            json.dump(entry, f)
+        try:
+            replaced = os.path.getsize(path)  # refreshed entry: only the size difference counts
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += os.path.getsize(path) - replaced
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json.gz'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its bound."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                self.stats['evictions'] += 1
+            except OSError:
+                pass
+        self._size = total
+
+
+_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
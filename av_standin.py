@@ -0,0 +1,338 @@
+"""
+Local Alpha Vantage stand-in: an HTTP server answering like www.alphavantage.co/query
+from fixtures, so the screener, the price refresh, the listing sync and the EUR/USD
+predictor run (and can be benchmarked) with no network.
+
+Served functions: OVERVIEW, GLOBAL_QUOTE, REALTIME_BULK_QUOTES, FX_DAILY, LISTING_STATUS.
+A file fixtures/alpha_vantage/<FUNCTION>/<SYMBOL or PAIR>.json is served as is;
+otherwise a deterministic synthetic answer is built from sp500.json and the
+REALTIME_BULK_QUOTES fixture.
+
+Fault injection:
+- latency (mean + jitter) on every answer
+- a per-key quota per minute, answered with the real throttle "Note"
+- a rate of random failures (HTTP 500 or an "Error Message" payload)
+
+    python av_standin.py serve --port 8765 --latency-ms 150 --calls-per-minute 75
+    ALPHA_VANTAGE_BASE_URL=http://127.0.0.1:8765/query python refresh_prices.py
+
+    python av_standin.py bench --symbols 100 --latency-ms 150 --calls-per-minute 75 --keys 2
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from universe import get_registry
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BASE_DIR, 'fixtures', 'alpha_vantage')
+
+THROTTLE_NOTE = ("Thank you for using Alpha Vantage! Our standard API call frequency is "
+                 "5 calls per minute and 500 calls per day.")
+
+
+def _seed(*parts) -> int:
+    return int(hashlib.sha256(':'.join(map(str, parts)).encode('utf-8')).hexdigest()[:12], 16)
+
+
+class Fixtures:
+    """Fixture files first, deterministic synthetic payloads otherwise."""
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        self.companies = get_registry().entries()
+        self.prices = {}
+        bulk = os.path.join(fixtures_dir, 'REALTIME_BULK_QUOTES.json')
+        if os.path.exists(bulk):
+            with open(bulk, 'r') as f:
+                self.prices = {row['symbol']: row for row in json.load(f).get('data', [])}
+
+    def _file(self, function: str, key: str):
+        path = os.path.join(self.fixtures_dir, function, f"{key}.json")
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return None
+
+    def _price(self, symbol: str) -> float:
+        row = self.prices.get(symbol)
+        if row:
+            return float(row['close'])
+        return round(20 + _seed('price', symbol) % 48000 / 100.0, 2)
+
+    def overview(self, symbol: str) -> dict:
+        fixture = self._file('OVERVIEW', symbol)
+        if fixture is not None:
+            return fixture
+        if symbol not in self.companies:
+            return {}
+        entry = self.companies[symbol]
+        name, sector = entry.name, entry.sector
+        rng = random.Random(_seed('overview', symbol))
+        return {
+            'Symbol': symbol,
+            'AssetType': 'Common Stock',
+            'Name': name,
+            'Description': f"{name} operates in the {sector or 'n/a'} sector.",
+            'Exchange': rng.choice(['NASDAQ', 'NYSE']),
+            'Currency': 'USD',
+            'Country': 'USA',
+            'Sector': sector.upper(),
+            'MarketCapitalization': str(rng.randint(5, 3000) * 10 ** 9),
+            'PERatio': f"{rng.uniform(5, 80):.2f}",
+            'ReturnOnEquityTTM': f"{rng.uniform(-0.1, 0.6):.3f}",
+            'EPSGrowthPast5Years': f"{rng.uniform(-0.2, 0.5):.3f}",
+            'DebtToEquityRatio': f"{rng.uniform(0, 3):.2f}",
+        }
+
+    def global_quote(self, symbol: str) -> dict:
+        fixture = self._file('GLOBAL_QUOTE', symbol)
+        if fixture is not None:
+            return fixture
+        if symbol not in self.companies and symbol not in self.prices:
+            return {'Global Quote': {}}
+        return {'Global Quote': {'01. symbol': symbol, '05. price': f"{self._price(symbol):.4f}"}}
+
+    def bulk_quotes(self, symbols) -> dict:
+        return {
+            'endpoint': 'Realtime Bulk Quotes',
+            'data': [{'symbol': s, 'close': f"{self._price(s):.4f}"} for s in symbols
+                     if s in self.companies or s in self.prices],
+        }
+
+    def fx_daily(self, from_symbol: str, to_symbol: str, outputsize: str) -> dict:
+        pair = f"{from_symbol}{to_symbol}"
+        fixture = self._file('FX_DAILY', pair)
+        if fixture is not None:
+            return fixture
+        # Random walk over business days, same series on every call
+        rng = random.Random(_seed('fx', pair))
+        days = 100 if outputsize == 'compact' else 4000
+        series = {}
+        close = 1.10
+        day = date.today() - timedelta(days=1)
+        for _ in range(days):
+            while day.weekday() >= 5:
+                day -= timedelta(days=1)
+            open_ = close * (1 + rng.gauss(0, 0.003))
+            high, low = max(open_, close) * 1.002, min(open_, close) * 0.998
+            series[day.isoformat()] = {
+                '1. open': f"{open_:.5f}", '2. high': f"{high:.5f}", '3. low': f"{low:.5f}", '4. close': f"{close:.5f}",
+            }
+            close = open_
+            day -= timedelta(days=1)
+        return {
+            'Meta Data': {'1. Information': 'Forex Daily Prices (open, high, low, close)',
+                          '2. From Symbol': from_symbol, '3. To Symbol': to_symbol},
+            'Time Series FX (Daily)': series,
+        }
+
+    def listing_status(self) -> str:
+        path = os.path.join(self.fixtures_dir, 'LISTING_STATUS.csv')
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return f.read()
+        lines = ['symbol,name,exchange,assetType,ipoDate,delistingDate,status']
+        for symbol, entry in self.companies.items():
+            name = entry.name.replace(',', '')
+            exchange = random.Random(_seed('overview', symbol)).choice(['NASDAQ', 'NYSE'])
+            lines.append(f"{symbol},{name},{exchange},Stock,2000-01-01,null,Active")
+        return '\r\n'.join(lines) + '\r\n'
+
+
+class StandIn:
+    """Request accounting and fault injection shared by the handler threads."""
+
+    def __init__(self, fixtures: Fixtures, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 calls_per_minute: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.fixtures = fixtures
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.calls_per_minute = calls_per_minute
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = defaultdict(deque)   # apikey -> timestamps of the last minute
+        self.stats = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def _admit(self, api_key: str) -> str:
+        """'ok', 'throttled' or 'error' for a new call of `api_key`."""
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.calls_per_minute:
+                now = time.time()
+                window = self.calls[api_key]
+                while window and now - window[0] >= 60:
+                    window.popleft()
+                if len(window) >= self.calls_per_minute:
+                    self.stats['throttled'] += 1
+                    return 'throttled'
+                window.append(now)
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.stats['errors'] += 1
+                return 'error'
+            self.stats['served'] += 1
+            return 'ok'
+
+    def sleep(self):
+        if self.latency or self.jitter:
+            with self.lock:
+                delay = max(0.0, self.rng.gauss(self.latency, self.jitter) if self.jitter else self.latency)
+            time.sleep(delay)
+
+    def answer(self, params: dict):
+        """(status, content type, body) for a query."""
+        function = params.get('function', '')
+        admitted = self._admit(params.get('apikey', ''))
+        if admitted == 'throttled':
+            return 200, 'application/json', json.dumps({'Note': THROTTLE_NOTE})
+        if admitted == 'error':
+            if self.rng.random() < 0.5:
+                return 500, 'text/plain', 'Internal Server Error'
+            return 200, 'application/json', json.dumps({'Error Message': 'Invalid API call (injected error).'})
+
+        fixtures = self.fixtures
+        symbol = params.get('symbol', '')
+        if function == 'OVERVIEW':
+            return 200, 'application/json', json.dumps(fixtures.overview(symbol))
+        if function == 'GLOBAL_QUOTE':
+            return 200, 'application/json', json.dumps(fixtures.global_quote(symbol))
+        if function == 'REALTIME_BULK_QUOTES':
+            return 200, 'application/json', json.dumps(fixtures.bulk_quotes([s for s in symbol.split(',') if s]))
+        if function == 'FX_DAILY':
+            payload = fixtures.fx_daily(params.get('from_symbol', ''), params.get('to_symbol', ''),
+                                        params.get('outputsize', 'compact'))
+            return 200, 'application/json', json.dumps(payload)
+        if function == 'LISTING_STATUS':
+            return 200, 'text/csv', fixtures.listing_status()
+        return 200, 'application/json', json.dumps(
+            {'Error Message': f"Invalid API call. Function {function!r} is not served by the stand-in."}
+        )
+
+
+def make_server(standin: StandIn, host: str = '127.0.0.1', port: int = 0) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path.rstrip('/') not in ('/query', ''):
+                self.send_error(404)
+                return
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            standin.sleep()
+            status, content_type, body = standin.answer(params)
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(standin: StandIn, host: str = '127.0.0.1', port: int = 0):
+    """Start a stand-in on a background thread; returns (server, base_url)."""
+    server = make_server(standin, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/query"
+
+
+def benchmark(args) -> dict:
+    """
+    Run the fetch -> quote stages of update_database against the stand-in and report
+    throughput. The LLM and database stages are left out: this measures ingestion only.
+    Returns the pipeline stats.
+    """
+    standin = StandIn(Fixtures(), args.latency_ms, args.jitter_ms, args.calls_per_minute, args.error_rate, args.seed)
+    server, base_url = start_in_thread(standin)
+
+    # Client configuration is read at import time: set it before importing the screener
+    os.environ['ALPHA_VANTAGE_BASE_URL'] = base_url
+    os.environ['ALPHA_VANTAGE_CACHE'] = 'off'
+    os.environ['MARKET_DATA_PROVIDER'] = 'alpha_vantage'
+    os.environ['ALPHA_VANTAGE_API_KEYS'] = ','.join(f"bench{i}" for i in range(args.keys))
+    os.environ['ALPHA_VANTAGE_CALLS_PER_MINUTE'] = str(args.client_calls_per_minute or args.calls_per_minute or 600)
+    os.environ['ALPHA_VANTAGE_THROTTLE_BACKOFF'] = str(args.throttle_backoff)
+    os.environ['ALPHA_VANTAGE_STATE_DIR'] = tempfile.mkdtemp(prefix='av_bench_')
+
+    from alpha_vantage import AlphaVantageClient, ApiKeyPool
+    from av_cache import ResponseCache
+    from logic import AIScreener, MAX_THROTTLE_RETRIES, pipeline_job
+    from market_data import AlphaVantageProvider
+    from pipeline import Pipeline, Stage
+
+    screener = AIScreener()
+    # Own client even when the process-wide provider already exists (e.g. imported earlier)
+    pool = ApiKeyPool(os.environ['ALPHA_VANTAGE_API_KEYS'].split(','),
+                      rate_per_minute=float(os.environ['ALPHA_VANTAGE_CALLS_PER_MINUTE']),
+                      calls_per_day=0, state_dir=os.environ['ALPHA_VANTAGE_STATE_DIR'])
+    screener.market_data = AlphaVantageProvider(AlphaVantageClient(base_url=base_url, pool=pool, cache=ResponseCache(mode='off')))
+    symbols = list(screener.software_companies.items())[:args.symbols]
+    jobs = (pipeline_job(s, d) for s, d in symbols)
+
+    started = time.time()
+    stats = Pipeline([
+        Stage('fetch', screener._fetch_stage, workers=args.workers, max_retries=MAX_THROTTLE_RETRIES,
+              retry_delay=args.throttle_backoff),
+        Stage('quote', screener._quote_stage, workers=args.workers, max_retries=MAX_THROTTLE_RETRIES,
+              retry_delay=args.throttle_backoff),
+    ]).run(jobs)
+    elapsed = time.time() - started
+    server.shutdown()
+
+    done = stats['quote']['processed']
+    print(f"\n{done}/{len(symbols)} symbols ingested in {elapsed:.1f}s "
+          f"({done / elapsed * 60:.1f} symbols/min, {standin.stats['served'] / elapsed:.2f} calls/s)")
+    print(f"Stand-in: {dict(standin.stats)}")
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('command', choices=['serve', 'bench'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--calls-per-minute', type=float, default=0.0, help='stand-in quota per key (0 = none)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    # bench only
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--keys', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--client-calls-per-minute', type=float, default=0.0,
+                        help='client-side bucket rate per key (default: the stand-in quota)')
+    parser.add_argument('--throttle-backoff', type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        return benchmark(args)
+    standin = StandIn(Fixtures(), args.latency_ms, args.jitter_ms, args.calls_per_minute, args.error_rate, args.seed)
+    server = make_server(standin, args.host, args.port)
+    print(f"Alpha Vantage stand-in on http://{args.host}:{args.port}/query (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Stand-in: {dict(standin.stats)}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
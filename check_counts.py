@@ -1,6 +1,5 @@
 from database import get_session, CompanyAnalysis
-import json
-import os
+from universe import get_registry
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,13 +9,8 @@ def check_count():
     count = session.query(CompanyAnalysis).count()
     
     # Also check how many are in sp500.json
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    json_path = os.path.join(base_dir, 'sp500.json')
-    with open(json_path, 'r') as f:
-        sp500_data = json.load(f)
-    
     print(f"Database count: {count}")
-    print(f"SP500 JSON count: {len(sp500_data)}")
+    print(f"SP500 JSON count: {len(get_registry())}")
     session.close()
 
 if __name__ == "__main__":
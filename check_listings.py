@@ -1,34 +1,36 @@
-import requests
-import csv
-import io
-import os
+import sys
+from market_data import get_provider
+from universe import stream_listings, is_us_stock, sync_universe
 
 def get_all_listings():
-    api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-    url = f'https://www.alphavantage.co/query?function=LISTING_STATUS&apikey={api_key}'
+    provider = get_provider()
     
     print("Récupération de la liste complète des actions...")
-    response = requests.get(url)
+    total = 0
+    us_stocks = []
+    try:
+        # Lecture ligne à ligne : le CSV complet n'est jamais chargé en mémoire
+        for row in stream_listings(provider):
+            total += 1
+            if is_us_stock(row):
+                us_stocks.append(row)
+    except Exception as e:
+        print("Erreur lors de la récupération :", e)
+        return []
     
-    if response.status_code == 200:
-        csv_content = response.content.decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(csv_content))
-        
-        all_symbols = list(csv_reader)
-        us_stocks = [s for s in all_symbols if s['assetType'] == 'Stock' and s['exchange'] in ['NASDAQ', 'NYSE', 'AMEX']]
-        
-        print(f"Total symboles trouvés : {len(all_symbols)}")
-        print(f"Actions US (NASDAQ, NYSE, AMEX) : {len(us_stocks)}")
+    print(f"Total symboles trouvés : {total}")
+    print(f"Actions US (NASDAQ, NYSE, AMEX) : {len(us_stocks)}")
+    
+    # Afficher un aperçu
+    print("\nExemple de 5 symboles :")
+    for s in us_stocks[:5]:
+        print(s)
         
-        # Afficher un aperçu
-        print("\nExemple de 5 symboles :")
-        for s in us_stocks[:5]:
-            print(s)
-            
-        return us_stocks
-    else:
-        print("Erreur lors de la récupération :", response.text)
-        return []
+    return us_stocks
 
 if __name__ == "__main__":
-    get_all_listings()
+    if '--sync' in sys.argv:
+        # Enregistre l'univers complet en base (UNIVERSE_MODE=us_listed)
+        sync_universe(stream_listings())
+    else:
+        get_all_listings()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, String, Float, DateTime, Text, JSON
+from sqlalchemy import create_engine, Column, String, Float, Date, DateTime, Text, JSON, Integer, LargeBinary, text
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.sql import func
 import os
@@ -12,12 +12,12 @@ class CompanyAnalysis(Base):
     company_name = Column(String)
     sector = Column(String)
     current_price = Column(Float)
-    market_cap = Column(Float)
+    market_cap = Column(Float, index=True)
     pe_ratio = Column(Float)
     roe = Column(Float)
     eps_growth = Column(Float)
     debt_to_equity = Column(Float)
-    ai_impact_score = Column(Float)
+    ai_impact_score = Column(Float, index=True)
     recommendation = Column(String)  # LONG, SHORT, NEUTRAL
     reasoning = Column(Text)
     analysis_json = Column(JSON)  # Store full analysis structure for flexibility
@@ -34,13 +34,139 @@ class CompanyAnalysis(Base):
     founder_details = Column(Text)       # Human-readable explanation
     is_igv = Column(String, default="false") # "true" / "false"
     
+    # Refresh tiers: each kind of data has its own freshness timestamp
+    price_updated_at = Column(DateTime(timezone=True))         # intraday price tier
+    fundamentals_updated_at = Column(DateTime(timezone=True))  # OVERVIEW tier
+    analysis_updated_at = Column(DateTime(timezone=True))      # LLM scoring tier
+    analysis_inputs = Column(JSON)                             # numeric inputs used for the last LLM score
+    analysis_prompt_version = Column(Integer)                  # prompt_config.version that produced the score
+    
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+class UniverseMember(Base):
+    """Screening universe built from LISTING_STATUS (US-listed stocks)"""
+    __tablename__ = 'universe_member'
+    
+    symbol = Column(String, primary_key=True)
+    name = Column(String)
+    exchange = Column(String)
+    asset_type = Column(String)
+    ipo_date = Column(String)
+    status = Column(String, index=True)   # "Active" / "Delisted"
+    market_cap = Column(Float, index=True)  # copied from OVERVIEW once fetched, used for prioritization
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class IndexMembership(Base):
+    """Index / ETF constituents loaded from holdings files (one row per index and symbol)"""
+    __tablename__ = 'index_membership'
+    
+    index_code = Column(String, primary_key=True)         # "IGV", "SPY", ...
+    symbol = Column(String, primary_key=True, index=True)
+    weight = Column(Float)                                # % of the fund, when the file has it
+    added_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class EarningsEvent(Base):
+    """Earnings releases from EARNINGS_CALENDAR, kept after the date passes (drives the OVERVIEW refetch)"""
+    __tablename__ = 'earnings_event'
+    
+    symbol = Column(String, primary_key=True)
+    report_date = Column(Date, primary_key=True, index=True)
+    fiscal_date_ending = Column(String)
+    estimate = Column(Float)
+    currency = Column(String)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class NewsArticle(Base):
+    """NEWS_SENTIMENT article, deduplicated by URL hash (no summary or body kept)"""
+    __tablename__ = 'news_article'
+    
+    url_hash = Column(String(40), primary_key=True)   # sha1 of the URL
+    published_at = Column(DateTime(timezone=True), index=True)
+    source = Column(String)
+    title = Column(String)
+    sentiment = Column(Float)                         # overall_sentiment_score
+
+class NewsMention(Base):
+    """Ticker-level sentiment of an article"""
+    __tablename__ = 'news_mention'
+    
+    url_hash = Column(String(40), primary_key=True)
+    symbol = Column(String, primary_key=True, index=True)
+    relevance = Column(Float)
+    sentiment = Column(Float)
+
+class NewsCursor(Base):
+    """Time cursor per NEWS_SENTIMENT query ("ticker:AAPL" / "topic:technology")"""
+    __tablename__ = 'news_cursor'
+    
+    key = Column(String, primary_key=True)
+    last_published_at = Column(DateTime(timezone=True))
+    last_polled_at = Column(DateTime(timezone=True))
+
+class SymbolSentiment(Base):
+    """Rolling news sentiment per symbol: exponentially decayed sums, updated per new article"""
+    __tablename__ = 'symbol_sentiment'
+    
+    symbol = Column(String, primary_key=True)
+    weight_sum = Column(Float, default=0.0)     # sum of decayed relevance, as of reference_at
+    score_sum = Column(Float, default=0.0)      # sum of decayed relevance * sentiment, as of reference_at
+    reference_at = Column(DateTime(timezone=True))
+    article_count = Column(Integer, default=0)
+    last_article_at = Column(DateTime(timezone=True))
+
+class FundamentalsSnapshot(Base):
+    """Raw Alpha Vantage OVERVIEW payloads, zlib-compressed, one row per distinct version"""
+    __tablename__ = 'fundamentals_snapshot'
+    
+    symbol = Column(String, primary_key=True)
+    version = Column(Integer, primary_key=True)   # 1, 2, 3... per symbol
+    content_hash = Column(String(64))             # sha256 of the canonical JSON payload
+    payload = Column(LargeBinary)                 # zlib(json)
+    fetched_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AnalysisCache(Base):
+    """LLM analyses keyed by sha256(system prompt, model, text fields of the company payload)"""
+    __tablename__ = 'analysis_cache'
+    
+    key = Column(String(64), primary_key=True)
+    symbol = Column(String, index=True)
+    model = Column(String)
+    inputs = Column(JSON)                         # numeric inputs the result was computed on
+    result = Column(JSON)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_hit_at = Column(DateTime(timezone=True))
+
+class BatchJob(Base):
+    """A resumable batch run (update_database, reanalyze, founder batch...)"""
+    __tablename__ = 'batch_job'
+    
+    id = Column(String, primary_key=True)         # "<kind>-<YYYYmmddHHMMSSffffff>"
+    kind = Column(String, index=True)
+    scope = Column(String)                        # what the work depends on (e.g. "prompt-v3"), see jobs.py
+    status = Column(String, default="active")     # "active" / "completed" / "expired"
+    total = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class JobItem(Base):
+    """Per-symbol checkpoint of a BatchJob; status "dead" is the dead-letter set"""
+    __tablename__ = 'job_item'
+    
+    job_id = Column(String, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    status = Column(String, default="pending", index=True)  # "pending" / "done" / "failed" / "dead"
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    next_attempt_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class PromptConfig(Base):
     __tablename__ = 'prompt_config'
     
     id = Column(String, primary_key=True, default='default')
     system_prompt = Column(Text)
+    version = Column(Integer, default=1)  # +1 on every update, see prompt_config
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 class User(Base):
@@ -68,9 +194,36 @@ def get_db_engine():
         )
     return _engine
 
+# Columns added after the first deployment: create_all() does not alter existing tables
+MIGRATIONS = [
+    "ALTER TABLE company_analysis ADD COLUMN IF NOT EXISTS price_updated_at TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE company_analysis ADD COLUMN IF NOT EXISTS fundamentals_updated_at TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE company_analysis ADD COLUMN IF NOT EXISTS analysis_updated_at TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE company_analysis ADD COLUMN IF NOT EXISTS analysis_inputs JSON",
+    "ALTER TABLE company_analysis ADD COLUMN IF NOT EXISTS is_igv VARCHAR DEFAULT 'false'",
+    "ALTER TABLE company_analysis ADD COLUMN IF NOT EXISTS analysis_prompt_version INTEGER",
+    "ALTER TABLE prompt_config ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 1",
+    "ALTER TABLE batch_job ADD COLUMN IF NOT EXISTS scope VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_company_analysis_ai_impact_score ON company_analysis (ai_impact_score)",
+    "CREATE INDEX IF NOT EXISTS ix_company_analysis_market_cap ON company_analysis (market_cap)",
+    # Rows written before the tiers existed: last_updated covered everything
+    "UPDATE company_analysis SET fundamentals_updated_at = last_updated WHERE fundamentals_updated_at IS NULL AND market_cap IS NOT NULL",
+    "UPDATE company_analysis SET price_updated_at = last_updated WHERE price_updated_at IS NULL AND current_price > 0",
+    "UPDATE company_analysis SET analysis_updated_at = last_updated WHERE analysis_updated_at IS NULL AND ai_impact_score IS NOT NULL",
+]
+
+def migrate_db():
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        for statement in MIGRATIONS:
+            conn.execute(text(statement))
+        conn.commit()
+    print("Database migrations applied.")
+
 def init_db():
     engine = get_db_engine()
     Base.metadata.create_all(engine)
+    migrate_db()
     print("Database initialization complete.")
     init_users()
 
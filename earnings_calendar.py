@@ -0,0 +1,133 @@
+"""
+Earnings calendar: drives the OVERVIEW (fundamentals) refresh.
+
+OVERVIEW figures (PE, ROE, EPS growth, debt/equity) only move materially after
+an earnings release. The EARNINGS_CALENDAR CSV is ingested into earnings_event
+(indexed by symbol and report date, past events kept), and update_database only
+refetches and re-scores a company once it has reported since its last fetch.
+Companies the calendar never mentions fall back to FUNDAMENTALS_SAFETY_MAX_AGE_DAYS.
+"""
+import os
+from bisect import bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from database import get_session, EarningsEvent
+
+EARNINGS_HORIZON = os.getenv('EARNINGS_CALENDAR_HORIZON', '3month')
+# Re-ingest the calendar once a day
+EARNINGS_SYNC_MAX_AGE = timedelta(hours=float(os.getenv('EARNINGS_SYNC_MAX_AGE_HOURS', '24')))
+# Alpha Vantage updates OVERVIEW about a day after the release
+EARNINGS_REFRESH_LAG = timedelta(days=float(os.getenv('EARNINGS_REFRESH_LAG_DAYS', '1')))
+# Report dates older than this are not loaded by the scheduler
+EARNINGS_LOOKBACK = timedelta(days=400)
+
+
+def _parse_date(value) -> Optional[date]:
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sync_earnings_calendar(rows: Iterable[Dict[str, str]], session=None) -> int:
+    """Upsert EARNINGS_CALENDAR rows (symbol, reportDate, fiscalDateEnding, estimate, currency)."""
+    own_session = session is None
+    session = session or get_session()
+    try:
+        events = {}
+        for row in rows:
+            symbol = (row.get('symbol') or '').strip()
+            report_date = _parse_date(row.get('reportDate'))
+            if symbol and report_date:
+                events[(symbol, report_date)] = {
+                    'symbol': symbol,
+                    'report_date': report_date,
+                    'fiscal_date_ending': row.get('fiscalDateEnding') or None,
+                    'estimate': _parse_float(row.get('estimate')),
+                    'currency': row.get('currency') or None,
+                    'fetched_at': datetime.now(timezone.utc),
+                }
+        if not events:
+            return 0
+        dates = {report_date for _, report_date in events}
+        known = set(
+            session.query(EarningsEvent.symbol, EarningsEvent.report_date)
+            .filter(EarningsEvent.report_date.between(min(dates), max(dates)))
+        )
+        inserts = [m for key, m in events.items() if key not in known]
+        updates = [m for key, m in events.items() if key in known]
+        session.bulk_insert_mappings(EarningsEvent, inserts)
+        session.bulk_update_mappings(EarningsEvent, updates)
+        session.commit()
+        print(f"Earnings calendar: {len(inserts)} new events, {len(updates)} updated.")
+        return len(events)
+    finally:
+        if own_session:
+            session.close()
+
+
+def refresh_earnings_calendar(session, provider=None, force: bool = False) -> bool:
+    """Re-ingest the calendar when the last sync is older than EARNINGS_SYNC_MAX_AGE. Returns True if synced."""
+    last_sync = session.query(func.max(EarningsEvent.fetched_at)).scalar()
+    if last_sync is not None and last_sync.tzinfo is None:
+        last_sync = last_sync.replace(tzinfo=timezone.utc)
+    if not force and last_sync and datetime.now(timezone.utc) - last_sync < EARNINGS_SYNC_MAX_AGE:
+        return False
+    if provider is None:
+        from market_data import get_provider
+        provider = get_provider()
+    try:
+        sync_earnings_calendar(provider.earnings_calendar(EARNINGS_HORIZON), session)
+    except Exception as e:
+        # Sans calendrier à jour, on garde les dates déjà connues
+        session.rollback()
+        print(f"⚠️ Earnings calendar not refreshed: {e}")
+        return False
+    return True
+
+
+def load_report_dates(session, today: Optional[date] = None) -> Dict[str, List[date]]:
+    """Past report dates per symbol (sorted), in a single query."""
+    today = today or date.today()
+    rows = (
+        session.query(EarningsEvent.symbol, EarningsEvent.report_date)
+        .filter(EarningsEvent.report_date.between(today - EARNINGS_LOOKBACK, today))
+        .order_by(EarningsEvent.symbol, EarningsEvent.report_date)
+        .all()
+    )
+    dates = {}
+    for symbol, report_date in rows:
+        dates.setdefault(symbol, []).append(report_date)
+    return dates
+
+
+def reported_since(report_dates: List[date], updated_at: Optional[datetime], now: datetime) -> bool:
+    """
+    True if a release became visible in OVERVIEW (report date + EARNINGS_REFRESH_LAG)
+    after `updated_at` and before `now` (naive UTC datetimes).
+    """
+    if not report_dates or updated_at is None:
+        return False
+    # Latest release already visible at `now`
+    index = bisect_right(report_dates, (now - EARNINGS_REFRESH_LAG).date())
+    if index == 0:
+        return False
+    visible_at = datetime.combine(report_dates[index - 1], datetime.min.time()) + EARNINGS_REFRESH_LAG
+    return visible_at > updated_at
+
+
+if __name__ == "__main__":
+    # python earnings_calendar.py -> force a re-ingestion of the calendar
+    session = get_session()
+    try:
+        refresh_earnings_calendar(session, force=True)
+    finally:
+        session.close()
@@ -1,10 +1,8 @@
 """
 Module de prédiction EUR/USD basé sur les futures et le carry
 """
-import os
 import pandas as pd
 import numpy as np
-import requests
 import json
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
@@ -16,13 +14,15 @@ except (ImportError, OSError):
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score
 import warnings
+from alpha_vantage import AlphaVantageThrottled, configured_api_keys
+from market_data import get_provider
 warnings.filterwarnings('ignore')
 
 class EurUsdPredictor:
     def __init__(self):
-        self.api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-        if not self.api_key:
-            raise ValueError("La variable d'environnement ALPHA_VANTAGE_API_KEY n'est pas définie")
+        self.market_data = get_provider()
+        if self.market_data.name == 'alpha_vantage' and not configured_api_keys():
+            raise ValueError("La variable d'environnement ALPHA_VANTAGE_API_KEYS (ou ALPHA_VANTAGE_API_KEY) n'est pas définie")
         self.data = None
         self.model = None
         self.train_data = None
@@ -35,27 +35,13 @@ class EurUsdPredictor:
         print("Récupération des données EUR/USD futures...")
         
         # Pour l'instant, nous utiliserons les données FX disponibles
-        # Le symbole pour EUR/USD sur Alpha Vantage est 'EURUSD'
-        url = f'https://www.alphavantage.co/query'
-        params = {
-            'function': 'FX_DAILY',
-            'from_symbol': 'EUR',
-            'to_symbol': 'USD',
-            'apikey': self.api_key,
-            'outputsize': 'full'  # Pour obtenir les données historiques complètes
-        }
-        
         try:
-            response = requests.get(url, params=params)
-            data = response.json()
+            # outputsize 'full' pour obtenir les données historiques complètes
+            data = self.market_data.fx_daily('EUR', 'USD', outputsize='full')
             
             if 'Error Message' in data:
                 print(f"Erreur: {data['Error Message']}")
                 return None
-            
-            if 'Note' in data:
-                print(f"Note: {data['Note']}")
-                return None
                 
             if 'Time Series FX (Daily)' not in data:
                 print("Aucune série temporelle trouvée")
@@ -103,6 +89,9 @@ class EurUsdPredictor:
             self.data = df
             return df
             
+        except AlphaVantageThrottled as e:
+            print(f"Note: {e}")
+            return None
         except Exception as e:
             print(f"Erreur lors de la récupération des données: {e}")
             return None
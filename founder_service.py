@@ -7,6 +7,7 @@ import json
 import time
 import re
 from typing import Dict, List, Optional, Tuple
+from universe import get_registry, group_share_classes, split_description
 
 
 class FounderService:
@@ -76,7 +77,7 @@ class FounderService:
 
     def _clean_company_name(self, raw_name: str) -> list:
         if not raw_name: return []
-        name = raw_name.split(" - ")[0].strip()
+        name = split_description(raw_name)[0]
         cleaned = name
         for suffix in self._STRIP_SUFFIXES:
             if cleaned.rstrip("., ").endswith(suffix):
@@ -240,7 +241,17 @@ class FounderService:
     def _try_llm_only(self, ticker: str, company_name: str) -> Optional[Dict]:
         """Use the model's internal pre-trained knowledge as the final source of truth."""
         if not self.llm_service: return None
-        prompt = f"""Use your internal knowledge to provide data for the S&P 500 company: {company_name} (Ticker: {ticker}).
+        try:
+            res = self.llm_service.analyze_raw(self.llm_only_prompt(ticker, company_name))
+            if res and isinstance(res, dict):
+                res["source"] = "llm_only"
+                return res
+        except: pass
+        return None
+
+    def llm_only_prompt(self, ticker: str, company_name: str) -> str:
+        """Prompt of the LLM-only fallback (also written to batch files by llm_batch)."""
+        return f"""Use your internal knowledge to provide data for the S&P 500 company: {company_name} (Ticker: {ticker}).
         1. List all original founders.
         2. Identify the current CEO (as of 2024/2025).
         3. Identify the current Chairman of the Board.
@@ -254,13 +265,6 @@ class FounderService:
             "isFounderCEO": true/false,
             "isFounderChairman": true/false
         }}"""
-        try:
-            res = self.llm_service.analyze_raw(prompt)
-            if res and isinstance(res, dict):
-                res["source"] = "llm_only"
-                return res
-        except: pass
-        return None
 
     # ─────────────────────────────────────────────
     # SCORING & HELPERS
@@ -289,18 +293,42 @@ class FounderService:
     def _normalize_name(self, name: str) -> str:
         return name.strip().lower() if name else ""
 
+    def founder_columns(self, result: Dict) -> Dict:
+        """company_analysis columns for a scored founder result."""
+        return {
+            "founders": result.get("founders", []),
+            "current_ceo": result.get("currentCEO", ""),
+            "current_chairman": result.get("currentChairman", ""),
+            "is_founder_ceo": str(result.get("isFounderCEO", False)).lower(),
+            "is_founder_chairman": str(result.get("isFounderChairman", False)).lower(),
+            "founder_influence": result.get("founderInfluence", "none"),
+            "founder_bonus": result.get("founderBonus", 0),
+            "founder_source": result.get("source", "none"),
+            "founder_details": result.get("details", ""),
+        }
+
+    def llm_only_columns(self, result: Dict) -> Dict:
+        """company_analysis columns for a raw answer to llm_only_prompt (batch mode)."""
+        result["source"] = "llm_only"
+        return self.founder_columns(self._calculate_score(result))
+
     def _empty_result(self) -> Dict:
         return {"isFounderCEO": False, "isFounderChairman": False, "founderInfluence": "none", "founders": [], "currentCEO": "", "currentChairman": "", "founderBonus": 0, "source": "none", "details": "Unknown"}
 
-def batch_update_founder_status(sp500_dict: Dict[str, str], llm_service=None) -> Dict[str, Dict]:
+def batch_update_founder_status(sp500_dict: Optional[Dict[str, str]] = None, llm_service=None) -> Dict[str, Dict]:
     service = FounderService(llm_service)
     results = {}
-    for i, (ticker, sector_desc) in enumerate(sp500_dict.items()):
-        name = sector_desc.split(" - ")[0].strip()
+    if sp500_dict is None:
+        sp500_dict = get_registry().descriptions()
+    # One lookup per issuer, shared by its share classes
+    for ticker, share_classes in group_share_classes(sp500_dict).items():
+        name = split_description(sp500_dict[ticker])[0]
         try:
-            results[ticker] = service.get_founder_status(ticker, name)
+            result = service.get_founder_status(ticker, name)
         except:
-            results[ticker] = service._empty_result()
+            result = service._empty_result()
+        for symbol in share_classes:
+            results[symbol] = result
         time.sleep(0.4)
     return results
 
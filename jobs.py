@@ -0,0 +1,240 @@
+"""
+Resumable, checkpointed batch jobs.
+
+A BatchJob records the status of every symbol it has to process. When a run
+dies halfway (crash, redeploy), the next run of the same kind resumes the
+active job and skips the symbols already done. Failed symbols are retried
+with exponential backoff on later runs; after JOB_MAX_ATTEMPTS they move to
+the dead-letter set (status "dead") until retry_dead_letters() requeues them.
+
+A job can be tied to a scope (the prompt version of a reanalysis): a run with
+another scope expires it and starts afresh. The rolling update_database job is
+reconciled with each cycle's stale queue instead (prune=True).
+"""
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from database import get_session, BatchJob, JobItem
+
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BASE_SECONDS = float(os.getenv('JOB_RETRY_BASE_SECONDS', '300'))
+JOB_RETRY_MAX_SECONDS = float(os.getenv('JOB_RETRY_MAX_SECONDS', '86400'))
+# Symbols per IN (...) statement when a resumed job is reconciled with the current work set
+PRUNE_CHUNK_SIZE = 500
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class JobTracker:
+    """Checkpoint bookkeeping for one BatchJob. Thread-safe: each call uses its own short session."""
+
+    def __init__(self, job_id: str, kind: str):
+        self.job_id = job_id
+        self.kind = kind
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start_or_resume(cls, kind: str, symbols: Iterable[str], scope: Optional[str] = None,
+                        prune: bool = False) -> 'JobTracker':
+        """
+        Resume the active job of `kind` (adding any new symbols) or start a new one.
+
+        scope: what the work depends on (e.g. the prompt version of a reanalysis). An active
+        job with another scope is expired instead of resumed: its "done" items no longer count.
+        prune: `symbols` is the complete work set of this run (e.g. the stale queue of a cycle).
+        Done items that are due again are re-admitted, pending / failed items that dropped out
+        of the set are removed, so a capped or partial run never freezes a symbol.
+        """
+        symbols = list(dict.fromkeys(symbols))
+        session = get_session()
+        try:
+            job = (
+                session.query(BatchJob)
+                .filter_by(kind=kind, status='active')
+                .order_by(BatchJob.created_at.desc())
+                .first()
+            )
+            if job and job.scope != scope:
+                job.status = 'expired'
+                print(f"⏏ Job {job.id} expired (scope {job.scope} -> {scope})")
+                job = None
+            if job:
+                statuses = dict(session.query(JobItem.symbol, JobItem.status).filter_by(job_id=job.id))
+                new_symbols = [s for s in symbols if s not in statuses]
+                readmitted = dropped = 0
+                if prune:
+                    wanted = set(symbols)
+                    due_again = [s for s in symbols if statuses.get(s) == 'done']
+                    gone = [s for s, status in statuses.items() if s not in wanted and status in ('pending', 'failed')]
+                    for i in range(0, len(due_again), PRUNE_CHUNK_SIZE):
+                        readmitted += session.query(JobItem).filter(
+                            JobItem.job_id == job.id, JobItem.symbol.in_(due_again[i:i + PRUNE_CHUNK_SIZE])
+                        ).update({JobItem.status: 'pending', JobItem.attempts: 0, JobItem.next_attempt_at: None},
+                                 synchronize_session=False)
+                    for i in range(0, len(gone), PRUNE_CHUNK_SIZE):
+                        dropped += session.query(JobItem).filter(
+                            JobItem.job_id == job.id, JobItem.symbol.in_(gone[i:i + PRUNE_CHUNK_SIZE])
+                        ).delete(synchronize_session=False)
+                    job.total = (job.total or 0) - dropped
+                print(f"▶️ Resuming job {job.id} ({len(statuses)} symbols, {len(new_symbols)} new"
+                      f"{f', {readmitted} due again, {dropped} dropped' if prune else ''})")
+            else:
+                job = BatchJob(id=f"{kind}-{_now().strftime('%Y%m%d%H%M%S%f')}", kind=kind, scope=scope, status='active')
+                session.add(job)
+                new_symbols = symbols
+                print(f"▶️ Starting job {job.id} ({len(symbols)} symbols)")
+
+            if new_symbols:
+                session.bulk_insert_mappings(JobItem, [
+                    {'job_id': job.id, 'symbol': s, 'status': 'pending', 'attempts': 0} for s in new_symbols
+                ])
+            job.total = (job.total or 0) + len(new_symbols)
+            session.commit()
+            return cls(job.id, kind)
+        finally:
+            session.close()
+
+    def runnable(self) -> List[str]:
+        """Symbols still to process now: pending, or failed with their backoff elapsed."""
+        session = get_session()
+        try:
+            now = _now()
+            rows = (
+                session.query(JobItem.symbol, JobItem.status, JobItem.next_attempt_at)
+                .filter(JobItem.job_id == self.job_id, JobItem.status.in_(['pending', 'failed']))
+                .all()
+            )
+            return [
+                symbol for symbol, status, next_at in rows
+                if status == 'pending' or next_at is None or _aware(next_at) <= now
+            ]
+        finally:
+            session.close()
+
+    def _update(self, symbol: str, fn):
+        with self._lock:
+            session = get_session()
+            try:
+                item = session.query(JobItem).filter_by(job_id=self.job_id, symbol=symbol).first()
+                if item is None:
+                    item = JobItem(job_id=self.job_id, symbol=symbol, status='pending', attempts=0)
+                    session.add(item)
+                fn(item)
+                session.commit()
+            finally:
+                session.close()
+
+    def mark_done(self, symbol: str):
+        def done(item):
+            item.status = 'done'
+            item.last_error = None
+            item.next_attempt_at = None
+        self._update(symbol, done)
+
+    def mark_failed(self, symbol: str, error: str = ''):
+        def failed(item):
+            item.attempts = (item.attempts or 0) + 1
+            item.last_error = (error or '')[:1000]
+            if item.attempts >= JOB_MAX_ATTEMPTS:
+                item.status = 'dead'
+                item.next_attempt_at = None
+                print(f"  ☠️ {symbol} moved to dead-letter set after {item.attempts} attempts")
+            else:
+                item.status = 'failed'
+                delay = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * (2 ** (item.attempts - 1)))
+                item.next_attempt_at = _now() + timedelta(seconds=delay)
+        self._update(symbol, failed)
+
+    def counts(self) -> Dict[str, int]:
+        session = get_session()
+        try:
+            rows = (
+                session.query(JobItem.status, func.count())
+                .filter(JobItem.job_id == self.job_id)
+                .group_by(JobItem.status)
+                .all()
+            )
+            return {status: n for status, n in rows}
+        finally:
+            session.close()
+
+    def finish(self) -> Dict[str, int]:
+        """Close the job once nothing is pending or waiting for a retry; otherwise leave it to resume."""
+        counts = self.counts()
+        if not counts.get('pending') and not counts.get('failed'):
+            session = get_session()
+            try:
+                session.query(BatchJob).filter_by(id=self.job_id).update({BatchJob.status: 'completed'})
+                session.commit()
+            finally:
+                session.close()
+        print(f"⏹ Job {self.job_id}: {counts}")
+        return counts
+
+
+def retry_dead_letters(kind: str) -> int:
+    """Requeue the dead-letter symbols of the latest `kind` job for the next run."""
+    session = get_session()
+    try:
+        job = session.query(BatchJob).filter_by(kind=kind).order_by(BatchJob.created_at.desc()).first()
+        if not job:
+            return 0
+        count = (
+            session.query(JobItem)
+            .filter_by(job_id=job.id, status='dead')
+            .update({JobItem.status: 'pending', JobItem.attempts: 0, JobItem.next_attempt_at: None}, synchronize_session=False)
+        )
+        if count:
+            job.status = 'active'
+        session.commit()
+        return count
+    finally:
+        session.close()
+
+
+def job_summaries(limit: int = 20) -> List[dict]:
+    session = get_session()
+    try:
+        jobs = session.query(BatchJob).order_by(BatchJob.created_at.desc()).limit(limit).all()
+        counts = {}
+        if jobs:
+            rows = (
+                session.query(JobItem.job_id, JobItem.status, func.count())
+                .filter(JobItem.job_id.in_([j.id for j in jobs]))
+                .group_by(JobItem.job_id, JobItem.status)
+                .all()
+            )
+            for job_id, status, n in rows:
+                counts.setdefault(job_id, {})[status] = n
+        return [{
+            'id': j.id,
+            'kind': j.kind,
+            'status': j.status,
+            'total': j.total,
+            'created_at': j.created_at.isoformat() if j.created_at else None,
+            'updated_at': j.updated_at.isoformat() if j.updated_at else None,
+            'items': counts.get(j.id, {}),
+        } for j in jobs]
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    # python jobs.py                      -> list recent jobs
+    # python jobs.py retry <kind>         -> requeue the dead-letter set of a job kind
+    if len(sys.argv) == 3 and sys.argv[1] == 'retry':
+        print(f"Requeued {retry_dead_letters(sys.argv[2])} dead-letter symbols.")
+    else:
+        for summary in job_summaries():
+            print(summary)
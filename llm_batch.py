@@ -0,0 +1,492 @@
+"""
+Offline batch mode for mass LLM work (reanalysis, founder LLM fallback).
+
+Instead of a worker thread calling the LLM for hours, a batch run:
+1. writes every prompt to a JSONL file in the OpenAI Batch API format
+   ({"custom_id", "method", "url", "body"}), one line per issuer,
+2. submits it (OpenAI Batch API, batch pricing, 24h window) or hands it to the
+   local stand-in, which runs the lines through the adaptive executor,
+3. returns. A later `python llm_batch.py poll` (cron) checks the status, downloads
+   the result file, stream-parses it line by line and bulk-applies the scores.
+
+Everything a run needs to resume lives in LLM_BATCH_DIR/<name>/manifest.json next
+to its input and output files, so submit and poll can run in different processes.
+Batches are checkpointed in the same JobTracker jobs as the online runs (the
+'reanalyze' job, scoped to the prompt version): only runnable issuers are written,
+and items that fail or are missing from the output are retried with backoff.
+
+    python llm_batch.py submit reanalyze [--backend local|openai] [--shard i/N] [--wait]
+    python llm_batch.py submit founders [--backend local|openai] [--shard i/N] [--wait]
+    python llm_batch.py poll [NAME ...]          # all unfinished batches by default
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import llm_cache
+from database import get_session, CompanyAnalysis
+from jobs import JobTracker
+from llm_service import LLMService, RAW_SYSTEM_PROMPT, company_prompt, is_failed_analysis, throttle_error
+from llm_executor import AdaptiveExecutor
+from news_sentiment import load_sentiment
+from founder_service import FounderService
+from scheduler import scoring_inputs
+from sharding import shard_from_args, shard_groups, shard_kind
+from universe import company_share_classes, shard_company_symbols
+
+LLM_BATCH_DIR = os.getenv('LLM_BATCH_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_batches'))
+# "openai" (Batch API) or "local" (stand-in); default: openai when the OpenAI client is configured
+LLM_BATCH_BACKEND = os.getenv('LLM_BATCH_BACKEND', '')
+LLM_BATCH_POLL_SECONDS = float(os.getenv('LLM_BATCH_POLL_SECONDS', '60'))
+LLM_BATCH_WINDOW = os.getenv('LLM_BATCH_WINDOW', '24h')
+BATCH_ENDPOINT = '/v1/chat/completions'
+APPLY_CHUNK_SIZE = 200
+
+KINDS = ('reanalyze', 'founders')
+# JobTracker kind of each batch kind (reanalyze shares the checkpoints of the online run)
+JOB_KINDS = {'reanalyze': 'reanalyze', 'founders': 'founder_llm'}
+
+
+# ─────────────────────────────────────────────
+# BATCH FILES
+# ─────────────────────────────────────────────
+
+def write_requests(path: str, requests: Iterable[Tuple[str, dict]]) -> int:
+    """Write (custom_id, chat body) pairs as a batch input file. Returns the line count."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for custom_id, body in requests:
+            f.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body}) + '\n')
+            count += 1
+    return count
+
+
+def iter_results(paths: Iterable[str]) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """Stream (custom_id, message content, error) from batch output / error files."""
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                response = row.get('response') or {}
+                if row.get('error') or response.get('status_code') != 200:
+                    error = row.get('error') or (response.get('body') or {}).get('error') or response.get('status_code')
+                    yield row.get('custom_id'), None, json.dumps(error)[:500]
+                    continue
+                try:
+                    yield row.get('custom_id'), response['body']['choices'][0]['message']['content'], None
+                except (KeyError, IndexError, TypeError):
+                    yield row.get('custom_id'), None, 'malformed response'
+
+
+def _output_line(n: int, custom_id: str, content: Optional[str] = None, error: Optional[str] = None) -> str:
+    """One line of an OpenAI Batch API output file."""
+    if error is not None:
+        return json.dumps({'id': f"batch_req_{n}", 'custom_id': custom_id, 'response': None,
+                           'error': {'code': 'request_failed', 'message': error}})
+    return json.dumps({
+        'id': f"batch_req_{n}", 'custom_id': custom_id, 'error': None,
+        'response': {'status_code': 200, 'body': {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}]}},
+    })
+
+
+# ─────────────────────────────────────────────
+# BACKENDS
+# ─────────────────────────────────────────────
+
+class LocalBatchBackend:
+    """
+    Stand-in for the Batch API: runs the input file through the adaptive executor
+    against the configured provider and writes an output file in the same format.
+    Completes during submit(); status() then reports it as completed.
+    """
+
+    name = 'local'
+
+    def __init__(self, llm_service: LLMService):
+        self.llm_service = llm_service
+
+    def _call(self, body: dict) -> str:
+        try:
+            return self.llm_service.complete(body)
+        except Exception as e:
+            throttle = throttle_error(e)
+            if throttle:
+                raise throttle
+            raise
+
+    def submit(self, input_path: str) -> str:
+        output_path = input_path.replace('input.jsonl', 'output.jsonl')
+        with open(input_path, 'r', encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        with open(output_path, 'w', encoding='utf-8') as out:
+            def write(line, content, error):
+                write.n += 1
+                out.write(_output_line(write.n, line['custom_id'], content, error) + '\n')
+            write.n = 0
+            AdaptiveExecutor(lambda line: self._call(line['body'])).run(lines, write)
+        return output_path
+
+    def status(self, batch_id: str) -> dict:
+        return {'status': 'completed' if os.path.exists(batch_id) else 'failed', 'output': batch_id}
+
+    def download(self, info: dict, directory: str) -> List[str]:
+        return [info['output']]
+
+
+class OpenAIBatchBackend:
+    """OpenAI Batch API (files + batches endpoints) through the service's OpenAI client."""
+
+    name = 'openai'
+
+    def __init__(self, llm_service: LLMService):
+        if not llm_service.client:
+            raise ValueError("OpenAI batch backend needs an OpenAI-compatible client (OPENAI_API_KEY)")
+        self.client = llm_service.client
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, 'rb') as f:
+            uploaded = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=LLM_BATCH_WINDOW)
+        return batch.id
+
+    def status(self, batch_id: str) -> dict:
+        batch = self.client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        return {
+            'status': batch.status,   # validating / in_progress / finalizing / completed / failed / expired / cancelled
+            'output_file_id': batch.output_file_id,
+            'error_file_id': batch.error_file_id,
+            'counts': {'total': counts.total, 'completed': counts.completed, 'failed': counts.failed} if counts else None,
+        }
+
+    def download(self, info: dict, directory: str) -> List[str]:
+        paths = []
+        for key, filename in (('output_file_id', 'output.jsonl'), ('error_file_id', 'errors.jsonl')):
+            if info.get(key):
+                path = os.path.join(directory, filename)
+                # Streamed to disk: result files of a full universe are not loaded in memory
+                with self.client.files.with_streaming_response.content(info[key]) as response:
+                    response.stream_to_file(path)
+                paths.append(path)
+        return paths
+
+
+BACKENDS = {'local': LocalBatchBackend, 'openai': OpenAIBatchBackend}
+TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+
+def get_backend(llm_service: LLMService, name: Optional[str] = None):
+    name = name or LLM_BATCH_BACKEND or ('openai' if llm_service.client and not llm_service.base_url else 'local')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BATCH_BACKEND {name!r} (expected one of {sorted(BACKENDS)})")
+    return BACKENDS[name](llm_service)
+
+
+# ─────────────────────────────────────────────
+# MANIFESTS
+# ─────────────────────────────────────────────
+
+def _batch_path(name: str, filename: str = '') -> str:
+    return os.path.join(LLM_BATCH_DIR, name, filename)
+
+
+def load_manifest(name: str) -> dict:
+    with open(_batch_path(name, 'manifest.json'), 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict):
+    path = _batch_path(manifest['name'], 'manifest.json')
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def pending_batches() -> List[str]:
+    """Batches submitted but not applied yet, oldest first."""
+    if not os.path.isdir(LLM_BATCH_DIR):
+        return []
+    names = []
+    for name in sorted(os.listdir(LLM_BATCH_DIR)):
+        try:
+            if load_manifest(name)['status'] not in ('applied', 'failed'):
+                names.append(name)
+        except (OSError, ValueError, KeyError):
+            continue
+    return names
+
+
+# ─────────────────────────────────────────────
+# PREPARE (one request per issuer)
+# ─────────────────────────────────────────────
+
+def _reanalysis_requests(session, llm_service: LLMService, shard, manifest: dict) -> Iterator[Tuple[str, dict]]:
+    """Reanalysis prompts for the issuers whose cached analysis is not reusable (cache hits applied at once)."""
+    from logic import AIScreener
+    screener = AIScreener(shard=shard)
+    screener.llm_service = llm_service
+    companies = session.query(CompanyAnalysis).all()
+    by_symbol = {c.symbol: c for c in companies}
+    groups = shard_groups(company_share_classes(companies), shard)
+    # Same inputs as the update_database cycle (price and news sentiment), hence the same cache keys
+    news_sentiment = load_sentiment(session, list(groups))
+    system_prompt, manifest['prompt_version'] = llm_service.current_prompt()
+    manifest['model'] = f"{llm_service.provider}:{llm_service.model}"
+    job = _start_job(manifest, shard, list(groups), scope=f"prompt-v{manifest['prompt_version']}")
+    runnable = set(job.runnable())
+
+    hits = []
+    archive_session = get_session()
+    try:
+        primaries = [by_symbol[p] for p in groups if p in runnable]
+        for company, company_data in screener._reanalysis_inputs(primaries, archive_session):
+            company_data['Price'] = company.current_price
+            company_data['NewsSentiment'] = news_sentiment.get(company.symbol)
+            cached = llm_service.cached_analysis(company_data, system_prompt)
+            if cached is not None:
+                hits.append((groups[company.symbol], cached, scoring_inputs(company_data)))
+                continue
+            manifest['items'][company.symbol] = {
+                'group': groups[company.symbol],
+                'inputs': scoring_inputs(company_data),
+                'key': llm_service.cache_key(company_data, system_prompt),
+            }
+            yield company.symbol, llm_service.chat_body(system_prompt, company_prompt(company_data))
+    finally:
+        archive_session.close()
+    if hits:
+        _bulk_update(session, [m for group, result, inputs in hits
+                               for m in _score_mappings(group, result, inputs, manifest['prompt_version'])])
+        for group, _, _ in hits:
+            job.mark_done(group[0])
+        print(f"{len(hits)} issuers served from the analysis cache.")
+
+
+def _founder_requests(session, llm_service: LLMService, shard, manifest: dict) -> Iterator[Tuple[str, dict]]:
+    """LLM-only founder prompts for the companies whose founder status is still unknown."""
+    service = FounderService(llm_service)
+    companies = session.query(CompanyAnalysis).filter(
+        (CompanyAnalysis.founder_details == 'Could not determine founder status') |
+        (CompanyAnalysis.founder_source == 'none') |
+        (CompanyAnalysis.founders == None)
+    ).all()
+    if shard:
+        owned = shard_company_symbols(session, shard)
+        companies = [c for c in companies if c.symbol in owned]
+    groups = company_share_classes(companies)
+    by_symbol = {c.symbol: c for c in companies}
+    manifest['model'] = f"{llm_service.provider}:{llm_service.model}"
+    # The work set is the list of companies still unknown: resolved ones drop out of the job
+    runnable = set(_start_job(manifest, shard, list(groups), prune=True).runnable())
+    for primary, symbols in groups.items():
+        if primary not in runnable:
+            continue
+        company = by_symbol[primary]
+        manifest['items'][primary] = {'group': symbols}
+        prompt = service.llm_only_prompt(primary, company.company_name or primary)
+        yield primary, llm_service.chat_body(RAW_SYSTEM_PROMPT, prompt)
+
+
+def _start_job(manifest: dict, shard, symbols: List[str], scope: Optional[str] = None,
+               prune: bool = False) -> JobTracker:
+    job = JobTracker.start_or_resume(shard_kind(JOB_KINDS[manifest['kind']], shard), symbols, scope=scope, prune=prune)
+    manifest['job'] = {'id': job.job_id, 'kind': job.kind}
+    return job
+
+
+PREPARERS = {'reanalyze': _reanalysis_requests, 'founders': _founder_requests}
+
+
+# ─────────────────────────────────────────────
+# APPLY
+# ─────────────────────────────────────────────
+
+def _score_mappings(group: List[str], result: dict, inputs: dict, prompt_version: Optional[int]) -> List[dict]:
+    now = datetime.now(timezone.utc)
+    return [{
+        'symbol': symbol,
+        'ai_impact_score': result.get('score'),
+        'recommendation': result.get('recommendation'),
+        'reasoning': result.get('reasoning'),
+        'analysis_json': result,
+        'analysis_inputs': inputs,
+        'analysis_updated_at': now,
+        'analysis_prompt_version': prompt_version,
+    } for symbol in group]
+
+
+def _bulk_update(session, mappings: List[dict]):
+    for i in range(0, len(mappings), APPLY_CHUNK_SIZE):
+        session.bulk_update_mappings(CompanyAnalysis, mappings[i:i + APPLY_CHUNK_SIZE])
+        session.commit()
+
+
+def apply_results(manifest: dict, paths: List[str], session) -> Dict[str, int]:
+    """
+    Stream-parse the result files and bulk-update company_analysis, APPLY_CHUNK_SIZE rows per commit.
+    Each item is checkpointed in the batch's job: done once its rows are committed, failed
+    (retried with backoff, then dead-lettered) on an error or when it is missing from the output.
+    """
+    kind = manifest['kind']
+    items = manifest['items']
+    job = JobTracker(manifest['job']['id'], manifest['job']['kind']) if manifest.get('job') else None
+    service = FounderService()
+    stats = {'applied': 0, 'failed': 0}
+    mappings, applied, seen = [], [], set()
+
+    def flush():
+        _bulk_update(session, mappings)
+        if job:
+            for custom_id in applied:
+                job.mark_done(custom_id)
+        mappings.clear()
+        applied.clear()
+
+    for custom_id, content, error in iter_results(paths):
+        item = items.get(custom_id)
+        if item is None or custom_id in seen:
+            continue
+        seen.add(custom_id)
+        result = None
+        if content is not None:
+            try:
+                result = json.loads(content)
+            except ValueError:
+                error = 'invalid JSON'
+        if kind == 'reanalyze' and isinstance(result, dict) and is_failed_analysis(result):
+            error = result.get('reasoning') or 'failed analysis'
+        elif not isinstance(result, dict):
+            error = error or 'result is not a JSON object'
+        if error:
+            stats['failed'] += 1
+            if job:
+                job.mark_failed(custom_id, error)
+            continue
+        if kind == 'reanalyze':
+            # Version of the prompt the batch was written with, not the one current when it lands
+            mappings.extend(_score_mappings(item['group'], result, item['inputs'], manifest.get('prompt_version')))
+            llm_cache.store(item['key'], manifest['model'], dict(item['inputs'], Symbol=custom_id), result)
+        else:
+            columns = service.llm_only_columns(result)
+            mappings.extend(dict(columns, symbol=symbol) for symbol in item['group'])
+        applied.append(custom_id)
+        stats['applied'] += 1
+        if len(mappings) >= APPLY_CHUNK_SIZE:
+            flush()
+    flush()
+
+    missing = [custom_id for custom_id in items if custom_id not in seen]
+    stats['missing'] = len(missing)
+    if job:
+        for custom_id in missing:
+            job.mark_failed(custom_id, 'missing from the batch output')
+        job.finish()
+    return stats
+
+
+# ─────────────────────────────────────────────
+# SUBMIT / POLL
+# ─────────────────────────────────────────────
+
+def submit_batch(kind: str, backend: Optional[str] = None, shard=None, llm_service: Optional[LLMService] = None) -> Optional[str]:
+    """Write the batch file for `kind`, submit it and return the batch name (None if nothing to do)."""
+    if kind not in PREPARERS:
+        raise ValueError(f"Unknown batch kind {kind!r} (expected one of {KINDS})")
+    llm_service = llm_service or LLMService()
+    backend = get_backend(llm_service, backend)
+    name = f"{shard_kind(kind, shard)}-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
+    os.makedirs(_batch_path(name), exist_ok=True)
+    manifest = {'name': name, 'kind': kind, 'backend': backend.name, 'status': 'preparing',
+                'created_at': datetime.now(timezone.utc).isoformat(), 'items': {}}
+
+    session = get_session()
+    try:
+        input_path = _batch_path(name, 'input.jsonl')
+        count = write_requests(input_path, PREPARERS[kind](session, llm_service, shard, manifest))
+    finally:
+        session.close()
+    manifest['requests'] = count
+    if not count:
+        if manifest.get('job'):
+            # Everything was served from the cache (or is waiting for a retry)
+            JobTracker(manifest['job']['id'], manifest['job']['kind']).finish()
+        manifest['status'] = 'applied'
+        save_manifest(manifest)
+        print(f"Batch {name}: nothing to submit.")
+        return None
+
+    save_manifest(manifest)
+    manifest['batch_id'] = backend.submit(input_path)
+    manifest['status'] = 'submitted'
+    manifest['submitted_at'] = datetime.now(timezone.utc).isoformat()
+    save_manifest(manifest)
+    print(f"Batch {name}: {count} requests submitted ({backend.name}, id {manifest['batch_id']}).")
+    return name
+
+
+def poll_batch(name: str, wait: bool = False, llm_service: Optional[LLMService] = None) -> str:
+    """Check a batch; once completed, download, apply and mark it applied. Returns its status."""
+    manifest = load_manifest(name)
+    if manifest['status'] in ('applied', 'failed'):
+        return manifest['status']
+    backend = get_backend(llm_service or LLMService(), manifest['backend'])
+    while True:
+        info = backend.status(manifest['batch_id'])
+        if info['status'] in TERMINAL_STATUSES or not wait:
+            break
+        print(f"Batch {name}: {info['status']} {info.get('counts') or ''}")
+        time.sleep(LLM_BATCH_POLL_SECONDS)
+
+    if info['status'] not in TERMINAL_STATUSES:
+        print(f"Batch {name}: {info['status']} {info.get('counts') or ''}")
+        return info['status']
+    if info['status'] != 'completed' and not info.get('output_file_id') and not info.get('output'):
+        # Every item counts as missing: checkpointed as failed, so the next submit retries it
+        session = get_session()
+        try:
+            manifest['stats'] = apply_results(manifest, [], session)
+        finally:
+            session.close()
+        manifest['status'] = 'failed'
+        save_manifest(manifest)
+        print(f"Batch {name}: {info['status']}, nothing to apply.")
+        return 'failed'
+
+    # Expired / cancelled batches still return the requests that completed
+    paths = backend.download(info, _batch_path(name))
+    session = get_session()
+    try:
+        stats = apply_results(manifest, paths, session)
+    finally:
+        session.close()
+    manifest['status'] = 'applied'
+    manifest['applied_at'] = datetime.now(timezone.utc).isoformat()
+    manifest['stats'] = stats
+    save_manifest(manifest)
+    print(f"Batch {name}: {info['status']}, {stats}")
+    return 'applied'
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if len(args) >= 2 and args[0] == 'submit':
+        backend = args[args.index('--backend') + 1] if '--backend' in args else None
+        name = submit_batch(args[1], backend=backend, shard=shard_from_args(args))
+        if name and '--wait' in args:
+            poll_batch(name, wait=True)
+    elif args and args[0] == 'poll':
+        for name in [a for a in args[1:] if not a.startswith('--')] or pending_batches():
+            poll_batch(name, wait='--wait' in args)
+    else:
+        print(__doc__)
@@ -0,0 +1,120 @@
+"""
+Persistent cache of LLM company analyses.
+
+An entry is keyed by the sha256 of the system prompt, the model, the user-prompt
+template and the normalized text fields of the company payload (symbol, name,
+sector, description, news sentiment label). The numeric inputs (price, P/E,
+market cap...) are not part of the key: they are stored with the result, and a
+lookup hits as long as none of them moved by more than ANALYSIS_CACHE_TOLERANCE
+(relative) since the result was computed. A reanalysis with an unchanged prompt
+therefore costs no tokens, while editing the prompt misses every entry.
+
+ANALYSIS_CACHE=off disables lookups and writes.
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from database import get_session, AnalysisCache
+from scheduler import RESCORE_TOLERANCE, scoring_inputs, inputs_changed_materially
+
+ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE', 'on').lower() != 'off'
+# Relative move of a numeric input that invalidates a cached analysis (RESCORE_TOLERANCE by default)
+ANALYSIS_CACHE_TOLERANCE = float(os.getenv('ANALYSIS_CACHE_TOLERANCE', str(RESCORE_TOLERANCE)))
+
+KEY_FIELDS = ('Symbol', 'Name', 'Sector', 'Description')
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _text(value) -> str:
+    return _WHITESPACE.sub(' ', str(value if value is not None else '')).strip()
+
+
+def normalized_payload(company_data: dict) -> dict:
+    """Text part of the payload the key is computed on (numeric inputs are compared with a tolerance)."""
+    payload = {field: _text(company_data.get(field)) for field in KEY_FIELDS}
+    sentiment = company_data.get('NewsSentiment')
+    payload['NewsSentiment'] = sentiment.get('label') if sentiment else None
+    return payload
+
+
+def analysis_key(system_prompt: str, model: str, template: str, company_data: dict) -> str:
+    raw = json.dumps({
+        'prompt': _text(system_prompt),
+        'model': model,
+        'template': template,
+        'payload': normalized_payload(company_data),
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def lookup(key: str, company_data: dict, tolerance: float = ANALYSIS_CACHE_TOLERANCE) -> Optional[dict]:
+    """Cached result for `key` if the numeric inputs are within `tolerance` of the cached ones."""
+    if not ANALYSIS_CACHE_ENABLED:
+        return None
+    session = get_session()
+    try:
+        entry = session.get(AnalysisCache, key)
+        if entry is None or inputs_changed_materially(entry.inputs, scoring_inputs(company_data), tolerance):
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_hit_at = datetime.now(timezone.utc)
+        session.commit()
+        return entry.result
+    except Exception as e:
+        session.rollback()
+        print(f"  ⚠️ Analysis cache lookup failed for {company_data.get('Symbol')}: {e}")
+        return None
+    finally:
+        session.close()
+
+
+def store(key: str, model: str, company_data: dict, result: dict):
+    """Record a fresh result (replaces the previous one for the same key)."""
+    if not ANALYSIS_CACHE_ENABLED:
+        return
+    session = get_session()
+    try:
+        session.merge(AnalysisCache(
+            key=key,
+            symbol=company_data.get('Symbol'),
+            model=model,
+            inputs=scoring_inputs(company_data),
+            result=result,
+            hits=0,
+            created_at=datetime.now(timezone.utc),
+        ))
+        session.commit()
+    except Exception as e:
+        # Le cache ne doit jamais faire échouer une analyse
+        session.rollback()
+        print(f"  ⚠️ Analysis cache write failed for {company_data.get('Symbol')}: {e}")
+    finally:
+        session.close()
+
+
+def purge(older_than: timedelta) -> int:
+    """Delete entries created before `older_than` ago and never hit since (old prompts, old models)."""
+    cutoff = datetime.now(timezone.utc) - older_than
+    session = get_session()
+    try:
+        deleted = session.query(AnalysisCache).filter(
+            AnalysisCache.created_at < cutoff,
+            (AnalysisCache.last_hit_at == None) | (AnalysisCache.last_hit_at < cutoff),
+        ).delete(synchronize_session=False)
+        session.commit()
+        return deleted
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    # python llm_cache.py purge DAYS -> drop entries unused for DAYS days
+    if len(sys.argv) == 3 and sys.argv[1] == 'purge':
+        print(f"{purge(timedelta(days=float(sys.argv[2])))} cache entries deleted.")
+    else:
+        print("usage: python llm_cache.py purge DAYS")
@@ -0,0 +1,220 @@
+"""
+Concurrent LLM calls with adaptive (AIMD) concurrency.
+
+The provider's real limit (requests and tokens per minute, shared with other
+clients of the same key) is unknown, so the number of requests in flight is
+discovered at run time, TCP-style:
+- additive increase: +1 slot after a full window of successes (one per slot in use)
+- multiplicative decrease: slots x LLM_DECREASE_FACTOR on a 429 or a timeout,
+  and every worker pauses for the provider's Retry-After (or an exponential backoff)
+
+AIMDLimiter is the gate; AdaptiveExecutor runs a batch through it (reanalyze),
+and the update_database pipeline's analyze stage uses the same gate directly.
+LLM_REQUESTS_PER_MINUTE additionally caps the request rate with the shared
+cross-process token bucket when the provider's limit is known.
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional
+from rate_limiter import BackoffQueue, TokenBucket
+
+LLM_MIN_CONCURRENCY = int(os.getenv('LLM_MIN_CONCURRENCY', '1'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+LLM_INITIAL_CONCURRENCY = int(os.getenv('LLM_INITIAL_CONCURRENCY', os.getenv('LLM_WORKERS', '2')))
+LLM_DECREASE_FACTOR = float(os.getenv('LLM_DECREASE_FACTOR', '0.5'))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', '0'))
+# Backoff after a throttle without Retry-After: base * 2^attempt, capped
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE_SECONDS', '5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX_SECONDS', '120'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '6'))
+
+_END = object()
+
+
+class LLMThrottled(Exception):
+    """The provider answered 429 or timed out. `retry_after` is its hint in seconds, if any."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None, timeout: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.timeout = timeout
+
+
+class AIMDLimiter:
+    """Thread-safe concurrency gate whose limit follows additive-increase / multiplicative-decrease."""
+
+    def __init__(self, initial: int = LLM_INITIAL_CONCURRENCY, minimum: int = LLM_MIN_CONCURRENCY,
+                 maximum: int = LLM_MAX_CONCURRENCY, decrease_factor: float = LLM_DECREASE_FACTOR,
+                 rate_per_minute: float = LLM_REQUESTS_PER_MINUTE, bucket_name: str = 'llm'):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(self.maximum, max(self.minimum, initial))
+        self.decrease_factor = decrease_factor
+        self.bucket = TokenBucket(bucket_name, rate_per_minute) if rate_per_minute else None
+        self._inflight = 0
+        self._window = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._started = time.time()
+        self.counters = {'calls': 0, 'successes': 0, 'throttled': 0, 'timeouts': 0, 'errors': 0,
+                         'increases': 0, 'decreases': 0, 'backoff_seconds': 0.0, 'peak_limit': self.limit}
+
+    @contextmanager
+    def slot(self):
+        """Hold one in-flight slot for the duration of a call (blocks while full or paused)."""
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.time()
+                if wait <= 0 and self._inflight < self.limit:
+                    break
+                self._cond.wait(wait if wait > 0 else None)
+            self._inflight += 1
+            self.counters['calls'] += 1
+        try:
+            if self.bucket:
+                self.bucket.acquire()
+            yield
+        finally:
+            with self._cond:
+                self._inflight -= 1
+                self._cond.notify_all()
+
+    def success(self):
+        with self._cond:
+            self.counters['successes'] += 1
+            self._window += 1
+            if self._window >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._window = 0
+                self.counters['increases'] += 1
+                self.counters['peak_limit'] = max(self.counters['peak_limit'], self.limit)
+                self._cond.notify_all()
+
+    def error(self):
+        with self._cond:
+            self.counters['errors'] += 1
+
+    def throttled(self, delay: float, timeout: bool = False):
+        """Shrink the limit and pause every caller for `delay` seconds."""
+        with self._cond:
+            self.counters['timeouts' if timeout else 'throttled'] += 1
+            new_limit = max(self.minimum, int(self.limit * self.decrease_factor))
+            if new_limit < self.limit:
+                self.counters['decreases'] += 1
+            self.limit = new_limit
+            self._window = 0
+            until = time.time() + delay
+            if until > self._paused_until:
+                self.counters['backoff_seconds'] += until - max(self._paused_until, time.time())
+                self._paused_until = until
+        if self.bucket:
+            self.bucket.penalize(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            elapsed = time.time() - self._started
+            return {
+                **self.counters,
+                'limit': self.limit,
+                'elapsed_seconds': round(elapsed, 1),
+                'throughput_per_minute': round(self.counters['successes'] * 60.0 / elapsed, 1) if elapsed else 0.0,
+            }
+
+
+def backoff_delay(error: LLMThrottled, attempt: int) -> float:
+    if error.retry_after:
+        return min(LLM_BACKOFF_MAX, error.retry_after)
+    return min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt))
+
+
+class AdaptiveExecutor:
+    """
+    Run fn(item) for every item with up to `limiter.limit` calls in flight. A call raising
+    LLMThrottled is retried (up to `max_retries`) after the pause; any other exception is
+    reported as the item's error. Results are handed to on_result(item, result, error) in
+    the calling thread, in completion order, so it can use the caller's DB session.
+    `failed(result)` flags answers that are failures in disguise (the placeholder analysis):
+    they are counted as errors and do not grow the concurrency.
+    """
+
+    def __init__(self, fn: Callable[[Any], Any], limiter: Optional[AIMDLimiter] = None,
+                 max_retries: int = LLM_MAX_RETRIES, failed: Optional[Callable[[Any], bool]] = None):
+        self.fn = fn
+        self.limiter = limiter or AIMDLimiter()
+        self.max_retries = max_retries
+        self.failed = failed
+
+    def _worker(self, work: BackoffQueue, results: queue.Queue):
+        while True:
+            # Blocks while the queue is empty: items in flight elsewhere may come back for a retry
+            next_item = work.pop(block=True)
+            if next_item is None:
+                return
+            item, attempt = next_item
+            try:
+                with self.limiter.slot():
+                    result = self.fn(item)
+            except LLMThrottled as e:
+                delay = backoff_delay(e, attempt)
+                self.limiter.throttled(delay, timeout=e.timeout)
+                if attempt < self.max_retries:
+                    work.push(item, attempt + 1, delay)
+                else:
+                    results.put((item, None, f"throttled {attempt + 1} times: {e}"))
+                continue
+            except Exception as e:
+                self.limiter.error()
+                results.put((item, None, str(e) or e.__class__.__name__))
+                continue
+            if self.failed and self.failed(result):
+                self.limiter.error()
+            else:
+                self.limiter.success()
+            results.put((item, result, None))
+
+    def run(self, items: Iterable[Any], on_result: Optional[Callable[[Any, Any, Optional[str]], None]] = None,
+            window: Optional[int] = None) -> Dict[str, Any]:
+        """
+        `items` may be a generator: it is consumed lazily in the calling thread, at most
+        `window` items (default: twice the maximum concurrency) ahead of the results.
+        """
+        window = window or 2 * self.limiter.maximum
+        source = iter(items)
+        work = BackoffQueue()
+        results = queue.Queue()
+        threads = []
+        pending = 0
+        exhausted = False
+        try:
+            while True:
+                while not exhausted and pending < window:
+                    item = next(source, _END)
+                    if item is _END:
+                        exhausted = True
+                        break
+                    work.push(item)
+                    pending += 1
+                    if len(threads) < self.limiter.maximum:
+                        thread = threading.Thread(target=self._worker, args=(work, results),
+                                                  name=f"llm-{len(threads)}", daemon=True)
+                        thread.start()
+                        threads.append(thread)
+                if not pending:
+                    break
+                item, result, error = results.get()
+                pending -= 1
+                if on_result:
+                    on_result(item, result, error)
+        finally:
+            work.close()
+            for t in threads:
+                t.join()
+        stats = self.limiter.stats()
+        print(f"LLM executor: {stats['successes']} ok, {stats['errors']} errors, "
+              f"{stats['throttled']} throttled, {stats['timeouts']} timeouts, "
+              f"concurrency {stats['limit']} (peak {stats['peak_limit']}), "
+              f"{stats['throughput_per_minute']}/min, backoff {stats['backoff_seconds']:.0f}s")
+        return stats
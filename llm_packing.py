@@ -0,0 +1,252 @@
+"""
+Multi-company prompt packing for LLM scoring.
+
+A single analysis repeats the whole system prompt and a round trip for one
+company. A packed request sends K companies under one system prompt and asks
+for a keyed JSON array back ({"results": [{"symbol", "score", "recommendation",
+"reasoning"}, ...]}). Each element is validated on its own; only the companies
+whose element is missing or malformed fall back to a single analyze_company
+call. Packed results are cached under their own key (packed template and pack
+size): a packed answer never poses as a single one, while single results are
+still reused by packed runs.
+
+Packing applies to reanalyze_existing_data, which has the whole batch of
+cache misses at hand. The update_database pipeline analyzes one issuer per
+stage call (each with its own retry and skip decisions) and stays unpacked.
+
+LLM_PACK_SIZE sets K (1 = no packing). Tune it with the benchmark:
+
+    python llm_packing.py bench 1,4,8,16 [--sample 32] [--dry-run]
+
+--dry-run only sizes the prompts (estimated tokens per company, no LLM call).
+"""
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+import llm_cache
+from llm_service import LLMService, USER_PROMPT_TEMPLATE, company_prompt, throttle_error
+from llm_executor import LLMThrottled
+
+LLM_PACK_SIZE = max(1, int(os.getenv('LLM_PACK_SIZE', '1')))
+
+RECOMMENDATIONS = ('LONG', 'SHORT', 'NEUTRAL')
+
+# One company block: the single-analysis message with a header instead of its instruction lines
+PACKED_COMPANY_TEMPLATE = USER_PROMPT_TEMPLATE.replace('Analyze this company:', '--- {Symbol} ---').replace('        Output JSON only.\n', '')
+
+PACKED_INSTRUCTIONS = """
+        Analyze each of the following {count} companies independently, as if it were the only one.
+        {companies}
+
+        Output JSON only: {{"results": [...]}} with exactly one element per company, each an object
+        with the keys "symbol" (exactly as given above), "score", "recommendation" and "reasoning".
+        """
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Lists of `size` consecutive items (the last one shorter), consuming `items` lazily."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def packed_prompt(companies: List[dict]) -> str:
+    blocks = ''.join(company_prompt(c, PACKED_COMPANY_TEMPLATE) for c in companies)
+    return PACKED_INSTRUCTIONS.format(count=len(companies), companies=blocks)
+
+
+def packed_cache_key(llm_service: LLMService, company: dict, system_prompt: str, pack_size: int = LLM_PACK_SIZE) -> str:
+    """Analysis cache key of a result obtained in packs of `pack_size`."""
+    template = f"packed:{pack_size}:{PACKED_INSTRUCTIONS}{PACKED_COMPANY_TEMPLATE}"
+    return llm_cache.analysis_key(system_prompt, f"{llm_service.provider}:{llm_service.model}", template, company)
+
+
+def cached_packed(llm_service: LLMService, company: dict, system_prompt: str, pack_size: int = LLM_PACK_SIZE) -> Optional[dict]:
+    """A single result for `company` if there is one, else a result from an earlier run with the same pack size."""
+    cached = llm_service.cached_analysis(company, system_prompt)
+    if cached is None and llm_service.api_key:
+        cached = llm_cache.lookup(packed_cache_key(llm_service, company, system_prompt, pack_size), company)
+    return cached
+
+
+def validate_analysis(element) -> Optional[dict]:
+    """A well-formed analysis (score 0-100, known recommendation, non-empty reasoning), or None."""
+    if not isinstance(element, dict):
+        return None
+    try:
+        score = float(element.get('score'))
+    except (TypeError, ValueError):
+        return None
+    recommendation = str(element.get('recommendation', '')).strip().upper()
+    reasoning = element.get('reasoning')
+    if not 0 <= score <= 100 or recommendation not in RECOMMENDATIONS or not isinstance(reasoning, str) or not reasoning.strip():
+        return None
+    return {'score': int(score) if score.is_integer() else score, 'recommendation': recommendation, 'reasoning': reasoning}
+
+
+def parse_packed(text: str, symbols: Iterable[str]) -> Dict[str, dict]:
+    """
+    Valid analyses by symbol from a packed answer. Accepts {"results": [...]}, a bare array,
+    or an object keyed by symbol; unknown symbols, duplicates and malformed elements are dropped.
+    """
+    wanted = set(symbols)
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        elements = data['results']
+    elif isinstance(data, list):
+        elements = data
+    elif isinstance(data, dict):
+        elements = [dict(value, symbol=key) for key, value in data.items() if isinstance(value, dict)]
+    else:
+        return {}
+    results, seen = {}, set()
+    for element in elements:
+        symbol = str(element.get('symbol', '')).strip().upper() if isinstance(element, dict) else ''
+        if symbol not in wanted:
+            continue
+        if symbol in seen:
+            # Two answers for one company: trust neither
+            results.pop(symbol, None)
+            continue
+        seen.add(symbol)
+        analysis = validate_analysis(element)
+        if analysis:
+            results[symbol] = analysis
+    return results
+
+
+def analyze_packed(llm_service: LLMService, companies: List[dict], system_prompt: Optional[str] = None,
+                   raise_on_throttle: bool = False, stats: Optional[dict] = None, use_cache: bool = True,
+                   pack_size: int = LLM_PACK_SIZE) -> Dict[str, dict]:
+    """
+    Score `companies` (OVERVIEW-like dicts with 'Symbol') in one request, symbol -> result.
+    Cache hits are not sent (use_cache=False when the caller already looked them up);
+    missing or malformed elements fall back to analyze_company.
+    """
+    if not llm_service.api_key:
+        return {}
+    system_prompt = system_prompt or llm_service.get_current_prompt()
+    stats = stats if stats is not None else {}
+    results, misses = {}, []
+    for company in companies:
+        cached = cached_packed(llm_service, company, system_prompt, pack_size) if use_cache else None
+        if cached is not None:
+            results[company['Symbol']] = cached
+        else:
+            misses.append(company)
+
+    packed = {}
+    if len(misses) > 1:
+        body = llm_service.chat_body(system_prompt, packed_prompt(misses))
+        try:
+            text = llm_service.complete(body, usage=stats)
+            stats['requests'] = stats.get('requests', 0) + 1
+            packed = parse_packed(text, [c['Symbol'] for c in misses])
+        except Exception as e:
+            throttle = e if isinstance(e, LLMThrottled) else throttle_error(e)
+            if throttle and raise_on_throttle:
+                raise throttle
+            print(f"  ⚠️ Packed analysis of {len(misses)} companies failed, falling back to single calls: {e}")
+        model = f"{llm_service.provider}:{llm_service.model}"
+        for company in misses:
+            analysis = packed.get(company['Symbol'])
+            if analysis:
+                llm_cache.store(packed_cache_key(llm_service, company, system_prompt, pack_size), model, company, analysis)
+
+    for company in misses:
+        symbol = company['Symbol']
+        if symbol in packed:
+            results[symbol] = packed[symbol]
+            continue
+        stats['fallbacks'] = stats.get('fallbacks', 0) + 1
+        # Its cache entry was already looked up above
+        result = llm_service.analyze_company(company, system_prompt, raise_on_throttle=raise_on_throttle, use_cache=False)
+        if result is not None:
+            results[symbol] = result
+    return results
+
+
+def benchmark(llm_service: LLMService, companies: List[dict], pack_sizes: List[int], dry_run: bool = False) -> List[dict]:
+    """
+    Score the same `companies` with each pack size, bypassing the cache, and report wall time,
+    requests, tokens per company and fallbacks. dry_run only estimates prompt tokens (~4 chars/token).
+    """
+    system_prompt = llm_service.get_current_prompt()
+    rows = []
+    for size in pack_sizes:
+        packs = [companies[i:i + size] for i in range(0, len(companies), size)]
+        if dry_run:
+            chars = sum(len(system_prompt) + len(company_prompt(p[0]) if size == 1 else packed_prompt(p)) for p in packs)
+            rows.append({'pack_size': size, 'requests': len(packs),
+                         'est_prompt_tokens_per_company': round(chars / 4 / len(companies), 1)})
+            continue
+        stats = {}
+        valid = 0
+        started = time.time()
+        for pack in packs:
+            if size == 1:
+                body = llm_service.chat_body(system_prompt, company_prompt(pack[0]))
+                stats['requests'] = stats.get('requests', 0) + 1
+                try:
+                    valid += validate_analysis(json.loads(llm_service.complete(body, usage=stats))) is not None
+                except Exception as e:
+                    print(f"  ⚠️ {pack[0]['Symbol']}: {e}")
+                continue
+            body = llm_service.chat_body(system_prompt, packed_prompt(pack))
+            stats['requests'] = stats.get('requests', 0) + 1
+            try:
+                parsed = parse_packed(llm_service.complete(body, usage=stats), [c['Symbol'] for c in pack])
+            except Exception as e:
+                print(f"  ⚠️ pack of {len(pack)}: {e}")
+                parsed = {}
+            valid += len(parsed)
+            stats['fallbacks'] = stats.get('fallbacks', 0) + len(pack) - len(parsed)
+        elapsed = time.time() - started
+        rows.append({
+            'pack_size': size,
+            'requests': stats.get('requests', 0),
+            'seconds': round(elapsed, 1),
+            'seconds_per_company': round(elapsed / len(companies), 2),
+            'prompt_tokens_per_company': round(stats.get('prompt_tokens', 0) / len(companies), 1),
+            'completion_tokens_per_company': round(stats.get('completion_tokens', 0) / len(companies), 1),
+            'valid': valid,
+            'fallbacks': stats.get('fallbacks', 0),
+        })
+    for row in rows:
+        print('  '.join(f"{k}={v}" for k, v in row.items()))
+    return rows
+
+
+if __name__ == "__main__":
+    # python llm_packing.py bench 1,4,8,16 [--sample 32] [--dry-run]
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] != 'bench':
+        print(__doc__)
+        sys.exit(1)
+    sizes = [int(k) for k in args[1].split(',')]
+    sample = int(args[args.index('--sample') + 1]) if '--sample' in args else 32
+    from database import get_session, CompanyAnalysis
+    from logic import AIScreener
+    from news_sentiment import load_sentiment
+    session, archive_session = get_session(), get_session()
+    try:
+        rows = session.query(CompanyAnalysis).order_by(CompanyAnalysis.market_cap.desc()).limit(sample).all()
+        sentiment = load_sentiment(session, [c.symbol for c in rows])
+        companies = []
+        for company, data in AIScreener()._reanalysis_inputs(rows, archive_session):
+            data['Price'] = company.current_price
+            data['NewsSentiment'] = sentiment.get(company.symbol)
+            companies.append(data)
+    finally:
+        archive_session.close()
+        session.close()
+    benchmark(LLMService(), companies, sizes, dry_run='--dry-run' in args)
@@ -1,12 +1,15 @@
 import os
 import json
+import time
 try:
     import google.generativeai as genai
     HAS_GEMINI = True
 except ImportError:
     HAS_GEMINI = False
 from openai import OpenAI
-from database import get_session, PromptConfig
+from prompt_config import PromptSnapshot, get_prompt_store
+import llm_cache
+from llm_executor import LLMThrottled, backoff_delay
 
 # Configuration par défaut
 DEFAULT_SYSTEM_PROMPT = """
@@ -31,6 +34,63 @@ Rules:
 - Output strictly valid JSON.
 """
 
+RAW_SYSTEM_PROMPT = "You are a helpful financial data analyst. Always respond in strict JSON format."
+
+# Message utilisateur d'une analyse ; fait partie de la clé du cache d'analyses
+USER_PROMPT_TEMPLATE = """
+        Analyze this company:
+        Symbol: {Symbol}
+        Name: {Name}
+        Sector: {Sector}
+        Description: {Description}
+        
+        Financials:
+        - Price: ${Price}
+        - P/E Ratio: {PERatio}
+        - Market Cap: ${MarketCapitalization}
+        - ROE: {ReturnOnEquityTTM}
+        - EPS Growth (5Y): {EPSGrowthPast5Years}
+        - Debt/Equity: {DebtToEquityRatio}
+        {news}
+        Output JSON only.
+        """
+
+def is_failed_analysis(result) -> bool:
+    """True for a missing result or the neutral placeholder analyze_company returns on failure"""
+    if not result or 'score' not in result:
+        return True
+    return str(result.get('reasoning', '')).startswith('Analysis failed')
+
+def news_sentiment_line(sentiment) -> str:
+    """Rolling news sentiment for the prompt (empty when the symbol has no ingested news)"""
+    if not sentiment:
+        return ''
+    return (f"News sentiment (recent-weighted): {sentiment['label']} ({sentiment['score']:+.2f}) "
+            f"over {sentiment['articles']} articles in the last {sentiment.get('window_days', 0):g} days, "
+            f"last on {str(sentiment.get('last_article_at') or '')[:10]}\n")
+
+def throttle_error(error):
+    """LLMThrottled for a 429 / rate-limit / timeout error of any provider, else None"""
+    name = type(error).__name__
+    message = str(error)
+    response = getattr(error, 'response', None)
+    status = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+    timeout = 'Timeout' in name or 'timed out' in message.lower()
+    if not (timeout or status == 429 or '429' in message or 'RateLimit' in name or 'ResourceExhausted' in name):
+        return None
+    retry_after = None
+    try:
+        retry_after = float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return LLMThrottled(f"{name}: {message}", retry_after, timeout=timeout)
+
+def company_prompt(company_data, template=USER_PROMPT_TEMPLATE) -> str:
+    fields = ('Symbol', 'Name', 'Sector', 'Description', 'Price', 'PERatio', 'MarketCapitalization',
+              'ReturnOnEquityTTM', 'EPSGrowthPast5Years', 'DebtToEquityRatio')
+    return template.format(news=news_sentiment_line(company_data.get('NewsSentiment')),
+                           **{field: company_data.get(field) for field in fields})
+
 class LLMService:
     def __init__(self):
         self.provider = "openai"
@@ -64,107 +124,124 @@ class LLMService:
                     self.model = "qwen-plus"
                     self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
 
+    def chat_body(self, system_prompt, user_content) -> dict:
+        """Requête chat au format OpenAI (aussi le "body" d'une ligne de fichier batch)"""
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_content}
+            ],
+            "response_format": {"type": "json_object"}
+        }
+
+    def complete(self, body, usage=None) -> str:
+        """
+        Exécute une requête chat_body sur le provider configuré et renvoie le texte de la réponse.
+        `usage` (dict) reçoit les tokens consommés (prompt_tokens / completion_tokens) quand le provider les donne.
+        """
+        system_prompt, user_content = body["messages"][0]["content"], body["messages"][1]["content"]
+        if self.provider == "gemini":
+            # Google GenAI way
+            model = genai.GenerativeModel(
+                self.model,
+                system_instruction=system_prompt,
+                generation_config={"response_mime_type": "application/json"}
+            )
+            response = model.generate_content(user_content)
+            metadata = getattr(response, 'usage_metadata', None)
+            if usage is not None and metadata is not None:
+                usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + metadata.prompt_token_count
+                usage['completion_tokens'] = usage.get('completion_tokens', 0) + metadata.candidates_token_count
+            return response.text
+        # OpenAI / Qwen way
+        response = self.client.chat.completions.create(**body)
+        if usage is not None and response.usage is not None:
+            usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + response.usage.prompt_tokens
+            usage['completion_tokens'] = usage.get('completion_tokens', 0) + response.usage.completion_tokens
+        return response.choices[0].message.content
+
     def get_current_prompt(self):
-        session = get_session()
-        try:
-            config = session.query(PromptConfig).filter_by(id='default').first()
-            if config and config.system_prompt:
-                return config.system_prompt
-            
-            # If not in DB, init it
-            if not config:
-                new_config = PromptConfig(id='default', system_prompt=DEFAULT_SYSTEM_PROMPT)
-                session.add(new_config)
-                session.commit()
-            
-            return DEFAULT_SYSTEM_PROMPT
-        finally:
-            session.close()
+        return self.current_prompt().text
+
+    def current_prompt(self) -> PromptSnapshot:
+        """Prompt actuel et sa version, servis depuis le cache du process (prompt_config)"""
+        return get_prompt_store(DEFAULT_SYSTEM_PROMPT).current()
 
     def update_prompt(self, new_prompt):
-        session = get_session()
         try:
-            config = session.query(PromptConfig).filter_by(id='default').first()
-            if not config:
-                config = PromptConfig(id='default', system_prompt=new_prompt)
-                session.add(config)
-            else:
-                config.system_prompt = new_prompt
-            session.commit()
+            snapshot = get_prompt_store(DEFAULT_SYSTEM_PROMPT).update(new_prompt)
+            print(f"System prompt updated to version {snapshot.version}.")
             return True
         except Exception as e:
             print(f"Error updating prompt: {e}")
             return False
-        finally:
-            session.close()
 
-    def analyze_company(self, company_data, system_prompt=None):
+    def cache_key(self, company_data, system_prompt) -> str:
+        return llm_cache.analysis_key(system_prompt, f"{self.provider}:{self.model}", USER_PROMPT_TEMPLATE, company_data)
+
+    def cached_analysis(self, company_data, system_prompt=None):
+        """Résultat déjà calculé pour ce prompt, ce modèle et ces inputs (à la tolérance près), sinon None"""
+        if not self.api_key:
+            return None
+        system_prompt = system_prompt or self.get_current_prompt()
+        return llm_cache.lookup(self.cache_key(company_data, system_prompt), company_data)
+
+    def analyze_company(self, company_data, system_prompt=None, raise_on_throttle=False, use_cache=True):
+        """
+        Score one company (dict with score / recommendation / reasoning).
+        With raise_on_throttle, a 429 or timeout raises LLMThrottled at once so a
+        concurrent caller (llm_executor) can shrink its concurrency and back off;
+        otherwise it is retried here with an exponential backoff.
+        use_cache=False skips the cache lookup (caller already looked it up, or a forced
+        rescore after earnings); the fresh result is still stored.
+        """
         if not self.api_key:
             return None
 
         if not system_prompt:
             system_prompt = self.get_current_prompt()
 
-        user_content = f"""
-        Analyze this company:
-        Symbol: {company_data.get('Symbol')}
-        Name: {company_data.get('Name')}
-        Sector: {company_data.get('Sector')}
-        Description: {company_data.get('Description')}
-        
-        Financials:
-        - Price: ${company_data.get('Price')}
-        - P/E Ratio: {company_data.get('PERatio')}
-        - Market Cap: ${company_data.get('MarketCapitalization')}
-        - ROE: {company_data.get('ReturnOnEquityTTM')}
-        - EPS Growth (5Y): {company_data.get('EPSGrowthPast5Years')}
-        - Debt/Equity: {company_data.get('DebtToEquityRatio')}
-        
-        Output JSON only.
-        """
+        # Même prompt, même modèle, inputs quasi identiques : aucun token dépensé
+        key = self.cache_key(company_data, system_prompt)
+        if use_cache:
+            cached = llm_cache.lookup(key, company_data)
+            if cached:
+                print(f"  ♻️ Cached analysis for {company_data.get('Symbol')}")
+                return cached
+
+        result = self._analyze_uncached(company_data, system_prompt, raise_on_throttle)
+        if not is_failed_analysis(result):
+            llm_cache.store(key, f"{self.provider}:{self.model}", company_data, result)
+        return result
+
+    def _analyze_uncached(self, company_data, system_prompt, raise_on_throttle=False):
+        user_content = company_prompt(company_data)
 
         try:
             for attempt in range(3):
                 try:
-                    if self.provider == "gemini" and HAS_GEMINI:
-                        # Google GenAI way
-                        model = genai.GenerativeModel(
-                            self.model,
-                            system_instruction=system_prompt,
-                            generation_config={"response_mime_type": "application/json"}
-                        )
-                        response = model.generate_content(user_content)
-                        return json.loads(response.text)
-                    elif self.provider == "gemini" and not HAS_GEMINI:
+                    if self.provider == "gemini" and not HAS_GEMINI:
                         print("  🔴 Gemini requested but google-generativeai package not installed.")
                         return None
-                        
-                    else:
-                        # OpenAI / Qwen way
-                        if not self.client:
-                            return None
-                            
-                        response = self.client.chat.completions.create(
-                            model=self.model,
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_content}
-                            ],
-                            response_format={"type": "json_object"}
-                        )
-                        content = response.choices[0].message.content
-                        return json.loads(content)
+                    if self.provider != "gemini" and not self.client:
+                        return None
+                    return json.loads(self.complete(self.chat_body(system_prompt, user_content)))
                 except Exception as e:
+                    throttle = throttle_error(e)
+                    if throttle and raise_on_throttle:
+                        raise throttle
                     # Log specific error for each attempt
                     print(f"  ⚠️ Attempt {attempt + 1} failed for {company_data.get('Symbol')}: {str(e)}")
-                    if "429" in str(e) and attempt < 2:
-                        wait_time = (attempt + 1) * 10
-                        print(f"  Got 429 result, retrying in {wait_time}s...")
-                        import time
+                    if throttle and attempt < 2:
+                        wait_time = backoff_delay(throttle, attempt)
+                        print(f"  Got 429 result, retrying in {wait_time:.0f}s...")
                         time.sleep(wait_time)
                         continue
                     raise e
                 
+        except LLMThrottled:
+            raise
         except Exception as e:
             print(f"  🔴 LLM Analysis CRITICAL failure for {company_data.get('Symbol')} ({self.provider}): {e}")
             return {
@@ -182,30 +259,12 @@ class LLMService:
             return None
 
         try:
-            if self.provider == "gemini" and HAS_GEMINI:
-                model = genai.GenerativeModel(
-                    self.model,
-                    system_instruction="You are a helpful financial data analyst. Always respond in strict JSON format.",
-                    generation_config={"response_mime_type": "application/json"}
-                )
-                response = model.generate_content(prompt)
-                return json.loads(response.text)
-            elif self.provider == "gemini" and not HAS_GEMINI:
+            if self.provider == "gemini" and not HAS_GEMINI:
                 print("  🔴 Gemini requested but google-generativeai package not installed.")
                 return None
-            else:
-                if not self.client:
-                    return None
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful financial data analyst. Always respond in strict JSON format."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                content = response.choices[0].message.content
-                return json.loads(content)
+            if self.provider != "gemini" and not self.client:
+                return None
+            return json.loads(self.complete(self.chat_body(RAW_SYSTEM_PROMPT, prompt)))
         except Exception as e:
             print(f"  🔴 LLM raw analysis failed ({self.provider}): {e}")
             return None
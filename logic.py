@@ -1,71 +1,116 @@
-import requests
-import json
 import os
-import time
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from typing import Dict, List, Tuple
 from dotenv import load_dotenv
 from database import get_session, CompanyAnalysis
-from llm_service import LLMService
+from llm_service import LLMService, is_failed_analysis
+from llm_executor import (AIMDLimiter, AdaptiveExecutor, LLMThrottled, backoff_delay,
+                          LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX)
+from llm_packing import LLM_PACK_SIZE, analyze_packed, cached_packed, chunked
+from alpha_vantage import AlphaVantageThrottled
+from market_data import get_provider
+from pipeline import Pipeline, Stage, RetryLater
+from jobs import JobTracker
+from sharding import shard_from_env, shard_from_args, shard_groups, shard_kind, is_leader
+from universe import (UNIVERSE_MODE, get_registry, load_listed_universe, listed_names,
+                      group_share_classes, company_share_classes, record_market_cap)
+from earnings_calendar import refresh_earnings_calendar, load_report_dates
+from news_sentiment import NEWS_CYCLE_BUDGET, ingest_news, load_sentiment
+from payload_archive import archive_overview, iter_latest_payloads
+from scheduler import (StalenessQueue, load_freshness, issuer_freshness, is_due, scoring_inputs,
+                       inputs_changed_materially, PRICE_MAX_AGE)
 
 # Load environment variables from .env
 load_dotenv()
 
+# Nombre de fois qu'un symbole est remis en file après un throttle Alpha Vantage
+MAX_THROTTLE_RETRIES = 5
+THROTTLE_RETRY_DELAY = 60
+
+# Taille des files entre les étapes du pipeline ; le nombre d'analyses LLM en parallèle
+# est ajusté en cours de run (llm_executor, LLM_INITIAL_CONCURRENCY..LLM_MAX_CONCURRENCY)
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '4'))
+
+# Colonnes du score LLM recopiées de la classe principale vers les autres classes d'actions
+SCORE_COLUMNS = ('ai_impact_score', 'recommendation', 'reasoning', 'analysis_json',
+                 'analysis_inputs', 'analysis_updated_at', 'analysis_prompt_version')
+
+# REALTIME_BULK_QUOTES accepte jusqu'à 100 symboles par requête.
+# Hors-ligne : MARKET_DATA_PROVIDER=local (dump ou ALPHA_VANTAGE_BULK_QUOTES_FIXTURE, voir market_data)
+BULK_QUOTE_SIZE = 100
+
+def pipeline_job(symbol: str, sector: str, state=None, reported: bool = False, share_classes=()) -> dict:
+    """
+    Job d'un émetteur dans le pipeline fetch → quote → analyze → persist (seul constructeur :
+    les étapes comptent sur toutes ces clés). share_classes : (symbole, secteur, état) des autres
+    classes d'actions, qui reçoivent leur propre prix et les fondamentaux / le score de l'émetteur.
+    """
+    return {'symbol': symbol, 'sector': sector, 'state': state, 'reported': reported,
+            'share_classes': [{'symbol': s, 'sector': d, 'state': st} for s, d, st in share_classes]}
+
 class AIScreener:
-    def __init__(self):
-        self.api_key = os.getenv('ALPHA_VANTAGE_API_KEY')
-        # On ne lève plus d'erreur ici pour permettre l'utilisation hors-ligne (re-analyse DB)
-        
-        self.base_url = 'https://www.alphavantage.co/query'
+    def __init__(self, shard=None):
+        # Source des données de marché (MARKET_DATA_PROVIDER) : Alpha Vantage via le pool de clés
+        # ALPHA_VANTAGE_API_KEYS, ou dumps locaux. Aucune erreur ici pour permettre l'utilisation hors-ligne
+        self.market_data = get_provider()
         self.llm_service = LLMService()
-        
-        # Charger la liste du S&P 500 depuis le fichier JSON
-        json_path = os.path.join(os.path.dirname(__file__), 'sp500.json')
-        try:
-            with open(json_path, 'r') as f:
-                self.software_companies = json.load(f)
-        except Exception as e:
-            print(f"Erreur lors du chargement de sp500.json: {e}")
-            self.software_companies = {}
+        # Shard "i/N" de ce worker (--shard ou SHARD) : plusieurs machines se partagent l'univers
+        self.shard = shard if shard is not None else shard_from_env()
+
+    @property
+    def software_companies(self) -> Dict[str, str]:
+        """Univers S&P 500 (symbole -> "Nom - Secteur"), partagé par le process et rechargé si sp500.json change"""
+        return get_registry().descriptions()
     
     def get_company_overview(self, symbol: str) -> dict:
-        """Récupère les données de base d'une entreprise via Alpha Vantage"""
-        params = {
-            'function': 'OVERVIEW',
-            'symbol': symbol,
-            'apikey': self.api_key
-        }
-        
+        """Récupère les données de base d'une entreprise (format OVERVIEW)"""
         try:
-            response = requests.get(self.base_url, params=params)
-            data = response.json()
+            data = self.market_data.company_overview(symbol)
             if 'Symbol' in data:
                 return data
             else:
                 print(f"Erreur pour {symbol}: {data}")
                 return {}
+        except AlphaVantageThrottled:
+            raise
         except Exception as e:
             print(f"Erreur lors de la récupération des données pour {symbol}: {e}")
             return {}
 
     def get_stock_quote(self, symbol: str) -> float:
-        """Récupère le prix actuel d'une action via Alpha Vantage GLOBAL_QUOTE"""
-        params = {
-            'function': 'GLOBAL_QUOTE',
-            'symbol': symbol,
-            'apikey': self.api_key
-        }
+        """Récupère le prix actuel d'une action (format GLOBAL_QUOTE)"""
         try:
-            response = requests.get(self.base_url, params=params)
-            data = response.json()
+            data = self.market_data.global_quote(symbol)
             if "Global Quote" in data:
                 price_str = data["Global Quote"].get("05. price")
                 return self._safe_float(price_str)
             return 0.0
+        except AlphaVantageThrottled:
+            raise
         except Exception as e:
             print(f"Erreur lors de la récupération du prix pour {symbol}: {e}")
             return 0.0
-    
+
+    def get_bulk_quotes(self, symbols: List[str]) -> Dict[str, float]:
+        """Récupère les prix par paquets de 100 symboles via REALTIME_BULK_QUOTES"""
+        prices = {}
+        for i in range(0, len(symbols), BULK_QUOTE_SIZE):
+            chunk = symbols[i:i + BULK_QUOTE_SIZE]
+            try:
+                data = self.market_data.bulk_quotes(chunk)
+            except Exception as e:
+                print(f"Erreur lors de la récupération des prix en lot ({chunk[0]}...): {e}")
+                continue
+            if 'data' not in data:
+                # Endpoint premium : la clé gratuite reçoit un message au lieu des données
+                print(f"Bulk quotes indisponibles: {data.get('Information') or data.get('message') or data}")
+                break
+            for row in data['data']:
+                price = self._safe_float(row.get('close'))
+                if row.get('symbol') and price > 0:
+                    prices[row['symbol']] = price
+        return prices
+
     def _safe_float(self, value):
         if value is None or value == 'None' or value == '-':
             return 0.0
@@ -74,142 +119,366 @@ class AIScreener:
         except (ValueError, TypeError):
             return 0.0
 
-    def update_database(self):
-        """Met à jour la base de données : télécharge seulement si nécessaire"""
+    def _universe(self, session) -> Tuple[Dict[str, str], Dict[str, List[str]]]:
+        """
+        Univers du cycle (S&P 500 ou toutes les actions US) et ses émetteurs
+        (symbole principal -> classes d'actions), restreints au shard de ce worker.
+        Le shard est calculé sur le symbole principal : toutes les classes d'un émetteur
+        restent dans le même shard.
+        """
+        if UNIVERSE_MODE == 'us_listed':
+            universe = load_listed_universe(session)
+            # Noms LISTING_STATUS pour les symboles jamais analysés (pas encore de description)
+            names = {**listed_names(session), **{s: d for s, d in universe.items() if d}}
+            groups = group_share_classes({symbol: names.get(symbol) for symbol in universe})
+        else:
+            universe = self.software_companies
+            groups = get_registry().share_classes()
+        if self.shard:
+            groups = shard_groups(groups, self.shard)
+            universe = {symbol: universe[symbol] for symbols in groups.values() for symbol in symbols}
+            print(f"Shard {self.shard[0]}/{self.shard[1]}: {len(universe)} symbols.")
+        return universe, groups
+
+    def _symbols_to_refresh(self, session, max_symbols=None, time_budget=None):
+        """
+        Itère sur les symboles dont les fondamentaux sont à rafraîchir, les plus anciens d'abord.
+        L'état de fraîcheur est chargé en une seule requête ; les fondamentaux récents
+        sont ignorés (l'utilisateur peut forcer une ré-analyse via /api/reanalyze).
+        Le job 'update_database' reprend là où un run interrompu s'est arrêté et
+        saute les symboles en attente de retry ou dans le dead-letter set.
+        """
+        freshness = load_freshness(session)
+        universe, groups = self._universe(session)
+        # Fondamentaux : seulement les sociétés qui ont publié depuis le dernier fetch
+        # Calendrier commun à tous les shards : seul le shard 0 le synchronise
+        if is_leader(self.shard):
+            refresh_earnings_calendar(session, self.market_data)
+        if NEWS_CYCLE_BUDGET:
+            # Nouveaux articles seulement (curseur par symbole), les moins récemment interrogés d'abord
+            ingest_news(universe, provider=self.market_data, max_calls=NEWS_CYCLE_BUDGET)
+        # Agrégats de sentiment lus une seule fois pour tout le cycle
+        self.news_sentiment = load_sentiment(session)
+        # Une entrée par émetteur (GOOGL/GOOG, FOXA/FOX...) : OVERVIEW et LLM une seule fois,
+        # à l'âge de sa classe d'actions la plus ancienne
+        issuers = {primary: universe[primary] for primary in groups}
+        queue = StalenessQueue(issuers, issuer_freshness(freshness, groups), report_dates=load_report_dates(session))
+        print(f"{len(queue)} issuers stale ({len(queue.reported)} reported earnings), {queue.fresh} fresh.")
+        # Job roulant : réconcilié avec la file du cycle (symboles redevenus périmés réadmis,
+        # symboles sortis de la file retirés), donc un run plafonné ne gèle aucun symbole
+        self.job = JobTracker.start_or_resume(shard_kind('update_database', self.shard), queue.symbols(), prune=True)
+        budget = {'allowed': set(self.job.runnable())}
+        if max_symbols is not None:
+            budget['max_symbols'] = max_symbols
+        if time_budget is not None:
+            budget['time_budget'] = time_budget
+        for symbol, sector_desc in queue.drain(**budget):
+            yield pipeline_job(symbol, sector_desc, freshness.get(symbol), reported=symbol in queue.reported,
+                               share_classes=[(s, universe[s], freshness.get(s)) for s in groups[symbol][1:]])
+
+    def _fetch_stage(self, job: dict):
+        print(f"Fetching API data for {job['symbol']}...")
+        try:
+            company_data = self.get_company_overview(job['symbol'])
+        except AlphaVantageThrottled as e:
+            raise RetryLater(str(e), e.retry_after)
+        if not company_data:
+            print(f"Skipping {job['symbol']} due to API error")
+            return None
+        job['overview'] = dict(company_data)
+        job['company_data'] = company_data
+        return job
+
+    def _quote_stage(self, job: dict):
+        # Un prix par classe d'actions ; après un throttle, les prix déjà obtenus sont conservés
+        for member in [job] + job['share_classes']:
+            if 'price' not in member:
+                self._quote_member(member)
+        return job
+
+    def _quote_member(self, member: dict):
+        # Le tier prix (refresh_prices) tourne en intraday : on réutilise un prix récent
+        state = member['state']
+        if state and state.current_price and not is_due(state.price_updated_at, PRICE_MAX_AGE):
+            member['price'] = state.current_price
+            member['price_fetched'] = False
+            return
+
+        # Fetch price separately since OVERVIEW doesn't have it
+        print(f"Fetching Price for {member['symbol']}...")
+        try:
+            price = self.get_stock_quote(member['symbol'])
+        except AlphaVantageThrottled as e:
+            raise RetryLater(str(e), e.retry_after)
+        member['price'] = price
+        member['price_fetched'] = price > 0
+
+    def _analyze_stage(self, job: dict, current_prompt: str):
+        # Inject correct price into company_data for LLM
+        job['company_data']['Price'] = job['price']
+        job['company_data']['NewsSentiment'] = self.news_sentiment.get(job['symbol'])
+        job['inputs'] = scoring_inputs(job['company_data'])
+        job['llm_result'] = None
+
+        state = job['state']
+        # Nouvelle publication de résultats : on re-score même si les inputs ont peu bougé
+        if state and not job.get('reported') and not inputs_changed_materially(state.analysis_inputs, job['inputs']):
+            print(f"Inputs unchanged for {job['symbol']}, keeping current score.")
+            return job
+
+        # Après une publication, le score en cache (même à inputs proches) est justement celui à remplacer
+        if not job.get('reported'):
+            job['llm_result'] = self.llm_service.cached_analysis(job['company_data'], current_prompt)
+        if job['llm_result'] is None:
+            print(f"Analyzing {job['symbol']} with LLM...")
+            # Concurrence adaptative : un 429 réduit le nombre d'appels en vol et remet le job en file
+            try:
+                with self.llm_limiter.slot():
+                    job['llm_result'] = self.llm_service.analyze_company(
+                        job['company_data'], current_prompt, raise_on_throttle=True, use_cache=False)
+            except LLMThrottled as e:
+                self.llm_limiter.throttled(backoff_delay(e, 0), timeout=e.timeout)
+                raise RetryLater(str(e), e.retry_after)
+            # Réponse de repli (échec provider) : comptée en erreur, elle ne doit pas augmenter la concurrence
+            if is_failed_analysis(job['llm_result']):
+                self.llm_limiter.error()
+            else:
+                self.llm_limiter.success()
+        return None if is_failed_analysis(job['llm_result']) else job
+
+    def _persist_stage(self, job: dict, session):
+        symbol = job['symbol']
+        company_data = job['company_data']
+        llm_result = job['llm_result']
+        now = datetime.now(timezone.utc)
+        new_data = {
+            'symbol': symbol,
+            'company_name': company_data.get('Name', symbol),
+            # Univers LISTING_STATUS : pas de description "Nom - Secteur" avant le premier OVERVIEW
+            'sector': job['sector'] or f"{company_data.get('Name', symbol)} - {str(company_data.get('Sector', '')).title()}",
+            'current_price': job['price'],
+            'market_cap': self._safe_float(company_data.get('MarketCapitalization')),
+            'pe_ratio': self._safe_float(company_data.get('PERatio')),
+            'roe': self._safe_float(company_data.get('ReturnOnEquityTTM')),
+            'eps_growth': self._safe_float(company_data.get('EPSGrowthPast5Years')),
+            'debt_to_equity': self._safe_float(company_data.get('DebtToEquityRatio')),
+            'fundamentals_updated_at': now,
+        }
+        if job.get('price_fetched'):
+            new_data['price_updated_at'] = now
+        if llm_result:
+            new_data.update({
+                'ai_impact_score': llm_result.get('score', 50),
+                'recommendation': llm_result.get('recommendation', 'NEUTRAL'),
+                'reasoning': llm_result.get('reasoning', 'Analysis failed'),
+                'analysis_json': llm_result,
+                'analysis_inputs': job['inputs'],
+                'analysis_updated_at': now,
+                'analysis_prompt_version': self.prompt_version,
+            })
+        
+        try:
+            primary = self._upsert_company(session, new_data)
+            # Payload OVERVIEW brut archivé pour les ré-analyses hors-ligne
+            archive_overview(session, symbol, job['overview'])
+            record_market_cap(session, symbol, new_data['market_cap'])
+            for member in job['share_classes']:
+                member_data = dict(new_data, symbol=member['symbol'], current_price=member['price'],
+                                   sector=member['sector'] or new_data['sector'])
+                member_data.pop('price_updated_at', None)
+                if member.get('price_fetched'):
+                    member_data['price_updated_at'] = now
+                # Même émetteur : même score, y compris quand seul le principal était déjà noté
+                member_data.update({column: getattr(primary, column) for column in SCORE_COLUMNS})
+                self._upsert_company(session, member_data)
+                record_market_cap(session, member['symbol'], new_data['market_cap'])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        classes = ''.join(f", {m['symbol']}" for m in job['share_classes'])
+        print(f"Updated {symbol}{classes} in DB{' (rescored)' if llm_result else ''}.")
+        return job
+
+    def _upsert_company(self, session, data: dict) -> CompanyAnalysis:
+        existing = session.query(CompanyAnalysis).filter_by(symbol=data['symbol']).first()
+        if existing:
+            for key, value in data.items():
+                setattr(existing, key, value)
+            return existing
+        company = CompanyAnalysis(**data)
+        session.add(company)
+        return company
+
+    def update_database(self, max_symbols=None, time_budget=None):
+        """
+        Met à jour la base de données : télécharge seulement si nécessaire, les données
+        les plus anciennes en premier, dans la limite du budget du cycle.
+        Pipeline fetch → quote → analyze → persist : les appels LLM du symbole N
+        tournent pendant que les appels API du symbole N+1 attendent le quota.
+        """
         session = get_session()
+        persist_session = get_session()
         
-        # Charger le prompt actuel une fois
-        current_prompt = self.llm_service.get_current_prompt()
+        # Charger le prompt actuel une fois ; sa version est enregistrée avec chaque score
+        current_prompt, self.prompt_version = self.llm_service.current_prompt()
+        self.llm_limiter = AIMDLimiter()
         print("Using System Prompt for Analysis...")
         
-        for i, (symbol, sector_desc) in enumerate(self.software_companies.items()):
-            existing = session.query(CompanyAnalysis).filter_by(symbol=symbol).first()
-            
-            # Logique de mise à jour:
-            # 1. Si pas de données, on fetch tout.
-            # 2. Si données > 24h, on fetch tout.
-            # 3. Si on demande explicitement un 're-run' (via un flag, à implémenter plus tard), sinon on update juste l'analyse si le prompt a changé
-            
-            should_fetch_api = True
-            if existing and existing.last_updated:
-                 last_updated = existing.last_updated.replace(tzinfo=None) if existing.last_updated else None
-                 if last_updated and datetime.now() - last_updated < timedelta(hours=24):
-                     should_fetch_api = False
-
-            company_data = {}
-            if should_fetch_api:
-                print(f"Fetching API data for {symbol}...")
-                company_data = self.get_company_overview(symbol)
-                if not company_data:
-                    print(f"Skipping {symbol} due to API error")
-                    continue
-                # Respecter le quota API
-                print("Sleeping 12s for API limit...")
-                time.sleep(12)
+        # Le quota API est géré par le token bucket partagé (pas de sleep fixe),
+        # un throttle remet le symbole dans sa file avec un backoff exponentiel.
+        # Chaque symbole terminé ou en échec est checkpointé dans le job.
+        def on_finish(job, outcome, error):
+            if outcome == 'done':
+                self.job.mark_done(job['symbol'])
             else:
-                # Si les données sont fraîches (<24h), on ne fait rien dans le cycle automatique
-                # L'utilisateur peut forcer une ré-analyse via /api/reanalyze qui utilise reanalyze_existing_data
-                print(f"Data fresh for {symbol}. Skipping API fetch.")
-                continue
+                self.job.mark_failed(job['symbol'], error)
 
-            # Si on est ici, c'est qu'on a fetched des nouvelles données API
-            if company_data:
-                # Fetch price separately since OVERVIEW doesn't have it
-                print(f"Fetching Price for {symbol}...")
-                current_price = self.get_stock_quote(symbol)
-                time.sleep(12) # Wait for another API slot
-
-                print(f"Analyzing {symbol} with LLM...")
-                # Inject correct price into company_data for LLM
-                company_data['Price'] = current_price
-                llm_result = self.llm_service.analyze_company(company_data, current_prompt)
-                
-                if llm_result:
-                    new_data = {
-                        'symbol': symbol,
-                        'company_name': company_data.get('Name', symbol),
-                        'sector': sector_desc,
-                        'current_price': current_price,
-                        'market_cap': self._safe_float(company_data.get('MarketCapitalization')),
-                        'pe_ratio': self._safe_float(company_data.get('PERatio')),
-                        'roe': self._safe_float(company_data.get('ReturnOnEquityTTM')),
-                        'eps_growth': self._safe_float(company_data.get('EPSGrowthPast5Years')),
-                        'debt_to_equity': self._safe_float(company_data.get('DebtToEquityRatio')),
-                        
-                        'ai_impact_score': llm_result.get('score', 50),
-                        'recommendation': llm_result.get('recommendation', 'NEUTRAL'),
-                        'reasoning': llm_result.get('reasoning', 'Analysis failed'),
-                        'analysis_json': llm_result
-                    }
-                    
-                    if existing:
-                        for key, value in new_data.items():
-                            setattr(existing, key, value)
-                    else:
-                        new_record = CompanyAnalysis(**new_data)
-                        session.add(new_record)
-                    session.commit()
-                    print(f"Updated {symbol} in DB.")
-
-        session.close()
+        pipeline = Pipeline([
+            Stage('fetch', self._fetch_stage, max_retries=MAX_THROTTLE_RETRIES, retry_delay=THROTTLE_RETRY_DELAY),
+            Stage('quote', self._quote_stage, max_retries=MAX_THROTTLE_RETRIES, retry_delay=THROTTLE_RETRY_DELAY),
+            Stage('analyze', lambda job: self._analyze_stage(job, current_prompt), workers=self.llm_limiter.maximum,
+                  max_retries=LLM_MAX_RETRIES, retry_delay=LLM_BACKOFF_BASE, max_retry_delay=LLM_BACKOFF_MAX),
+            Stage('persist', lambda job: self._persist_stage(job, persist_session)),
+        ], maxsize=PIPELINE_QUEUE_SIZE, on_finish=on_finish)
+        
+        try:
+            pipeline.run(self._symbols_to_refresh(session, max_symbols, time_budget))
+            self.job.finish()
+            print(f"LLM concurrency: {self.llm_limiter.stats()}")
+        finally:
+            session.close()
+            persist_session.close()
         print("Database update cycle complete.")
 
-    def reanalyze_existing_data(self):
-        """Ré-analyse toutes les entreprises en base avec le prompt actuel (sans fetch API)"""
+    def _pseudo_company_data(self, company) -> dict:
+        """Reconstruit un objet pseudo-data depuis les colonnes (entreprises jamais archivées)"""
+        return {
+            'Symbol': company.symbol,
+            'Name': company.company_name,
+            'Sector': company.sector,
+            'Description': company.sector, # Fallback : pas de payload OVERVIEW archivé
+            'PERatio': company.pe_ratio,
+            'MarketCapitalization': company.market_cap,
+            'ReturnOnEquityTTM': company.roe,
+            'EPSGrowthPast5Years': company.eps_growth,
+            'DebtToEquityRatio': company.debt_to_equity
+        }
+
+    def _reanalysis_inputs(self, companies, archive_session):
+        """
+        Itère sur (company, company_data) : le payload OVERVIEW complet archivé quand il existe
+        (streamé depuis l'archive), sinon la reconstruction depuis les colonnes.
+        """
+        by_symbol = {c.symbol: c for c in companies}
+        for symbol, payload in iter_latest_payloads(archive_session, by_symbol.keys()):
+            company = by_symbol.pop(symbol, None)
+            if company is not None:
+                yield company, payload
+        for company in by_symbol.values():
+            yield company, self._pseudo_company_data(company)
+
+    def reanalyze_existing_data(self, batch=False):
+        """
+        Ré-analyse toutes les entreprises en base avec le prompt actuel (sans fetch API).
+        Checkpointé dans le job 'reanalyze' (batch compris) : un run interrompu reprend sans repayer
+        les analyses déjà faites, les échecs sont retentés avec backoff.
+        batch=True : écrit les prompts dans un fichier batch soumis au provider (llm_batch)
+        et rend la main ; `python llm_batch.py poll` applique les scores une fois le batch terminé.
+        """
+        if batch:
+            from llm_batch import submit_batch
+            return submit_batch('reanalyze', shard=self.shard, llm_service=self.llm_service)
         session = get_session()
+        # Session dédiée à la lecture en streaming de l'archive (on commit sur l'autre)
+        archive_session = get_session()
         companies = session.query(CompanyAnalysis).all()
+        by_symbol = {c.symbol: c for c in companies}
+        # Une analyse par émetteur, recopiée sur ses autres classes d'actions
+        groups = shard_groups(company_share_classes(companies), self.shard)
+        # Mêmes inputs que le cycle update_database (prix et sentiment des news), donc mêmes clés de cache
+        news_sentiment = load_sentiment(session, list(groups))
+        
+        # Un job par version du prompt : ce qui a été fait sous l'ancien prompt est refait
+        current_prompt, prompt_version = self.llm_service.current_prompt()
+        job = JobTracker.start_or_resume(shard_kind('reanalyze', self.shard), list(groups),
+                                         scope=f"prompt-v{prompt_version}")
+        runnable = set(job.runnable())
+        companies = [by_symbol[primary] for primary in groups if primary in runnable]
         
-        current_prompt = self.llm_service.get_current_prompt()
-        print(f"Re-analyzing {len(companies)} companies with updated prompt...")
+        print(f"Re-analyzing {len(companies)} issuers with prompt v{prompt_version}...")
         
-        for i, company in enumerate(companies):
-            # Reconstruire un objet pseudo-data pour l'LLM
-            # Note: C'est une approximation car on n'a pas gardé tout le JSON raw d'Alpha Vantage
-            # Mais on a les métriques clés stockées en colonnes.
-            company_data = {
-                'Symbol': company.symbol,
-                'Name': company.company_name,
-                'Sector': company.sector,
-                # Description n'était pas stockée dans les colonnes principales, mais peut-être dans analysis_json ?
-                # Pour l'instant on fait sans description ou on la récupère si possible.
-                'Description': company.sector, # Fallback
-                'Price': company.current_price,
-                'PERatio': company.pe_ratio,
-                'MarketCapitalization': company.market_cap,
-                'ReturnOnEquityTTM': company.roe,
-                'EPSGrowthPast5Years': company.eps_growth,
-                'DebtToEquityRatio': company.debt_to_equity
-            }
-            
-            # Essayer de récupérer la description depuis le json stocké si dispo
-            if company.analysis_json and isinstance(company.analysis_json, dict):
-                 # Ce dictionnaire contient le résultat de l'LLM précédent, pas les données brutes AV
-                 pass
-
-            print(f"[{i+1}/{len(companies)}] Re-analyzing {company.symbol} ({self.llm_service.provider})...")
-            llm_result = self.llm_service.analyze_company(company_data, current_prompt)
-            
-            if llm_result and 'score' in llm_result:
+        def apply(company, company_data, llm_result, error=None):
+            if not is_failed_analysis(llm_result):
                 print(f"  ✅ SUCCESS: {company.symbol} | Score: {llm_result.get('score')} | Rec: {llm_result.get('recommendation')}")
-                company.ai_impact_score = llm_result.get('score')
-                company.recommendation = llm_result.get('recommendation')
-                company.reasoning = llm_result.get('reasoning')
-                company.analysis_json = llm_result
+                inputs = scoring_inputs(company_data)
+                now = datetime.now(timezone.utc)
+                for symbol in groups[company.symbol]:
+                    member = by_symbol[symbol]
+                    member.ai_impact_score = llm_result.get('score')
+                    member.recommendation = llm_result.get('recommendation')
+                    member.reasoning = llm_result.get('reasoning')
+                    member.analysis_json = llm_result
+                    member.analysis_inputs = inputs
+                    member.analysis_updated_at = now
+                    member.analysis_prompt_version = prompt_version
                 
                 # Commit immediately to database after each success
                 session.commit()
-                print(f"  💾 Saved {company.symbol} to database.")
+                job.mark_done(company.symbol)
+                print(f"  💾 Saved {', '.join(groups[company.symbol])} to database.")
             else:
-                print(f"  ❌ FAILED: {company.symbol} - No valid result from LLM.")
-            
-            # Rate limiting
-            time.sleep(1)
+                job.mark_failed(company.symbol, error or (llm_result or {}).get('reasoning', 'No valid result from LLM'))
+                print(f"  ❌ FAILED: {company.symbol} - {error or 'No valid result from LLM.'}")
+
+        # Prompt inchangé et inputs stables : résultat du cache, sans appel LLM.
+        # Les payloads sont streamés depuis l'archive : seuls les éléments en vol de
+        # l'exécuteur sont en mémoire, même quand tout est à ré-analyser
+        counts = {'cached': 0, 'analyzed': 0}
+
+        def misses():
+            for company, company_data in self._reanalysis_inputs(companies, archive_session):
+                company_data['Price'] = company.current_price
+                company_data['NewsSentiment'] = news_sentiment.get(company.symbol)
+                if LLM_PACK_SIZE > 1:
+                    llm_result = cached_packed(self.llm_service, company_data, current_prompt)
+                else:
+                    llm_result = self.llm_service.cached_analysis(company_data, current_prompt)
+                if llm_result is not None:
+                    counts['cached'] += 1
+                    apply(company, company_data, llm_result)
+                else:
+                    counts['analyzed'] += 1
+                    yield company, company_data
+
+        # Appels concurrents, concurrence ajustée (AIMD) sur les 429 / timeouts du provider ;
+        # les écritures en base restent dans ce thread
+        if LLM_PACK_SIZE > 1:
+            # K entreprises par requête ; les éléments manquants ou invalides repassent en appel unitaire
+            executor = AdaptiveExecutor(lambda pack: analyze_packed(
+                self.llm_service, [data for _, data in pack], current_prompt, raise_on_throttle=True, use_cache=False),
+                failed=lambda results: all(is_failed_analysis(r) for r in (results or {}).values()))
+
+            def apply_pack(pack, results, error):
+                for company, company_data in pack:
+                    apply(company, company_data, (results or {}).get(company.symbol), error)
+            executor.run(chunked(misses(), LLM_PACK_SIZE), apply_pack)
+        else:
+            executor = AdaptiveExecutor(
+                lambda item: self.llm_service.analyze_company(item[1], current_prompt, raise_on_throttle=True,
+                                                             use_cache=False),
+                failed=is_failed_analysis)
+            executor.run(misses(), lambda item, llm_result, error: apply(item[0], item[1], llm_result, error))
+        print(f"{counts['analyzed']} issuers analyzed with {self.llm_service.provider}, {counts['cached']} from cache.")
         
+        job.finish()
+        archive_session.close()
         session.close()
         print("Re-analysis cycle complete.")
 
 def main():
-    screener = AIScreener()
+    # python logic.py [--shard i/N]
+    screener = AIScreener(shard=shard_from_args())
     screener.update_database()
 
 if __name__ == "__main__":
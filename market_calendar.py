@@ -0,0 +1,223 @@
+"""
+Offline exchange trading calendar (NYSE / NASDAQ), built from a rules table.
+
+Holidays are computed from rules (fixed dates with weekend observance, n-th weekday
+of a month, Easter offsets), plus a table of one-off closures. Extra dates can be
+added without a code change through MARKET_CALENDAR_FILE, a JSON file such as
+{"closed": ["2030-01-02"], "early_close": ["2030-07-03"]}.
+
+The refresh scheduler uses it so prices and fundamentals are only refetched when a
+session has actually traded since the last fetch (nothing on weekends and holidays).
+"""
+import json
+import os
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Optional, Set
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+MONDAY, TUESDAY, WEDNESDAY, THURSDAY, FRIDAY = range(5)
+
+# (name, kind, params, first year)
+#   fixed  : (month, day) moved to Friday / Monday when on a weekend
+#   fixed_no_saturday : same, but a Saturday holiday is not observed (New Year: no Dec 31 closure)
+#   nth    : (month, weekday, n), n = -1 for the last one of the month
+#   easter : (offset in days from Easter Sunday,)
+HOLIDAY_RULES = [
+    ("New Year's Day", 'fixed_no_saturday', (1, 1), 1900),
+    ("Martin Luther King Jr. Day", 'nth', (1, MONDAY, 3), 1998),
+    ("Washington's Birthday", 'nth', (2, MONDAY, 3), 1971),
+    ("Good Friday", 'easter', (-2,), 1900),
+    ("Memorial Day", 'nth', (5, MONDAY, -1), 1971),
+    ("Juneteenth", 'fixed', (6, 19), 2022),
+    ("Independence Day", 'fixed', (7, 4), 1900),
+    ("Labor Day", 'nth', (9, MONDAY, 1), 1900),
+    ("Thanksgiving Day", 'nth', (11, THURSDAY, 4), 1942),
+    ("Christmas Day", 'fixed', (12, 25), 1900),
+]
+
+# 13:00 closes: the day before Independence Day, the day after Thanksgiving, Christmas Eve
+EARLY_CLOSE_RULES = [
+    ("Independence Day Eve", 'fixed_eve', (7, 3), 1900),
+    ("Black Friday", 'nth_after', (11, THURSDAY, 4, 1), 1942),
+    ("Christmas Eve", 'fixed_eve', (12, 24), 1900),
+]
+
+# Closures that no rule predicts (national days of mourning, hurricane...)
+SPECIAL_CLOSURES = {
+    date(2012, 10, 29): "Hurricane Sandy",
+    date(2012, 10, 30): "Hurricane Sandy",
+    date(2018, 12, 5): "National Day of Mourning (G. H. W. Bush)",
+    date(2025, 1, 9): "National Day of Mourning (J. Carter)",
+}
+
+EXCHANGE_TZ = 'America/New_York'
+SESSION_OPEN = time(9, 30)
+SESSION_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+
+_calendar = None
+_calendar_lock = threading.Lock()
+
+
+def easter_sunday(year: int) -> date:
+    """Anonymous Gregorian algorithm."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day: date, saturday_observed: bool = True) -> Optional[date]:
+    if day.weekday() == 5:
+        return day - timedelta(days=1) if saturday_observed else None
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def _apply_rule(kind: str, params: tuple, year: int) -> Optional[date]:
+    if kind == 'fixed':
+        return _observed(date(year, *params))
+    if kind == 'fixed_no_saturday':
+        return _observed(date(year, *params), saturday_observed=False)
+    if kind == 'fixed_eve':
+        return date(year, *params)
+    if kind == 'nth':
+        return nth_weekday(year, *params)
+    if kind == 'nth_after':
+        month, weekday, n, offset = params
+        return nth_weekday(year, month, weekday, n) + timedelta(days=offset)
+    if kind == 'easter':
+        return easter_sunday(year) + timedelta(days=params[0])
+    raise ValueError(f"Unknown calendar rule kind {kind!r}")
+
+
+def _load_extra(path: Optional[str]) -> Dict[str, Set[date]]:
+    extra = {'closed': set(), 'early_close': set()}
+    if not path or not os.path.exists(path):
+        return extra
+    with open(path, 'r') as f:
+        data = json.load(f)
+    for key in extra:
+        extra[key] = {datetime.strptime(d, '%Y-%m-%d').date() for d in data.get(key, [])}
+    return extra
+
+
+class MarketCalendar:
+    def __init__(self, holiday_rules=HOLIDAY_RULES, early_close_rules=EARLY_CLOSE_RULES,
+                 special_closures=SPECIAL_CLOSURES, extra_file: Optional[str] = None, tz: str = EXCHANGE_TZ):
+        self.holiday_rules = holiday_rules
+        self.early_close_rules = early_close_rules
+        extra = _load_extra(extra_file or os.getenv('MARKET_CALENDAR_FILE'))
+        self.special_closures = set(special_closures) | extra['closed']
+        self.extra_early_closes = extra['early_close']
+        # Without tz data the session hours are taken as EST (UTC-5) all year
+        self.tz = ZoneInfo(tz) if ZoneInfo else timezone(timedelta(hours=-5))
+        self.holidays = lru_cache(maxsize=64)(self._holidays)
+        self.early_closes = lru_cache(maxsize=64)(self._early_closes)
+
+    def _holidays(self, year: int) -> Set[date]:
+        days = set()
+        for _, kind, params, since in self.holiday_rules:
+            if year >= since:
+                day = _apply_rule(kind, params, year)
+                if day is not None:
+                    days.add(day)
+        days.update(d for d in self.special_closures if d.year == year)
+        return days
+
+    def _early_closes(self, year: int) -> Set[date]:
+        days = set()
+        for _, kind, params, since in self.early_close_rules:
+            if year >= since:
+                day = _apply_rule(kind, params, year)
+                if day is not None and self.is_trading_day(day):
+                    days.add(day)
+        days.update(d for d in self.extra_early_closes if d.year == year)
+        return days
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays(day.year)
+
+    def previous_trading_day(self, day: date) -> date:
+        """Last trading day strictly before `day`."""
+        day -= timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def next_trading_day(self, day: date) -> date:
+        """First trading day strictly after `day`."""
+        day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def _utc(self, day: date, at: time) -> datetime:
+        """Exchange-local time of `day` as a naive UTC datetime (the scheduler's convention)."""
+        return datetime.combine(day, at, tzinfo=self.tz).astimezone(timezone.utc).replace(tzinfo=None)
+
+    def session_open(self, day: date) -> datetime:
+        return self._utc(day, SESSION_OPEN)
+
+    def session_close(self, day: date) -> datetime:
+        return self._utc(day, EARLY_CLOSE if day in self.early_closes(day.year) else SESSION_CLOSE)
+
+    def _local_date(self, now: datetime) -> date:
+        return now.replace(tzinfo=timezone.utc).astimezone(self.tz).date()
+
+    def is_open(self, now: datetime) -> bool:
+        """`now` is a naive UTC datetime."""
+        today = self._local_date(now)
+        return self.is_trading_day(today) and self.session_open(today) <= now < self.session_close(today)
+
+    def last_close(self, now: datetime) -> datetime:
+        """Close of the most recent session that ended at or before `now` (naive UTC)."""
+        today = self._local_date(now)
+        if self.is_trading_day(today) and self.session_close(today) <= now:
+            return self.session_close(today)
+        return self.session_close(self.previous_trading_day(today))
+
+    def traded_since(self, updated_at: datetime, now: datetime) -> bool:
+        """True if the market is open or a session closed after `updated_at`."""
+        return self.is_open(now) or updated_at < self.last_close(now)
+
+
+def get_calendar() -> MarketCalendar:
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = MarketCalendar()
+        return _calendar
+
+
+if __name__ == "__main__":
+    # python market_calendar.py [YEAR] -> list the closures and early closes of a year
+    import sys
+    calendar = get_calendar()
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else date.today().year
+    for day in sorted(calendar.holidays(year)):
+        print(f"{day} closed")
+    for day in sorted(calendar.early_closes(year)):
+        print(f"{day} early close")
@@ -0,0 +1,267 @@
+"""
+Market-data providers.
+
+Every market-data read of the screener, the price refresh, the listing sync, the
+price history and the EUR/USD predictor goes through a MarketDataProvider.
+Providers return payloads shaped like the Alpha Vantage answers (OVERVIEW dict,
+"Global Quote", REALTIME_BULK_QUOTES "data", LISTING_STATUS rows, "Time Series ..."),
+so callers parse one format whatever the source.
+
+MARKET_DATA_PROVIDER selects the implementation:
+- "alpha_vantage" : live API through the shared key pool and cache (default)
+- "local"         : vendor dumps under MARKET_DATA_DIR, loaded in bulk (see LocalFileProvider)
+"""
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterator, List, Optional
+import pandas as pd
+from alpha_vantage import AlphaVantageClient
+
+DEFAULT_MARKET_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'market_data')
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+class MarketDataProvider(ABC):
+    """Interface. Unknown symbols give an empty payload rather than an exception."""
+
+    name = 'base'
+
+    @abstractmethod
+    def company_overview(self, symbol: str) -> dict:
+        ...
+
+    @abstractmethod
+    def global_quote(self, symbol: str) -> dict:
+        ...
+
+    @abstractmethod
+    def bulk_quotes(self, symbols: List[str]) -> dict:
+        ...
+
+    @abstractmethod
+    def listings(self) -> Iterator[Dict[str, str]]:
+        ...
+
+    @abstractmethod
+    def earnings_calendar(self, horizon: str = '3month') -> Iterator[Dict[str, str]]:
+        ...
+
+    @abstractmethod
+    def news_sentiment(self, tickers: Optional[str] = None, topics: Optional[str] = None,
+                       time_from: Optional[str] = None, limit: int = 1000) -> dict:
+        ...
+
+    @abstractmethod
+    def daily_series(self, symbol: str, outputsize: str = 'compact') -> dict:
+        ...
+
+    @abstractmethod
+    def fx_daily(self, from_symbol: str, to_symbol: str, outputsize: str = 'compact') -> dict:
+        ...
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """Live Alpha Vantage API. Throttles surface as AlphaVantageThrottled."""
+
+    name = 'alpha_vantage'
+
+    def __init__(self, client: Optional[AlphaVantageClient] = None):
+        self.client = client or AlphaVantageClient()
+
+    def company_overview(self, symbol: str) -> dict:
+        return self.client.query({'function': 'OVERVIEW', 'symbol': symbol})
+
+    def global_quote(self, symbol: str) -> dict:
+        return self.client.query({'function': 'GLOBAL_QUOTE', 'symbol': symbol})
+
+    def bulk_quotes(self, symbols: List[str]) -> dict:
+        return self.client.query({'function': 'REALTIME_BULK_QUOTES', 'symbol': ','.join(symbols)}, retries=2)
+
+    def listings(self) -> Iterator[Dict[str, str]]:
+        return self.client.stream_csv({'function': 'LISTING_STATUS'})
+
+    def earnings_calendar(self, horizon: str = '3month') -> Iterator[Dict[str, str]]:
+        return self.client.stream_csv({'function': 'EARNINGS_CALENDAR', 'horizon': horizon})
+
+    def news_sentiment(self, tickers: Optional[str] = None, topics: Optional[str] = None,
+                       time_from: Optional[str] = None, limit: int = 1000) -> dict:
+        params = {'function': 'NEWS_SENTIMENT', 'sort': 'EARLIEST', 'limit': limit}
+        for key, value in (('tickers', tickers), ('topics', topics), ('time_from', time_from)):
+            if value:
+                params[key] = value
+        return self.client.query(params)
+
+    def daily_series(self, symbol: str, outputsize: str = 'compact') -> dict:
+        return self.client.query({'function': 'TIME_SERIES_DAILY', 'symbol': symbol, 'outputsize': outputsize})
+
+    def fx_daily(self, from_symbol: str, to_symbol: str, outputsize: str = 'compact') -> dict:
+        return self.client.query(
+            {'function': 'FX_DAILY', 'from_symbol': from_symbol, 'to_symbol': to_symbol, 'outputsize': outputsize},
+            retries=2,
+        )
+
+
+class LocalFileProvider(MarketDataProvider):
+    """
+    Vendor dumps on disk, each table read once (CSV or Parquet, Parquet preferred):
+
+    - overview.{parquet,csv}        one row per symbol, OVERVIEW field names (Symbol, Name, Sector, ...)
+    - quotes.{parquet,csv}          symbol, price (or close)
+    - listing_status.{parquet,csv}  LISTING_STATUS columns (symbol, name, exchange, assetType, ...)
+    - earnings_calendar.{parquet,csv} EARNINGS_CALENDAR columns (symbol, reportDate, fiscalDateEnding, ...)
+    - daily.{parquet,csv}           symbol, date, open, high, low, close, volume
+    - news_sentiment.json           a NEWS_SENTIMENT answer ({"feed": [...]}), filtered per query
+    - fx_daily.{parquet,csv}        pair (e.g. EURUSD), date, open, high, low, close
+
+    ALPHA_VANTAGE_BULK_QUOTES_FIXTURE (or `bulk_quotes_file`) points to a recorded
+    REALTIME_BULK_QUOTES answer (e.g. fixtures/alpha_vantage/REALTIME_BULK_QUOTES.json);
+    when set, bulk quotes are served from it instead of the quotes table.
+    """
+
+    name = 'local'
+
+    def __init__(self, data_dir: Optional[str] = None, bulk_quotes_file: Optional[str] = None):
+        self.data_dir = data_dir or os.getenv('MARKET_DATA_DIR', DEFAULT_MARKET_DATA_DIR)
+        self.bulk_quotes_file = bulk_quotes_file or os.getenv('ALPHA_VANTAGE_BULK_QUOTES_FIXTURE')
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _table(self, name: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            if name not in self._tables:
+                self._tables[name] = self._read(name)
+            return self._tables[name]
+
+    def _read(self, name: str) -> Optional[pd.DataFrame]:
+        parquet = os.path.join(self.data_dir, f"{name}.parquet")
+        if os.path.exists(parquet):
+            # Needs pyarrow or fastparquet. Missing values become '' as with the CSV reader, not 'nan'
+            return pd.read_parquet(parquet).astype(object).fillna('').astype(str)
+        path = os.path.join(self.data_dir, f"{name}.csv")
+        if os.path.exists(path):
+            return pd.read_csv(path, dtype=str, keep_default_na=False)
+        print(f"⚠️ Pas de fichier {name}.parquet / {name}.csv dans {self.data_dir}")
+        return None
+
+    def _by_symbol(self, name: str, column: str) -> Dict[str, dict]:
+        key = f"{name}:by_{column}"
+        with self._lock:
+            if key in self._tables:
+                return self._tables[key]
+        table = self._table(name)
+        index = {} if table is None else {row[column]: row for row in table.to_dict('records')}
+        with self._lock:
+            self._tables[key] = index
+        return index
+
+    def _prices(self) -> Dict[str, str]:
+        quotes = self._by_symbol('quotes', 'symbol')
+        return {symbol: row.get('price') or row.get('close') for symbol, row in quotes.items()}
+
+    def company_overview(self, symbol: str) -> dict:
+        return dict(self._by_symbol('overview', 'Symbol').get(symbol, {}))
+
+    def global_quote(self, symbol: str) -> dict:
+        price = self._prices().get(symbol)
+        if not price:
+            return {}
+        return {'Global Quote': {'01. symbol': symbol, '05. price': price}}
+
+    def bulk_quotes(self, symbols: List[str]) -> dict:
+        if self.bulk_quotes_file:
+            with self._lock:
+                if 'bulk_quotes_file' not in self._tables:
+                    with open(self.bulk_quotes_file, 'r') as f:
+                        self._tables['bulk_quotes_file'] = json.load(f)
+                fixture = self._tables['bulk_quotes_file']
+            # Same shape as the API answer, filtered on the requested chunk
+            wanted = set(symbols)
+            return {**fixture, 'data': [row for row in fixture.get('data', []) if row.get('symbol') in wanted]}
+        prices = self._prices()
+        return {'data': [{'symbol': s, 'close': prices[s]} for s in symbols if prices.get(s)]}
+
+    def listings(self) -> Iterator[Dict[str, str]]:
+        table = self._table('listing_status')
+        if table is not None:
+            yield from table.to_dict('records')
+
+    def earnings_calendar(self, horizon: str = '3month') -> Iterator[Dict[str, str]]:
+        table = self._table('earnings_calendar')
+        if table is not None:
+            yield from table.to_dict('records')
+
+    def news_sentiment(self, tickers: Optional[str] = None, topics: Optional[str] = None,
+                       time_from: Optional[str] = None, limit: int = 1000) -> dict:
+        with self._lock:
+            if 'news_sentiment' not in self._tables:
+                path = os.path.join(self.data_dir, 'news_sentiment.json')
+                feed = []
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        feed = json.load(f).get('feed', [])
+                self._tables['news_sentiment'] = sorted(feed, key=lambda item: item.get('time_published', ''))
+            feed = self._tables['news_sentiment']
+        wanted_tickers = set(tickers.split(',')) if tickers else set()
+        wanted_topics = set(topics.lower().replace('_', ' ').split(',')) if topics else set()
+        items = []
+        for item in feed:
+            # time_from is YYYYMMDDTHHMM, time_published YYYYMMDDTHHMMSS: string order matches time order
+            if time_from and item.get('time_published', '') < time_from:
+                continue
+            if wanted_tickers and not wanted_tickers <= {t.get('ticker') for t in item.get('ticker_sentiment', [])}:
+                continue
+            if wanted_topics and not wanted_topics <= {str(t.get('topic', '')).lower() for t in item.get('topics', [])}:
+                continue
+            items.append(item)
+        return {'items': str(len(items[:limit])), 'feed': items[:limit]}
+
+    def _series(self, name: str, column: str, value: str, outputsize: str) -> Dict[str, dict]:
+        table = self._table(name)
+        if table is None:
+            return {}
+        rows = table[table[column] == value].sort_values('date', ascending=False)
+        if outputsize == 'compact':
+            rows = rows.head(100)
+        return {
+            row['date']: {
+                '1. open': row['open'], '2. high': row['high'], '3. low': row['low'], '4. close': row['close'],
+                **({'5. volume': row['volume']} if 'volume' in row else {}),
+            }
+            for row in rows.to_dict('records')
+        }
+
+    def daily_series(self, symbol: str, outputsize: str = 'compact') -> dict:
+        series = self._series('daily', 'symbol', symbol, outputsize)
+        return {'Time Series (Daily)': series} if series else {}
+
+    def fx_daily(self, from_symbol: str, to_symbol: str, outputsize: str = 'compact') -> dict:
+        series = self._series('fx_daily', 'pair', f"{from_symbol}{to_symbol}", outputsize)
+        return {'Time Series FX (Daily)': series} if series else {}
+
+
+PROVIDERS: Dict[str, Callable[[], MarketDataProvider]] = {
+    'alpha_vantage': AlphaVantageProvider,
+    'local': LocalFileProvider,
+}
+
+
+def register_provider(name: str, factory: Callable[[], MarketDataProvider]):
+    PROVIDERS[name] = factory
+
+
+def get_provider(name: Optional[str] = None) -> MarketDataProvider:
+    """The process-wide provider named by MARKET_DATA_PROVIDER (or a fresh one when `name` is given)."""
+    global _provider
+    if name:
+        return PROVIDERS[name]()
+    with _provider_lock:
+        if _provider is None:
+            name = os.getenv('MARKET_DATA_PROVIDER', 'alpha_vantage')
+            if name not in PROVIDERS:
+                raise ValueError(f"Unknown MARKET_DATA_PROVIDER {name!r} (expected one of {sorted(PROVIDERS)})")
+            _provider = PROVIDERS[name]()
+        return _provider
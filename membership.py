@@ -0,0 +1,159 @@
+"""
+Index / ETF membership from holdings files.
+
+Each file holdings/<CODE>.csv (a "symbol" or "ticker" column, optional "weight")
+or holdings/<CODE>.json (a list of symbols or {symbol: weight}) is the full
+constituent list of one index or fund. Syncing diffs it against index_membership
+as sets: only the additions are inserted and only the removals deleted, in a few
+statements per index whatever its size. IGV additionally keeps the legacy
+company_analysis.is_igv flag in step.
+"""
+import csv
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from database import get_session, CompanyAnalysis, IndexMembership
+
+HOLDINGS_DIR = os.getenv('HOLDINGS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'holdings'))
+
+# Index codes mirrored into a legacy boolean column of company_analysis
+LEGACY_FLAGS = {'IGV': CompanyAnalysis.is_igv}
+
+
+def _weight(value) -> Optional[float]:
+    try:
+        return float(str(value).replace('%', '').replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+def read_holdings(path: str) -> Dict[str, Optional[float]]:
+    """symbol -> weight (None if unknown), duplicates and cash / blank lines dropped."""
+    holdings = {}
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        items = data.items() if isinstance(data, dict) else ((s, None) for s in data)
+        for symbol, weight in items:
+            symbol = str(symbol).strip().upper()
+            if symbol:
+                holdings.setdefault(symbol, _weight(weight))
+        return holdings
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            row = {(k or '').strip().lower(): v for k, v in row.items()}
+            symbol = (row.get('symbol') or row.get('ticker') or '').strip().upper()
+            if not symbol or symbol in ('-', 'CASH', 'USD'):
+                continue
+            holdings.setdefault(symbol, _weight(row.get('weight') or row.get('weight (%)')))
+    return holdings
+
+
+def apply_holdings(session, index_code: str, holdings: Dict[str, Optional[float]], create_stubs: bool = True) -> Dict[str, int]:
+    """
+    Make index_membership for `index_code` equal to `holdings` with set-based diffs.
+    New constituents missing from company_analysis get a stub row so the next
+    update_database cycle analyzes them. Commits.
+    """
+    index_code = index_code.upper()
+    current = {
+        symbol: weight for symbol, weight in
+        session.query(IndexMembership.symbol, IndexMembership.weight).filter(IndexMembership.index_code == index_code)
+    }
+    wanted = set(holdings)
+    added = wanted - set(current)
+    removed = set(current) - wanted
+    reweighted = [
+        {'index_code': index_code, 'symbol': s, 'weight': holdings[s]}
+        for s in wanted & set(current) if holdings[s] is not None and holdings[s] != current[s]
+    ]
+
+    try:
+        if added:
+            session.bulk_insert_mappings(IndexMembership, [
+                {'index_code': index_code, 'symbol': s, 'weight': holdings[s]} for s in added
+            ])
+        if removed:
+            session.query(IndexMembership).filter(
+                IndexMembership.index_code == index_code, IndexMembership.symbol.in_(list(removed))
+            ).delete(synchronize_session=False)
+        if reweighted:
+            session.bulk_update_mappings(IndexMembership, reweighted)
+
+        stubs = 0
+        if create_stubs and added:
+            known = {s for (s,) in session.query(CompanyAnalysis.symbol).filter(CompanyAnalysis.symbol.in_(list(added)))}
+            missing = added - known
+            if missing:
+                session.bulk_insert_mappings(CompanyAnalysis, [{
+                    'symbol': s,
+                    'company_name': f"{s} ({index_code})",
+                    'founder_details': "Awaiting analysis...",
+                    'founder_source': "none",
+                } for s in missing])
+                stubs = len(missing)
+
+        flag = LEGACY_FLAGS.get(index_code)
+        if flag is not None:
+            # Two set-based updates instead of a reset + one query per symbol
+            members = select(IndexMembership.symbol).where(IndexMembership.index_code == index_code)
+            session.query(CompanyAnalysis).filter(CompanyAnalysis.symbol.in_(members)).update(
+                {flag: "true"}, synchronize_session=False)
+            session.query(CompanyAnalysis).filter(~CompanyAnalysis.symbol.in_(members), flag == "true").update(
+                {flag: "false"}, synchronize_session=False)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    stats = {'added': len(added), 'removed': len(removed), 'reweighted': len(reweighted), 'stubs': stubs, 'members': len(wanted)}
+    print(f"{index_code}: {stats}")
+    return stats
+
+
+def sync_holdings_dir(holdings_dir: str = HOLDINGS_DIR, session=None) -> Dict[str, Dict[str, int]]:
+    """Apply every holdings/<CODE>.csv|json file."""
+    own_session = session is None
+    session = session or get_session()
+    try:
+        results = {}
+        for filename in sorted(os.listdir(holdings_dir)):
+            code, ext = os.path.splitext(filename)
+            if ext not in ('.csv', '.json'):
+                continue
+            results[code.upper()] = apply_holdings(session, code, read_holdings(os.path.join(holdings_dir, filename)))
+        return results
+    finally:
+        if own_session:
+            session.close()
+
+
+def memberships(session, symbols: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """symbol -> index codes, in one query."""
+    query = session.query(IndexMembership.symbol, IndexMembership.index_code)
+    if symbols is not None:
+        query = query.filter(IndexMembership.symbol.in_(symbols))
+    result = {}
+    for symbol, code in query.order_by(IndexMembership.index_code):
+        result.setdefault(symbol, []).append(code)
+    return result
+
+
+def member_filter(column, index_code: str):
+    """SQL condition "`column` is a constituent of `index_code`" (uses the membership primary key)."""
+    return column.in_(select(IndexMembership.symbol).where(IndexMembership.index_code == index_code.upper()))
+
+
+if __name__ == "__main__":
+    # python membership.py                 -> sync every file of HOLDINGS_DIR
+    # python membership.py CODE file.csv   -> sync one index from a file
+    if len(sys.argv) == 3:
+        session = get_session()
+        try:
+            apply_holdings(session, sys.argv[1], read_holdings(sys.argv[2]))
+        finally:
+            session.close()
+    else:
+        sync_holdings_dir()
@@ -0,0 +1,279 @@
+"""
+Incremental NEWS_SENTIMENT ingestion.
+
+Each query (a ticker or a topic) keeps a time cursor: the next poll asks only
+for articles published since the newest one already seen. Articles are stored
+once, keyed by the sha1 of their URL, with just the fields the scoring needs.
+Every new ticker mention updates that symbol's rolling sentiment in place
+(exponentially decayed sums, NEWS_HALF_LIFE_DAYS), so the analysis prompt reads
+one row per symbol instead of rescanning the article history. Once the decayed
+weight falls under NEWS_MIN_WEIGHT the symbol has no current sentiment.
+"""
+import hashlib
+import math
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import func
+from database import get_session, NewsArticle, NewsMention, NewsCursor, SymbolSentiment
+from alpha_vantage import AlphaVantageThrottled
+
+NEWS_HALF_LIFE_DAYS = float(os.getenv('NEWS_HALF_LIFE_DAYS', '7'))
+# Mentions below this relevance do not move the aggregates
+NEWS_MIN_RELEVANCE = float(os.getenv('NEWS_MIN_RELEVANCE', '0.1'))
+# First poll of a new cursor only goes back this far
+NEWS_INITIAL_LOOKBACK = timedelta(days=float(os.getenv('NEWS_INITIAL_LOOKBACK_DAYS', '30')))
+# NEWS_SENTIMENT calls per update_database cycle (0 = no news ingestion in the cycle)
+NEWS_CYCLE_BUDGET = int(os.getenv('NEWS_CYCLE_BUDGET', '0'))
+# Below this decayed relevance weight the sentiment is stale: no label is given to the prompt
+NEWS_MIN_WEIGHT = float(os.getenv('NEWS_MIN_WEIGHT', '0.25'))
+# Window of the article count reported with the score (default: 4 half-lives, weights below 1/16)
+NEWS_WINDOW = timedelta(days=float(os.getenv('NEWS_WINDOW_DAYS', str(4 * NEWS_HALF_LIFE_DAYS))))
+
+_DECAY_RATE = math.log(2) / (NEWS_HALF_LIFE_DAYS * 86400.0)
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(url.strip().encode('utf-8')).hexdigest()
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    for fmt in ('%Y%m%dT%H%M%S', '%Y%m%dT%H%M'):
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sentiment_label(score: Optional[float]) -> str:
+    """Alpha Vantage's sentiment buckets."""
+    if score is None:
+        return 'n/a'
+    if score <= -0.35:
+        return 'Bearish'
+    if score <= -0.15:
+        return 'Somewhat-Bearish'
+    if score < 0.15:
+        return 'Neutral'
+    if score < 0.35:
+        return 'Somewhat-Bullish'
+    return 'Bullish'
+
+
+def _apply_mention(aggregate: SymbolSentiment, published_at: datetime, relevance: float, sentiment: float):
+    """Fold one mention into the decayed sums, keeping them expressed at the latest time seen."""
+    reference = _naive(aggregate.reference_at)
+    weight = relevance
+    if reference is None:
+        aggregate.weight_sum, aggregate.score_sum = 0.0, 0.0
+        reference = published_at
+    if published_at > reference:
+        decay = math.exp(-_DECAY_RATE * (published_at - reference).total_seconds())
+        aggregate.weight_sum = (aggregate.weight_sum or 0.0) * decay
+        aggregate.score_sum = (aggregate.score_sum or 0.0) * decay
+        reference = published_at
+    else:
+        weight *= math.exp(-_DECAY_RATE * (reference - published_at).total_seconds())
+    aggregate.weight_sum = (aggregate.weight_sum or 0.0) + weight
+    aggregate.score_sum = (aggregate.score_sum or 0.0) + weight * sentiment
+    aggregate.reference_at = reference
+    aggregate.article_count = (aggregate.article_count or 0) + 1
+    last = _naive(aggregate.last_article_at)
+    aggregate.last_article_at = max(last, published_at) if last else published_at
+
+
+def store_feed(session, feed: List[dict]) -> Dict[str, int]:
+    """
+    Store the articles of a NEWS_SENTIMENT feed not seen before and fold their ticker
+    mentions into the rolling aggregates. The caller commits.
+    """
+    items = {}
+    for item in feed:
+        url = item.get('url')
+        published_at = _parse_time(item.get('time_published'))
+        if url and published_at:
+            items.setdefault(url_hash(url), (item, published_at))
+    if not items:
+        return {'new': 0, 'duplicates': 0}
+
+    known = {h for (h,) in session.query(NewsArticle.url_hash).filter(NewsArticle.url_hash.in_(list(items)))}
+    new_items = {h: v for h, v in items.items() if h not in known}
+
+    mentions = []
+    for h, (item, published_at) in new_items.items():
+        session.add(NewsArticle(
+            url_hash=h,
+            published_at=published_at,
+            source=(item.get('source') or '')[:100],
+            title=(item.get('title') or '')[:300],
+            sentiment=_float(item.get('overall_sentiment_score')),
+        ))
+        seen = set()
+        for ticker in item.get('ticker_sentiment', []):
+            symbol = ticker.get('ticker')
+            relevance = _float(ticker.get('relevance_score'))
+            sentiment = _float(ticker.get('ticker_sentiment_score'))
+            if symbol and symbol not in seen and relevance is not None and sentiment is not None:
+                seen.add(symbol)
+                session.add(NewsMention(url_hash=h, symbol=symbol, relevance=relevance, sentiment=sentiment))
+                if relevance >= NEWS_MIN_RELEVANCE:
+                    mentions.append((symbol, published_at, relevance, sentiment))
+
+    symbols = {m[0] for m in mentions}
+    aggregates = {a.symbol: a for a in session.query(SymbolSentiment).filter(SymbolSentiment.symbol.in_(list(symbols)))} if symbols else {}
+    for symbol, published_at, relevance, sentiment in sorted(mentions, key=lambda m: m[1]):
+        aggregate = aggregates.get(symbol)
+        if aggregate is None:
+            aggregate = aggregates[symbol] = SymbolSentiment(symbol=symbol)
+            session.add(aggregate)
+        _apply_mention(aggregate, published_at, relevance, sentiment)
+    return {'new': len(new_items), 'duplicates': len(items) - len(new_items)}
+
+
+def poll(session, provider, key: str, now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Fetch the articles of one query ("ticker:AAPL" or "topic:technology") published since
+    its cursor, store them and advance the cursor. Commits.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    kind, _, value = key.partition(':')
+    cursor = session.get(NewsCursor, key) or NewsCursor(key=key)
+    since = _naive(cursor.last_published_at) or now - NEWS_INITIAL_LOOKBACK
+    data = provider.news_sentiment(
+        tickers=value if kind == 'ticker' else None,
+        topics=value if kind == 'topic' else None,
+        time_from=since.strftime('%Y%m%dT%H%M'),
+    )
+    feed = data.get('feed', []) if isinstance(data, dict) else []
+    try:
+        stats = store_feed(session, feed)
+        newest = max((t for t in (_parse_time(i.get('time_published')) for i in feed) if t), default=None)
+        if newest and (cursor.last_published_at is None or newest > _naive(cursor.last_published_at)):
+            # time_from is inclusive: the overlap at the cursor is absorbed by the URL dedup
+            cursor.last_published_at = newest
+        cursor.last_polled_at = now
+        session.merge(cursor)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return stats
+
+
+def ingest_news(symbols: Iterable[str] = (), topics: Iterable[str] = (), provider=None,
+                max_calls: int = 0, session=None) -> Dict[str, int]:
+    """
+    Poll the given tickers and topics, least recently polled first, within `max_calls`
+    API calls (0 = all). Stops at the first throttle; the cursors keep the progress.
+    """
+    if provider is None:
+        from market_data import get_provider
+        provider = get_provider()
+    own_session = session is None
+    session = session or get_session()
+    try:
+        keys = [f"ticker:{s}" for s in symbols] + [f"topic:{t}" for t in topics]
+        polled_at = {k: _naive(t) for k, t in session.query(NewsCursor.key, NewsCursor.last_polled_at).filter(NewsCursor.key.in_(keys))}
+        keys.sort(key=lambda k: polled_at.get(k) or datetime.min)
+        if max_calls:
+            keys = keys[:max_calls]
+        totals = {'queries': 0, 'new': 0, 'duplicates': 0}
+        for key in keys:
+            try:
+                stats = poll(session, provider, key)
+            except AlphaVantageThrottled as e:
+                print(f"  ⏳ News ingestion throttled, resuming next run: {e}")
+                break
+            except Exception as e:
+                print(f"  ❌ News ingestion failed for {key}: {e}")
+                continue
+            totals['queries'] += 1
+            totals['new'] += stats['new']
+            totals['duplicates'] += stats['duplicates']
+        print(f"News ingestion: {totals}")
+        return totals
+    finally:
+        if own_session:
+            session.close()
+
+
+def load_sentiment(session, symbols: Optional[Iterable[str]] = None, now: Optional[datetime] = None) -> Dict[str, dict]:
+    """
+    Current rolling sentiment per symbol (decayed to `now`) for the analysis prompt.
+    Symbols whose decayed weight fell under NEWS_MIN_WEIGHT are left out: old news
+    gives no label rather than a score frozen at its last value. `articles` counts
+    the relevant mentions of the last NEWS_WINDOW.
+    """
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    query = session.query(SymbolSentiment)
+    if symbols is not None:
+        symbols = list(symbols)
+        query = query.filter(SymbolSentiment.symbol.in_(symbols))
+    result = {}
+    for aggregate in query:
+        if not aggregate.weight_sum:
+            continue
+        reference = _naive(aggregate.reference_at) or now
+        decay = math.exp(-_DECAY_RATE * max(0.0, (now - reference).total_seconds()))
+        weight = aggregate.weight_sum * decay
+        if weight < NEWS_MIN_WEIGHT:
+            continue
+        score = aggregate.score_sum / aggregate.weight_sum
+        result[aggregate.symbol] = {
+            'score': round(score, 4),
+            'label': sentiment_label(score),
+            'weight': round(weight, 3),
+            'articles': 0,
+            'window_days': round(NEWS_WINDOW.total_seconds() / 86400.0, 1),
+            'last_article_at': aggregate.last_article_at.isoformat() if aggregate.last_article_at else None,
+        }
+    if result:
+        counts = (
+            session.query(NewsMention.symbol, func.count())
+            .join(NewsArticle, NewsArticle.url_hash == NewsMention.url_hash)
+            .filter(NewsArticle.published_at >= now - NEWS_WINDOW, NewsMention.relevance >= NEWS_MIN_RELEVANCE)
+        )
+        if symbols is not None:
+            counts = counts.filter(NewsMention.symbol.in_(symbols))
+        for symbol, n in counts.group_by(NewsMention.symbol):
+            if symbol in result:
+                result[symbol]['articles'] = n
+    return result
+
+
+if __name__ == "__main__":
+    # python news_sentiment.py [SYMBOL ...] [--topics technology,earnings] [--max-calls N]
+    args = sys.argv[1:]
+    topics, max_calls = [], 0
+    if '--topics' in args:
+        i = args.index('--topics')
+        topics = args[i + 1].split(',')
+        del args[i:i + 2]
+    if '--max-calls' in args:
+        i = args.index('--max-calls')
+        max_calls = int(args[i + 1])
+        del args[i:i + 2]
+    symbols = args
+    if not symbols and not topics:
+        session = get_session()
+        try:
+            from database import CompanyAnalysis
+            symbols = [s for (s,) in session.query(CompanyAnalysis.symbol).all()]
+        finally:
+            session.close()
+    ingest_news(symbols, topics, max_calls=max_calls)
@@ -4,15 +4,19 @@ import time
 from dotenv import load_dotenv
 from database import get_session, CompanyAnalysis
 from llm_service import LLMService
+from jobs import JobTracker
+from sharding import shard_from_args, shard_from_env, shard_kind
+from universe import shard_company_symbols
 
 # Load environment variables
 load_dotenv()
 
-def run_nuclear_recovery():
+def run_nuclear_recovery(shard=None):
     """
     Nuclear Option: Uses OpenAI LLM to infer founder status for all companies
-    where data is still missing or unreliable.
+    where data is still missing or unreliable (only those of `shard` "i/N" if given).
     """
+    shard = shard if shard is not None else shard_from_env()
     print("🚀 Starting Nuclear Recovery with OpenAI...")
     
     llm = LLMService()
@@ -24,6 +28,16 @@ def run_nuclear_recovery():
         (CompanyAnalysis.founder_source == 'none') |
         (CompanyAnalysis.founders == None)
     ).all()
+    if shard:
+        # Même découpage que les autres batchs : les classes d'un émetteur restent dans un shard
+        owned = shard_company_symbols(session, shard)
+        companies = [c for c in companies if c.symbol in owned]
+        print(f"   Shard {shard[0]}/{shard[1]}")
+    
+    # Checkpoint par symbole : une reprise ne repaie pas les inférences déjà faites
+    job = JobTracker.start_or_resume(shard_kind('nuclear_recovery', shard), [c.symbol for c in companies])
+    runnable = set(job.runnable())
+    companies = [c for c in companies if c.symbol in runnable]
     
     print(f"   Targeting {len(companies)} companies for LLM inference.")
     print("=" * 60)
@@ -81,20 +95,24 @@ Scoring Guide for founderBonus:
                 company.founder_details = details
                 
                 session.commit()
+                job.mark_done(company.symbol)
                 success_count += 1
                 print(f"   ✅ Done: {company.symbol} | Bonus: +{company.founder_bonus}")
             else:
                 print(f"   ❌ Failed to get valid JSON for {company.symbol}")
+                job.mark_failed(company.symbol, "Invalid JSON from LLM")
                 failure_count += 1
                 
         except Exception as e:
             print(f"   ❌ Error processing {company.symbol}: {e}")
             session.rollback()
+            job.mark_failed(company.symbol, str(e))
             failure_count += 1
             
         # Avoid hitting rate limits too hard
         time.sleep(0.5)
 
+    job.finish()
     print("=" * 60)
     print(f"🎉 Nuclear Recovery Complete!")
     print(f"   Success: {success_count}")
@@ -103,4 +121,5 @@ Scoring Guide for founderBonus:
     session.close()
 
 if __name__ == "__main__":
-    run_nuclear_recovery()
+    # python nuclear_recovery.py [--shard i/N]
+    run_nuclear_recovery(shard=shard_from_args())
@@ -0,0 +1,90 @@
+"""
+Archive of raw Alpha Vantage OVERVIEW payloads.
+
+Every distinct payload fetched for a symbol is stored once, zlib-compressed,
+under an increasing version number. Re-scoring after a prompt change can then
+feed the LLM the complete inputs (Description included) without any API call.
+"""
+import hashlib
+import json
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from sqlalchemy import func
+from database import FundamentalsSnapshot
+
+
+def _canonical(payload: dict) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def encode_payload(payload: dict) -> Tuple[bytes, str]:
+    raw = _canonical(payload)
+    return zlib.compress(raw, 6), hashlib.sha256(raw).hexdigest()
+
+
+def decode_payload(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+def archive_overview(session, symbol: str, payload: dict) -> Optional[int]:
+    """
+    Add `payload` as a new version for `symbol` unless it is identical to the latest one.
+    Returns the new version number, or None if nothing changed. The caller commits.
+    """
+    blob, content_hash = encode_payload(payload)
+    latest = (
+        session.query(FundamentalsSnapshot.version, FundamentalsSnapshot.content_hash)
+        .filter(FundamentalsSnapshot.symbol == symbol)
+        .order_by(FundamentalsSnapshot.version.desc())
+        .first()
+    )
+    if latest and latest.content_hash == content_hash:
+        return None
+    version = (latest.version if latest else 0) + 1
+    session.add(FundamentalsSnapshot(symbol=symbol, version=version, content_hash=content_hash, payload=blob))
+    return version
+
+
+def load_latest(session, symbol: str) -> Optional[dict]:
+    row = (
+        session.query(FundamentalsSnapshot.payload)
+        .filter(FundamentalsSnapshot.symbol == symbol)
+        .order_by(FundamentalsSnapshot.version.desc())
+        .first()
+    )
+    return decode_payload(row.payload) if row else None
+
+
+def iter_latest_payloads(session, symbols: Optional[Iterable[str]] = None, batch_size: int = 200) -> Iterator[Tuple[str, dict]]:
+    """
+    Stream (symbol, payload) for the latest version of each archived symbol.
+    Rows are fetched `batch_size` at a time through a server-side cursor and
+    decompressed one by one, so thousands of payloads never sit in memory together.
+    Use a session that is not committed while the iterator is consumed.
+    """
+    latest = (
+        session.query(FundamentalsSnapshot.symbol, func.max(FundamentalsSnapshot.version).label('version'))
+        .group_by(FundamentalsSnapshot.symbol)
+    )
+    if symbols is not None:
+        latest = latest.filter(FundamentalsSnapshot.symbol.in_(list(symbols)))
+    latest = latest.subquery()
+
+    query = (
+        session.query(FundamentalsSnapshot.symbol, FundamentalsSnapshot.payload)
+        .join(latest, (FundamentalsSnapshot.symbol == latest.c.symbol) & (FundamentalsSnapshot.version == latest.c.version))
+        .order_by(FundamentalsSnapshot.symbol)
+        .execution_options(stream_results=True)
+        .yield_per(batch_size)
+    )
+    for symbol, blob in query:
+        yield symbol, decode_payload(blob)
+
+
+def archive_stats(session) -> Dict[str, int]:
+    symbols, versions, size = session.query(
+        func.count(func.distinct(FundamentalsSnapshot.symbol)),
+        func.count(),
+        func.coalesce(func.sum(func.length(FundamentalsSnapshot.payload)), 0),
+    ).one()
+    return {'symbols': symbols, 'versions': versions, 'compressed_bytes': int(size)}
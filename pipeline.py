@@ -0,0 +1,161 @@
+"""
+Staged producer/consumer pipeline used by the ingestion jobs.
+
+Each Stage runs `workers` threads that pull from a bounded input queue and push
+their result to the next stage, so a slow stage (LLM analysis) overlaps with
+the others (API calls waiting on quota) and the run takes as long as the
+slowest stage rather than the sum of all of them.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+_STOP = object()
+
+
+class RetryLater(Exception):
+    """Raised by a stage function to put the item back in the same stage after a delay."""
+
+    def __init__(self, reason: str = '', delay: Optional[float] = None):
+        super().__init__(reason)
+        self.delay = delay
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1,
+                 max_retries: int = 5, retry_delay: float = 60.0, max_retry_delay: float = 900.0):
+        """
+        fn(item) returns the item for the next stage, or None to drop it.
+        It may raise RetryLater to be retried with exponential backoff.
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stats = {'processed': 0, 'dropped': 0, 'retried': 0, 'failed': 0, 'busy_seconds': 0.0}
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage], maxsize: int = 4,
+                 on_finish: Optional[Callable[[Any, str, str], None]] = None):
+        """on_finish(item, outcome, error) is called once per item: outcome is "done", "dropped" or "failed"."""
+        self.stages = stages
+        self.on_finish = on_finish
+        self.queues = [queue.Queue(maxsize=maxsize) for _ in stages]
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+
+    # ─────────────────────────────────────────────
+    # BOOKKEEPING
+    # ─────────────────────────────────────────────
+
+    def _add_inflight(self, n: int):
+        with self._cond:
+            self._inflight += n
+            if self._inflight == 0:
+                self._cond.notify_all()
+
+    def _count(self, stage: Stage, key: str, value=1):
+        with self._stats_lock:
+            stage.stats[key] += value
+
+    def _finish(self, item: Any, outcome: str, error: str = ''):
+        if self.on_finish:
+            try:
+                self.on_finish(item, outcome, error)
+            except Exception as e:
+                print(f"  ⚠️ on_finish callback failed: {e}")
+        self._add_inflight(-1)
+
+    def _retry(self, index: int, item: Any, attempt: int, delay: float):
+        timer = threading.Timer(delay, self.queues[index].put, args=((item, attempt),))
+        timer.daemon = True
+        timer.start()
+
+    # ─────────────────────────────────────────────
+    # WORKERS
+    # ─────────────────────────────────────────────
+
+    def _worker(self, index: int):
+        stage = self.stages[index]
+        in_q = self.queues[index]
+        out_q = self.queues[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            job = in_q.get()
+            if job is _STOP:
+                break
+            item, attempt = job
+
+            started = time.time()
+            try:
+                result = stage.fn(item)
+            except RetryLater as e:
+                self._count(stage, 'busy_seconds', time.time() - started)
+                if attempt < stage.max_retries:
+                    delay = e.delay if e.delay is not None else stage.retry_delay
+                    delay = min(stage.max_retry_delay, delay * (2 ** attempt))
+                    self._count(stage, 'retried')
+                    self._retry(index, item, attempt + 1, delay)
+                else:
+                    print(f"  ❌ [{stage.name}] giving up after {attempt + 1} attempts: {e}")
+                    self._count(stage, 'failed')
+                    self._finish(item, 'failed', f"{stage.name}: {e}")
+                continue
+            except Exception as e:
+                self._count(stage, 'busy_seconds', time.time() - started)
+                print(f"  ❌ [{stage.name}] error: {e}")
+                self._count(stage, 'failed')
+                self._finish(item, 'failed', f"{stage.name}: {e}")
+                continue
+
+            self._count(stage, 'busy_seconds', time.time() - started)
+            if result is None:
+                self._count(stage, 'dropped')
+                self._finish(item, 'dropped', f"dropped at {stage.name}")
+            elif out_q is None:
+                self._count(stage, 'processed')
+                self._finish(result, 'done')
+            else:
+                self._count(stage, 'processed')
+                out_q.put((result, 0))
+
+    # ─────────────────────────────────────────────
+    # PUBLIC API
+    # ─────────────────────────────────────────────
+
+    def run(self, items: Iterable[Any]) -> Dict[str, dict]:
+        """Feed `items` into the first stage and block until every item left the pipeline."""
+        threads = []
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                t = threading.Thread(target=self._worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                t.start()
+                threads.append(t)
+
+        started = time.time()
+        for item in items:
+            self._add_inflight(1)
+            self.queues[0].put((item, 0))
+
+        with self._cond:
+            while self._inflight > 0:
+                self._cond.wait()
+
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self.queues[index].put(_STOP)
+        for t in threads:
+            t.join()
+
+        elapsed = time.time() - started
+        print(f"Pipeline finished in {elapsed:.1f}s")
+        for stage in self.stages:
+            s = stage.stats
+            print(f"  [{stage.name}] processed={s['processed']} dropped={s['dropped']} "
+                  f"retried={s['retried']} failed={s['failed']} busy={s['busy_seconds']:.1f}s")
+        return {stage.name: dict(stage.stats) for stage in self.stages}
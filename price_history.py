@@ -0,0 +1,229 @@
+"""
+Daily OHLCV history per symbol, stored as append-only memory-mapped NumPy files.
+
+Each symbol has one flat binary file of fixed-size records (HISTORY_DTYPE) sorted
+by date. The first fetch downloads the full series (TIME_SERIES_DAILY, outputsize
+full); later runs only fetch the compact series (~100 sessions) and append the
+days after the last stored one. Reading is a np.memmap on the file: no parsing,
+and pages are only loaded when an analytic actually touches them.
+
+refresh_prices.py tops the store up after each price refresh (PRICE_HISTORY_TOPUP);
+`python price_history.py [SYMBOL ...]` does the same on demand.
+"""
+import os
+import sys
+import threading
+import warnings
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from alpha_vantage import AlphaVantageThrottled
+from market_calendar import get_calendar
+from market_data import MarketDataProvider, get_provider
+from rate_limiter import BackoffQueue
+
+PRICE_HISTORY_DIR = os.getenv(
+    'PRICE_HISTORY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'price_history')
+)
+# The compact series covers the last 100 sessions: beyond that gap a full refetch is needed
+COMPACT_SESSIONS = 100
+TOPUP_RETRY_DELAY = 60
+MAX_THROTTLE_RETRIES = 5
+TRADING_DAYS_PER_YEAR = 252
+
+# date = days since 1970-01-01
+HISTORY_DTYPE = np.dtype([
+    ('date', '<i4'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+_EPOCH = date(1970, 1, 1)
+_write_lock = threading.Lock()
+
+
+def to_day(value) -> int:
+    if isinstance(value, str):
+        value = datetime.strptime(value[:10], '%Y-%m-%d').date()
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - _EPOCH).days
+
+
+def from_day(day: int) -> date:
+    return _EPOCH + timedelta(days=int(day))
+
+
+def history_path(symbol: str, base_dir: Optional[str] = None) -> str:
+    return os.path.join(base_dir or PRICE_HISTORY_DIR, f"{symbol.upper().replace('/', '_')}.ohlcv")
+
+
+def load_history(symbol: str, base_dir: Optional[str] = None) -> np.ndarray:
+    """Read-only memmap of a symbol's history (empty array if never fetched)."""
+    path = history_path(symbol, base_dir)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    # A crash during an append can leave a partial record at the end: ignore it
+    count = size // HISTORY_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=HISTORY_DTYPE)
+    return np.memmap(path, dtype=HISTORY_DTYPE, mode='r', shape=(count,))
+
+
+def last_day(symbol: str, base_dir: Optional[str] = None) -> Optional[int]:
+    history = load_history(symbol, base_dir)
+    return int(history['date'][-1]) if len(history) else None
+
+
+def append_history(symbol: str, records: np.ndarray, base_dir: Optional[str] = None) -> int:
+    """Append the records dated after the last stored day. Returns the number of rows written."""
+    path = history_path(symbol, base_dir)
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        count = size // HISTORY_DTYPE.itemsize
+        last = None
+        if count:
+            last = int(np.memmap(path, dtype=HISTORY_DTYPE, mode='r', shape=(count,))['date'][-1])
+        records = np.sort(records, order='date')
+        if last is not None:
+            records = records[records['date'] > last]
+        if not len(records):
+            return 0
+        with open(path, 'r+b' if size else 'wb') as f:
+            # Drop a torn trailing record before appending
+            f.truncate(count * HISTORY_DTYPE.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(records.tobytes())
+        return len(records)
+
+
+def parse_daily_series(data: dict) -> np.ndarray:
+    """Convert a TIME_SERIES_DAILY payload into HISTORY_DTYPE records sorted by date."""
+    series = data.get('Time Series (Daily)') or {}
+    records = np.empty(len(series), dtype=HISTORY_DTYPE)
+    for i, (day, bar) in enumerate(series.items()):
+        records[i] = (
+            to_day(day),
+            float(bar.get('1. open', 'nan')),
+            float(bar.get('2. high', 'nan')),
+            float(bar.get('3. low', 'nan')),
+            float(bar.get('4. close', 'nan')),
+            float(bar.get('5. volume', 0) or 0),
+        )
+    return np.sort(records, order='date')
+
+
+def fetch_daily(provider: MarketDataProvider, symbol: str, full: bool) -> np.ndarray:
+    records = parse_daily_series(provider.daily_series(symbol, 'full' if full else 'compact'))
+    if full and not len(records):
+        # outputsize=full is a premium option on some plans: start from the compact series
+        records = parse_daily_series(provider.daily_series(symbol, 'compact'))
+    return records
+
+
+def needs_full_fetch(last: Optional[int], today: Optional[int] = None) -> bool:
+    today = today if today is not None else to_day(date.today())
+    # ~7 calendar days per 5 sessions
+    return last is None or today - last > COMPACT_SESSIONS * 7 // 5
+
+
+def latest_closed_session(now: Optional[datetime] = None) -> date:
+    """Exchange date of the last session whose close is past (holidays and early closes included)."""
+    calendar = get_calendar()
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    return calendar.last_close(now).replace(tzinfo=timezone.utc).astimezone(calendar.tz).date()
+
+
+def update_history(symbols: Iterable[str], provider: Optional[MarketDataProvider] = None,
+                   base_dir: Optional[str] = None) -> Dict[str, int]:
+    """
+    Full download for new symbols, compact top-up for the others.
+    Symbols already holding the latest closed session are skipped without any call.
+    Returns the number of rows appended per symbol.
+    """
+    provider = provider or get_provider()
+    latest = to_day(latest_closed_session())
+    symbols = list(dict.fromkeys(symbols))
+    work = BackoffQueue(symbols, base_delay=TOPUP_RETRY_DELAY)
+    appended = {}
+    while True:
+        next_item = work.pop()
+        if next_item is None:
+            break
+        symbol, attempt = next_item
+        last = last_day(symbol, base_dir)
+        if last is not None and last >= latest:
+            appended[symbol] = 0
+            continue
+        try:
+            records = fetch_daily(provider, symbol, needs_full_fetch(last))
+        except AlphaVantageThrottled:
+            if attempt < MAX_THROTTLE_RETRIES:
+                delay = work.requeue(symbol, attempt)
+                print(f"  ⏳ Throttle pour {symbol}, nouvel essai dans {delay:.0f}s")
+                continue
+            print(f"  ❌ Historique non récupéré pour {symbol}")
+            continue
+        except Exception as e:
+            print(f"  ❌ Erreur historique {symbol}: {e}")
+            continue
+        # During a session the compact series ends with today's partial bar: the store is
+        # append-only, so only closed sessions are written
+        appended[symbol] = append_history(symbol, records[records['date'] <= latest], base_dir)
+        print(f"  ✅ {symbol}: +{appended[symbol]} jours")
+    return appended
+
+
+def close_matrix(symbols: List[str], sessions: int = TRADING_DAYS_PER_YEAR,
+                 base_dir: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Closes of the last `sessions` dates of the union calendar, aligned as a
+    (dates, symbols) float matrix; NaN where a symbol has no bar.
+    """
+    histories = [load_history(symbol, base_dir) for symbol in symbols]
+    tails = [h['date'][-sessions:] for h in histories if len(h)]
+    if not tails:
+        return np.empty(0, dtype='<i4'), np.empty((0, len(symbols)))
+    dates = np.unique(np.concatenate(tails))[-sessions:]
+    matrix = np.full((len(dates), len(symbols)), np.nan)
+    for j, history in enumerate(histories):
+        if not len(history):
+            continue
+        tail = history[np.searchsorted(history['date'], dates[0]):]
+        rows = np.searchsorted(dates, tail['date'])
+        matrix[rows, j] = tail['close']
+    return dates, matrix
+
+
+def risk_metrics(closes: np.ndarray) -> Dict[str, np.ndarray]:
+    """Period return, annualized volatility and max drawdown per column of a close matrix."""
+    closes = np.atleast_2d(np.asarray(closes, dtype=float).T).T
+    # Symbols without enough bars get NaN metrics instead of warnings
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        log_returns = np.diff(np.log(closes), axis=0)
+        first = closes[np.argmax(~np.isnan(closes), axis=0), np.arange(closes.shape[1])]
+        last = closes[closes.shape[0] - 1 - np.argmax(~np.isnan(closes[::-1]), axis=0), np.arange(closes.shape[1])]
+        running_max = np.fmax.accumulate(closes, axis=0)
+        drawdown = np.nanmin(closes / running_max - 1.0, axis=0)
+        return {
+            'return': last / first - 1.0,
+            'volatility': np.nanstd(log_returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR),
+            'max_drawdown': drawdown,
+        }
+
+
+if __name__ == "__main__":
+    # python price_history.py [SYMBOL ...]  -> full or incremental update (default: every analyzed symbol)
+    symbols = sys.argv[1:]
+    if not symbols:
+        from database import get_session, CompanyAnalysis
+        session = get_session()
+        try:
+            symbols = [symbol for (symbol,) in session.query(CompanyAnalysis.symbol).all()]
+        finally:
+            session.close()
+    print(f"Mise à jour de l'historique pour {len(symbols)} symboles...")
+    update_history(symbols)
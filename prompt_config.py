@@ -0,0 +1,182 @@
+"""
+Cached, versioned system prompt.
+
+prompt_config.version goes up by one on every update (an in-place
+`version = version + 1`, so concurrent writers never hand out the same number).
+Each process keeps the current (text, version) in memory and a read costs no
+database round trip. The cache is invalidated:
+- at once in the process that made the update,
+- in every other process through a Postgres NOTIFY on PROMPT_CHANNEL, picked up
+  by one LISTEN thread per process (psycopg2),
+- and, as a safety net for a missed notification, a dropped listener connection
+  or another database, by re-reading the version alone every
+  PROMPT_VERSION_POLL_SECONDS.
+
+The version of the prompt that produced an analysis is recorded with it
+(company_analysis.analysis_prompt_version).
+"""
+import os
+import select
+import threading
+import time
+from typing import NamedTuple, Optional
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from database import get_session, get_db_engine, PromptConfig
+
+PROMPT_CHANNEL = 'prompt_config'
+PROMPT_VERSION_POLL_SECONDS = float(os.getenv('PROMPT_VERSION_POLL_SECONDS', '60'))
+PROMPT_LISTEN = os.getenv('PROMPT_LISTEN', 'on').lower() != 'off'
+# Seconds between reconnection attempts of the LISTEN thread
+LISTEN_RETRY_SECONDS = 30.0
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class PromptSnapshot(NamedTuple):
+    text: str
+    version: int
+
+
+class PromptStore:
+    """Process-wide cache of the 'default' prompt_config row."""
+
+    def __init__(self, default_prompt: str, poll_seconds: float = PROMPT_VERSION_POLL_SECONDS,
+                 listen: bool = PROMPT_LISTEN):
+        self.default_prompt = default_prompt
+        self.poll_seconds = poll_seconds
+        self.listen = listen
+        self._snapshot: Optional[PromptSnapshot] = None
+        self._checked = 0.0
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def current(self) -> PromptSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked < self.poll_seconds:
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._checked < self.poll_seconds:
+                return self._snapshot
+            self._ensure_listener()
+            if self._snapshot is None:
+                self._snapshot = self._load()
+            else:
+                try:
+                    if self._read_version() != self._snapshot.version:
+                        self._snapshot = self._load()
+                except Exception as e:
+                    # Keep serving the prompt we have rather than failing every analysis
+                    print(f"  ⚠️ Prompt version check failed, keeping version {self._snapshot.version}: {e}")
+            self._checked = time.monotonic()
+            return self._snapshot
+
+    def invalidate(self):
+        """Force a version check on the next read."""
+        self._checked = 0.0
+
+    def update(self, new_prompt: str) -> PromptSnapshot:
+        """Store `new_prompt` under the next version and notify the other processes."""
+        session = get_session()
+        try:
+            updated = session.query(PromptConfig).filter_by(id='default').update(
+                {PromptConfig.system_prompt: new_prompt,
+                 PromptConfig.version: func.coalesce(PromptConfig.version, 0) + 1},
+                synchronize_session=False)
+            if not updated:
+                session.add(PromptConfig(id='default', system_prompt=new_prompt, version=1))
+                session.flush()
+            # The row stays locked until commit: this is our own version
+            version = session.query(PromptConfig.version).filter_by(id='default').scalar()
+            if session.get_bind().dialect.name == 'postgresql':
+                # Delivered to the listeners when the transaction commits
+                session.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                {'channel': PROMPT_CHANNEL, 'payload': str(version)})
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+        with self._lock:
+            self._snapshot = PromptSnapshot(new_prompt, version)
+            self._checked = time.monotonic()
+        return self._snapshot
+
+    def _read_version(self) -> Optional[int]:
+        session = get_session()
+        try:
+            return session.query(PromptConfig.version).filter_by(id='default').scalar()
+        finally:
+            session.close()
+
+    def _load(self) -> PromptSnapshot:
+        session = get_session()
+        try:
+            config = session.query(PromptConfig).filter_by(id='default').first()
+            if config is None:
+                # If not in DB, init it
+                config = PromptConfig(id='default', system_prompt=self.default_prompt, version=1)
+                session.add(config)
+                try:
+                    session.commit()
+                except IntegrityError:
+                    # Another process created it first
+                    session.rollback()
+                    config = session.query(PromptConfig).filter_by(id='default').one()
+            return PromptSnapshot(config.system_prompt or self.default_prompt, config.version or 1)
+        finally:
+            session.close()
+
+    # ─────────────────────────────────────────────
+    # LISTEN / NOTIFY
+    # ─────────────────────────────────────────────
+
+    def _ensure_listener(self):
+        # One thread per process, restarted in a forked worker (threads do not survive fork)
+        if not self.listen or self._listener_pid == os.getpid():
+            return
+        engine = get_db_engine()
+        if engine.dialect.name != 'postgresql' or engine.dialect.driver != 'psycopg2':
+            self.listen = False
+            return
+        self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, args=(engine,), name='prompt-listener', daemon=True).start()
+
+    def _listen(self, engine):
+        while True:
+            connection = None
+            try:
+                # Detached from the pool: this connection stays parked on LISTEN for the life of the process
+                connection = engine.raw_connection()
+                connection.detach()
+                dbapi = connection.driver_connection
+                dbapi.autocommit = True
+                dbapi.cursor().execute(f"LISTEN {PROMPT_CHANNEL}")
+                # Updates made while we were not listening
+                self.invalidate()
+                while True:
+                    if select.select([dbapi], [], [], self.poll_seconds) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    if dbapi.notifies:
+                        dbapi.notifies.clear()
+                        self.invalidate()
+            except Exception as e:
+                print(f"  ⚠️ Prompt listener disconnected ({e}), polling every {self.poll_seconds:.0f}s until it reconnects")
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            time.sleep(LISTEN_RETRY_SECONDS)
+
+
+def get_prompt_store(default_prompt: str) -> PromptStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PromptStore(default_prompt)
+        return _store
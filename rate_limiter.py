@@ -0,0 +1,161 @@
+"""
+Token-bucket rate limiting shared by every Alpha Vantage caller.
+
+The bucket state lives in a small JSON file guarded by an exclusive flock, so
+the threads of one worker and separate processes (gunicorn workers, cron
+scripts) all draw from the same quota.
+"""
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is only shared between threads
+    fcntl = None
+
+
+def default_state_dir() -> str:
+    state_dir = os.getenv('ALPHA_VANTAGE_STATE_DIR') or os.path.join(tempfile.gettempdir(), 'ai_quant_screener')
+    os.makedirs(state_dir, exist_ok=True)
+    return state_dir
+
+
+class TokenBucket:
+    """Cross-process token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, name: str, rate_per_minute: float, capacity: Optional[float] = None, state_dir: Optional[str] = None):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.path = os.path.join(state_dir or default_state_dir(), f"{name}.bucket")
+        self._lock = threading.Lock()
+
+    def _update(self, fn):
+        """Run fn(state, now) under the thread + file lock and persist the new state."""
+        with self._lock:
+            with open(self.path, 'a+') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    try:
+                        state = json.loads(raw) if raw else {}
+                    except ValueError:
+                        state = {}
+                    now = time.time()
+                    tokens = state.get('tokens', self.capacity)
+                    updated = state.get('updated', now)
+                    state['tokens'] = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+                    state['updated'] = now
+                    state.setdefault('blocked_until', 0.0)
+
+                    result = fn(state, now)
+
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                    return result
+                finally:
+                    if fcntl:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_acquire(self) -> float:
+        """Take one token if available. Returns 0 on success, otherwise the seconds to wait."""
+        def take(state, now):
+            if state['blocked_until'] > now:
+                return state['blocked_until'] - now
+            if state['tokens'] >= 1:
+                state['tokens'] -= 1
+                return 0.0
+            return (1 - state['tokens']) / self.rate
+        return self._update(take)
+
+    def refund(self):
+        """Give back a token taken by try_acquire for a call that was not made."""
+        def give_back(state, now):
+            state['tokens'] = min(self.capacity, state['tokens'] + 1)
+        self._update(give_back)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Block until a token is available (or `timeout` seconds have passed)."""
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def penalize(self, backoff: float):
+        """Empty the bucket and refuse tokens for `backoff` seconds (the API told us to slow down)."""
+        def block(state, now):
+            state['tokens'] = 0.0
+            state['blocked_until'] = max(state['blocked_until'], now + backoff)
+        self._update(block)
+
+
+class BackoffQueue:
+    """Thread-safe work queue where failed items come back after an exponential delay."""
+
+    def __init__(self, items=(), base_delay: float = 60.0, max_delay: float = 900.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        for item in items:
+            self.push(item)
+
+    def push(self, item: Any, attempt: int = 0, delay: float = 0.0):
+        with self._cond:
+            heapq.heappush(self._heap, (time.time() + delay, next(self._seq), item, attempt))
+            self._cond.notify()
+
+    def requeue(self, item: Any, attempt: int) -> float:
+        """Put `item` back for its next attempt and return the delay applied."""
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        self.push(item, attempt + 1, delay)
+        return delay
+
+    def pop(self, block: bool = False) -> Optional[Tuple[Any, int]]:
+        """
+        Return the next ready (item, attempt), waiting for delayed items. None once empty,
+        or with `block`, once closed: an empty queue then waits for the next push.
+        """
+        with self._cond:
+            while not self._closed:
+                if self._heap:
+                    ready_at = self._heap[0][0]
+                    now = time.time()
+                    if ready_at <= now:
+                        _, _, item, attempt = heapq.heappop(self._heap)
+                        return item, attempt
+                    self._cond.wait(ready_at - now)
+                elif block:
+                    self._cond.wait()
+                else:
+                    return None
+            return None
+
+    def close(self):
+        """Wake every blocked pop(); from now on pop() returns None."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._heap)
@@ -1,36 +1,113 @@
-from logic import AIScreener
+from logic import AIScreener, MAX_THROTTLE_RETRIES, THROTTLE_RETRY_DELAY
 from database import get_session, CompanyAnalysis
-import time
+from alpha_vantage import AlphaVantageThrottled
+from rate_limiter import BackoffQueue
+from scheduler import PRICE_MAX_AGE, is_due, utcnow, naive_utc
+from sharding import shard_from_args, shard_from_env
+from price_history import update_history
+from universe import shard_company_symbols
+from datetime import datetime, timezone
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def refresh_all_prices():
-    screener = AIScreener()
-    session = get_session()
-    
-    companies = session.query(CompanyAnalysis).all()
-    print(f"Refraichissement des prix pour {len(companies)} entreprises...")
-    
-    for i, company in enumerate(companies):
-        print(f"[{i+1}/{len(companies)}] Récupération du prix pour {company.symbol}...")
-        price = screener.get_stock_quote(company.symbol)
-        
+# Historique OHLCV (price_history) complété après chaque refresh : un appel par symbole et
+# par séance close, les symboles déjà à jour ne coûtent rien (PRICE_HISTORY_TOPUP=off pour couper)
+PRICE_HISTORY_TOPUP = os.getenv('PRICE_HISTORY_TOPUP', 'on').lower() != 'off'
+
+def save_prices(session, prices):
+    """Écrit tous les prix en une seule mise à jour groupée (un seul commit)"""
+    if not prices:
+        return
+    now = datetime.now(timezone.utc)
+    session.bulk_update_mappings(CompanyAnalysis, [
+        {'symbol': symbol, 'current_price': price, 'price_updated_at': now} for symbol, price in prices.items()
+    ])
+    session.commit()
+
+def fetch_prices_one_by_one(screener, symbols):
+    """Mode historique : un appel GLOBAL_QUOTE par symbole"""
+    prices = {}
+    # Le quota Alpha Vantage est respecté par le token bucket partagé du client
+    work = BackoffQueue(symbols, base_delay=THROTTLE_RETRY_DELAY)
+    done = 0
+    while True:
+        next_item = work.pop()
+        if next_item is None:
+            break
+        symbol, attempt = next_item
+        print(f"[{done+1}/{len(symbols)}] Récupération du prix pour {symbol}...")
+        try:
+            price = screener.get_stock_quote(symbol)
+        except AlphaVantageThrottled:
+            if attempt < MAX_THROTTLE_RETRIES:
+                delay = work.requeue(symbol, attempt)
+                print(f"  ⏳ Throttle pour {symbol}, nouvel essai dans {delay:.0f}s")
+                continue
+            price = 0.0
+        done += 1
+
         if price > 0:
-            company.current_price = price
-            session.commit()
-            print(f"  ✅ Prix mis à jour : ${price}")
+            prices[symbol] = price
+            print(f"  ✅ Prix récupéré : ${price}")
         else:
-            print(f"  ❌ Impossible de récupérer le prix pour {company.symbol}")
-            
-        # Respecter le quota Alpha Vantage (5 requêtes par minute)
-        # 60 / 5 = 12 secondes
-        print("  Attente de 12s...")
-        time.sleep(12)
-        
-    session.close()
-    print("Mise à jour des prix terminée.")
+            print(f"  ❌ Impossible de récupérer le prix pour {symbol}")
+    return prices
+
+def stale_price_symbols(session, max_age=PRICE_MAX_AGE):
+    """Symboles dont le prix est plus ancien que le tier prix et qui ont coté depuis (une seule requête)"""
+    now = utcnow()
+    rows = session.query(CompanyAnalysis.symbol, CompanyAnalysis.price_updated_at).all()
+    return [symbol for symbol, updated_at in rows if is_due(naive_utc(updated_at), max_age, now)]
+
+def refresh_all_prices(bulk=True, force=False, shard=None, history=PRICE_HISTORY_TOPUP):
+    """Tier prix : rafraîchit uniquement les prix (aucun appel LLM), sur le shard "i/N" s'il est donné"""
+    shard = shard if shard is not None else shard_from_env()
+    screener = AIScreener(shard=shard)
+    session = get_session()
+
+    if force:
+        symbols = [symbol for (symbol,) in session.query(CompanyAnalysis.symbol).all()]
+    else:
+        symbols = stale_price_symbols(session)
+    if shard:
+        # Les classes d'actions d'un émetteur restent ensemble (comme update_database)
+        owned = shard_company_symbols(session, shard)
+        symbols = [s for s in symbols if s in owned]
+        print(f"Shard {shard[0]}/{shard[1]}: {len(symbols)} symboles.")
+    if not symbols:
+        # Marché fermé (week-end, jour férié) et prix de clôture déjà enregistrés
+        print("Aucun prix à rafraîchir (marché fermé ou prix à jour).")
+        session.close()
+        return
+    print(f"Refraichissement des prix pour {len(symbols)} entreprises...")
+
+    prices = {}
+    if bulk:
+        # Jusqu'à 100 symboles par requête REALTIME_BULK_QUOTES
+        prices = screener.get_bulk_quotes(symbols)
+        print(f"  ✅ {len(prices)} prix récupérés en lot")
+
+    missing = [s for s in symbols if s not in prices]
+    if missing and (not bulk or not prices):
+        # Pas d'accès aux bulk quotes (clé gratuite) : repli sur GLOBAL_QUOTE
+        prices.update(fetch_prices_one_by_one(screener, missing))
+    elif missing:
+        print(f"  ⚠️ Aucun prix en lot pour {len(missing)} symboles: {', '.join(missing[:10])}")
+
+    try:
+        save_prices(session, prices)
+    finally:
+        session.close()
+    print(f"Mise à jour des prix terminée ({len(prices)}/{len(symbols)}).")
+
+    if history and prices:
+        appended = update_history(prices, provider=screener.market_data)
+        print(f"Historique : {sum(appended.values())} séances ajoutées pour {len(appended)} symboles.")
 
 if __name__ == "__main__":
-    refresh_all_prices()
+    # python refresh_prices.py [--single] [--force] [--no-history] [--shard i/N]
+    refresh_all_prices(bulk='--single' not in sys.argv, force='--force' in sys.argv, shard=shard_from_args(),
+                       history=PRICE_HISTORY_TOPUP and '--no-history' not in sys.argv)
@@ -0,0 +1,195 @@
+"""
+Refresh scheduling for the screener: decides which symbols a cycle works on
+and in which order.
+
+Data is refreshed in independent tiers, each with its own timestamp:
+- prices        : intraday (PRICE_MAX_AGE_MINUTES, refresh_prices.py)
+- fundamentals  : after each earnings release (earnings_calendar), with
+                  FUNDAMENTALS_SAFETY_MAX_AGE_DAYS as a safety net; FUNDAMENTALS_MAX_AGE_HOURS
+                  when no earnings calendar has been ingested (update_database)
+- LLM scoring   : only when the scoring inputs moved by more than RESCORE_TOLERANCE
+
+Prices and fundamentals are only due again once a session has traded since the
+last fetch (market_calendar): weekends and exchange holidays cost no quota, and
+each cycle's budget goes to names that are actually stale or never fetched.
+MARKET_CALENDAR=off falls back to the plain age check.
+"""
+import heapq
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from datetime import date
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from database import CompanyAnalysis
+from earnings_calendar import reported_since
+from market_calendar import MarketCalendar, get_calendar
+
+PRICE_MAX_AGE = timedelta(minutes=float(os.getenv('PRICE_MAX_AGE_MINUTES', '15')))
+FUNDAMENTALS_MAX_AGE = timedelta(hours=float(os.getenv('FUNDAMENTALS_MAX_AGE_HOURS', '24')))
+FUNDAMENTALS_SAFETY_MAX_AGE = timedelta(days=float(os.getenv('FUNDAMENTALS_SAFETY_MAX_AGE_DAYS', '30')))
+
+# Variation relative d'un input numérique au-delà de laquelle on relance le LLM
+RESCORE_TOLERANCE = float(os.getenv('RESCORE_TOLERANCE', '0.10'))
+SCORING_INPUTS = ['Price', 'PERatio', 'MarketCapitalization', 'ReturnOnEquityTTM', 'EPSGrowthPast5Years', 'DebtToEquityRatio']
+
+# Budget d'un cycle : nombre de symboles et/ou durée (0 = illimité)
+CYCLE_MAX_SYMBOLS = int(os.getenv('UPDATE_MAX_SYMBOLS', '0'))
+CYCLE_TIME_BUDGET = float(os.getenv('UPDATE_TIME_BUDGET_SECONDS', '0'))
+
+USE_MARKET_CALENDAR = os.getenv('MARKET_CALENDAR', 'on').lower() != 'off'
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Freshness(NamedTuple):
+    fundamentals_updated_at: Optional[datetime]
+    price_updated_at: Optional[datetime]
+    current_price: Optional[float]
+    analysis_inputs: Optional[dict]
+    market_cap: Optional[float]
+
+
+def load_freshness(session) -> Dict[str, Freshness]:
+    """Load every symbol's tier timestamps in a single query (naive UTC datetimes)."""
+    rows = session.query(
+        CompanyAnalysis.symbol,
+        CompanyAnalysis.fundamentals_updated_at,
+        CompanyAnalysis.price_updated_at,
+        CompanyAnalysis.current_price,
+        CompanyAnalysis.analysis_inputs,
+        CompanyAnalysis.market_cap,
+    ).all()
+    return {
+        symbol: Freshness(naive_utc(fundamentals_at), naive_utc(price_at), price, inputs, market_cap)
+        for symbol, fundamentals_at, price_at, price, inputs, market_cap in rows
+    }
+
+
+def issuer_freshness(freshness: Dict[str, Freshness], groups: Dict[str, List[str]]) -> Dict[str, Freshness]:
+    """
+    Freshness of each issuer (primary symbol -> state of its stalest share class), so a
+    share class never fetched, or fetched long ago, puts the whole issuer back in the queue.
+    Issuers with a never-fetched share class are left out (treated as never fetched).
+    """
+    result = {}
+    for primary, symbols in groups.items():
+        states = [freshness.get(symbol) for symbol in symbols]
+        if all(state and state.fundamentals_updated_at for state in states):
+            result[primary] = min(states, key=lambda state: state.fundamentals_updated_at)
+    return result
+
+
+def is_stale(updated_at: Optional[datetime], max_age: timedelta, now: Optional[datetime] = None) -> bool:
+    return updated_at is None or (now or utcnow()) - updated_at >= max_age
+
+
+def is_due(updated_at: Optional[datetime], max_age: timedelta, now: Optional[datetime] = None,
+           calendar: Optional[MarketCalendar] = None) -> bool:
+    """
+    Calendar-aware staleness: data older than `max_age` is only refetched if the market
+    is open or a session closed after it was fetched. Never-fetched data is always due.
+    """
+    now = now or utcnow()
+    if not is_stale(updated_at, max_age, now):
+        return False
+    if updated_at is None or not USE_MARKET_CALENDAR:
+        return True
+    return (calendar or get_calendar()).traded_since(updated_at, now)
+
+
+def scoring_inputs(company_data: dict) -> Dict[str, float]:
+    """Numeric inputs of the LLM prompt, used to decide whether a rescoring is worth it."""
+    inputs = {}
+    for key in SCORING_INPUTS:
+        try:
+            inputs[key] = float(company_data.get(key))
+        except (TypeError, ValueError):
+            inputs[key] = None
+    return inputs
+
+
+def inputs_changed_materially(old: Optional[dict], new: dict, tolerance: float = RESCORE_TOLERANCE) -> bool:
+    """True if any scoring input appeared, disappeared or moved by more than `tolerance` (relative)."""
+    if not old:
+        return True
+    for key in SCORING_INPUTS:
+        a, b = old.get(key), new.get(key)
+        if a is None or b is None:
+            if a != b:
+                return True
+            continue
+        if abs(b - a) > tolerance * max(abs(a), abs(b), 1e-9):
+            return True
+    return False
+
+
+class StalenessQueue:
+    """
+    Priority queue of symbols: never-fetched first, then by days of staleness,
+    and within the same staleness the largest market caps first (then universe order).
+
+    With `report_dates` (earnings calendar), a fetched symbol is only due once it has
+    reported since its last fetch, or after FUNDAMENTALS_SAFETY_MAX_AGE; `reported`
+    holds the symbols queued because of a release.
+    """
+
+    def __init__(self, universe: Dict[str, str], freshness: Dict[str, Freshness],
+                 max_age: timedelta = FUNDAMENTALS_MAX_AGE, now: Optional[datetime] = None,
+                 report_dates: Optional[Dict[str, List[date]]] = None):
+        now = now or utcnow()
+        self._heap = []
+        self.fresh = 0
+        self.reported = set()
+        for position, (symbol, sector_desc) in enumerate(universe.items()):
+            state = freshness.get(symbol)
+            last_updated = state.fundamentals_updated_at if state else None
+            if report_dates and last_updated is not None:
+                if reported_since(report_dates.get(symbol), last_updated, now):
+                    self.reported.add(symbol)
+                elif not is_due(last_updated, FUNDAMENTALS_SAFETY_MAX_AGE, now):
+                    self.fresh += 1
+                    continue
+            elif not is_due(last_updated, max_age, now):
+                self.fresh += 1
+                continue
+            # Jamais récupéré -> priorité maximale
+            staleness_days = (now - last_updated).days if last_updated else float('inf')
+            market_cap = (state.market_cap if state else None) or 0.0
+            heapq.heappush(self._heap, (-staleness_days, -market_cap, position, symbol, sector_desc))
+
+    def __len__(self):
+        return len(self._heap)
+
+    def symbols(self):
+        return [entry[3] for entry in sorted(self._heap)]
+
+    def drain(self, max_symbols: int = CYCLE_MAX_SYMBOLS, time_budget: float = CYCLE_TIME_BUDGET,
+              allowed: Optional[set] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (symbol, sector) stalest first until the queue or the cycle budget is exhausted.
+        Symbols outside `allowed` (e.g. waiting for a retry backoff) are skipped without using budget.
+        """
+        started = time.time()
+        taken = 0
+        while self._heap:
+            if max_symbols and taken >= max_symbols:
+                print(f"Cycle budget reached ({taken} symbols), {len(self._heap)} left for next cycle.")
+                return
+            if time_budget and time.time() - started >= time_budget:
+                print(f"Cycle time budget reached ({time_budget:.0f}s), {len(self._heap)} left for next cycle.")
+                return
+            _, _, _, symbol, sector_desc = heapq.heappop(self._heap)
+            if allowed is not None and symbol not in allowed:
+                continue
+            taken += 1
+            yield symbol, sector_desc
@@ -0,0 +1,79 @@
+"""
+Deterministic symbol sharding: shard "i/N" owns the symbols whose stable hash
+modulo N equals i, so several workers can split the universe without coordination.
+
+Every batch entry point takes the spec from `--shard i/N` (or the SHARD env var):
+
+    python logic.py --shard 0/4
+    python refresh_prices.py --shard 1/4
+    python nuclear_recovery.py --shard 2/4
+    POST /api/founder/batch?shard=3/4
+
+Share classes of one issuer share a shard (shard_groups), and each
+shard checkpoints in its own job kind (shard_kind), so shards never write the same
+rows or resume each other's jobs.
+"""
+import os
+import sys
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+Shard = Tuple[int, int]
+
+
+def parse_shard(spec: Optional[str]) -> Optional[Shard]:
+    """Parse "i/N" (0 <= i < N). Empty / None means no sharding."""
+    if not spec:
+        return None
+    try:
+        index, count = (int(part) for part in spec.strip().split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec {spec!r}, expected 'i/N'")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard spec {spec!r}, expected 0 <= i < N")
+    return index, count
+
+
+def shard_of(symbol: str, count: int) -> int:
+    # crc32 is stable across processes and Python versions (unlike hash())
+    return zlib.crc32(symbol.upper().encode('utf-8')) % count
+
+
+def in_shard(symbol: str, shard: Optional[Shard]) -> bool:
+    return shard is None or shard_of(symbol, shard[1]) == shard[0]
+
+
+def shard_groups(groups: Dict[str, List[str]], shard: Optional[Shard]) -> Dict[str, List[str]]:
+    """
+    Keep the issuers (primary symbol -> share classes) of the shard. An issuer is placed by
+    its alphabetically first share class, so the placement does not depend on which class
+    a caller lists first.
+    """
+    if shard is None:
+        return groups
+    return {primary: symbols for primary, symbols in groups.items() if in_shard(min(symbols), shard)}
+
+
+def shard_kind(kind: str, shard: Optional[Shard]) -> str:
+    """Job kind of one shard ("update_database-shard0of4"): each shard resumes its own checkpoints."""
+    return kind if shard is None else f"{kind}-shard{shard[0]}of{shard[1]}"
+
+
+def is_leader(shard: Optional[Shard]) -> bool:
+    """Shard 0 (or an unsharded run) owns the universe-wide work, e.g. the earnings calendar sync."""
+    return shard is None or shard[0] == 0
+
+
+def shard_from_env() -> Optional[Shard]:
+    return parse_shard(os.getenv('SHARD'))
+
+
+def shard_from_args(argv: Optional[Sequence[str]] = None) -> Optional[Shard]:
+    """`--shard i/N` / `--shard=i/N` on the command line, else the SHARD env var."""
+    argv = sys.argv[1:] if argv is None else argv
+    for i, arg in enumerate(argv):
+        if arg == '--shard' and i + 1 < len(argv):
+            return parse_shard(argv[i + 1])
+        if arg.startswith('--shard='):
+            return parse_shard(arg.split('=', 1)[1])
+    return shard_from_env()
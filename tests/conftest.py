@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Point get_session() at a fresh SQLite database for the test (a file: worker threads get their own connections)."""
+    saved = database._engine, database._SessionLocal
+    engine = create_engine(f"sqlite:///{tmp_path / 'screener.db'}", connect_args={'check_same_thread': False, 'timeout': 30})
+    database.Base.metadata.create_all(engine)
+    database._engine, database._SessionLocal = engine, None
+    try:
+        yield engine
+    finally:
+        database._engine, database._SessionLocal = saved
+        engine.dispose()
@@ -0,0 +1,71 @@
+import os
+import time
+
+import pytest
+
+from av_cache import CacheMiss, ResponseCache
+
+QUOTE = {'function': 'GLOBAL_QUOTE', 'symbol': 'AAPL', 'apikey': 'secret'}
+
+
+def test_on_mode_records_and_serves_fresh_entries(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), mode='on')
+    assert cache.get(QUOTE) is None
+    cache.put(QUOTE, '{"price": 1}')
+
+    # The API key is not part of the key
+    assert cache.get(dict(QUOTE, apikey='other')) == '{"price": 1}'
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+
+def test_on_mode_expires_entries_after_their_ttl(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), mode='on', ttls={'GLOBAL_QUOTE': 0.05})
+    cache.put(QUOTE, 'body')
+    time.sleep(0.1)
+    assert cache.get(QUOTE) is None
+
+
+def test_off_mode_neither_reads_nor_writes(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), mode='off')
+    cache.put(QUOTE, 'body')
+    assert cache.get(QUOTE) is None
+    assert not os.listdir(tmp_path)
+
+
+def test_replay_mode_serves_stale_entries_and_raises_on_misses(tmp_path):
+    ResponseCache(cache_dir=str(tmp_path), mode='on').put(QUOTE, 'recorded')
+    replay = ResponseCache(cache_dir=str(tmp_path), mode='replay', ttls={'GLOBAL_QUOTE': 0})
+
+    assert replay.get(QUOTE) == 'recorded'
+    replay.put(dict(QUOTE, symbol='MSFT'), 'ignored')
+    with pytest.raises(CacheMiss):
+        replay.get(dict(QUOTE, symbol='MSFT'))
+
+
+def test_overwriting_an_entry_does_not_grow_the_tracked_size(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), mode='on')
+    cache.put(QUOTE, 'x' * 100)
+    for _ in range(5):
+        cache.put(QUOTE, 'x' * 100)
+    assert cache._size == cache._scan_size()
+
+
+def test_eviction_drops_least_recently_used_entries(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), mode='on', max_bytes=10 ** 6)
+    symbols = ['A', 'B', 'C', 'D']
+    for i, symbol in enumerate(symbols):
+        params = dict(QUOTE, symbol=symbol)
+        cache.put(params, os.urandom(300).hex())
+        path = cache._path(cache.key(params))
+        os.utime(path, (1000 + i, 1000 + i))
+    entry_size = cache._scan_size() // len(symbols)
+
+    # Reading A makes it the most recent; the bound now fits about two entries
+    cache.get(dict(QUOTE, symbol='A'))
+    cache.max_bytes = int(entry_size * 2.5)
+    cache.put(dict(QUOTE, symbol='E'), os.urandom(300).hex())
+
+    assert cache._size == cache._scan_size() <= cache.max_bytes * 0.9
+    kept = [s for s in symbols + ['E'] if os.path.exists(cache._path(cache.key(dict(QUOTE, symbol=s))))]
+    assert kept == ['A', 'E']
+    assert cache.stats['evictions'] == 3
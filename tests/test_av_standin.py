@@ -0,0 +1,16 @@
+import av_standin
+
+BENCH_ENV = ('ALPHA_VANTAGE_BASE_URL', 'ALPHA_VANTAGE_CACHE', 'MARKET_DATA_PROVIDER', 'ALPHA_VANTAGE_API_KEYS',
+             'ALPHA_VANTAGE_CALLS_PER_MINUTE', 'ALPHA_VANTAGE_THROTTLE_BACKOFF', 'ALPHA_VANTAGE_STATE_DIR')
+
+
+def test_bench_ingests_every_symbol(monkeypatch):
+    # The bench configures the client through the environment: restore it afterwards
+    for name in BENCH_ENV:
+        monkeypatch.setenv(name, '')
+
+    stats = av_standin.main(['bench', '--symbols', '5', '--keys', '2', '--workers', '2', '--throttle-backoff', '0.1'])
+
+    assert stats['fetch']['processed'] == 5
+    assert stats['quote']['processed'] == 5
+    assert stats['quote']['failed'] == 0
@@ -0,0 +1,18 @@
+from founder_service import FounderService
+
+
+def test_llm_only_columns_scores_the_answer():
+    columns = FounderService().llm_only_columns({
+        'founders': ['Jensen Huang'], 'currentCEO': 'Jensen Huang', 'currentChairman': '',
+        'isFounderCEO': True, 'isFounderChairman': False,
+    })
+    assert columns == {
+        'founders': ['Jensen Huang'], 'current_ceo': 'Jensen Huang', 'current_chairman': '',
+        'is_founder_ceo': 'true', 'is_founder_chairman': 'false', 'founder_influence': 'high',
+        'founder_bonus': 10, 'founder_source': 'llm_only', 'founder_details': 'Founder Jensen Huang is CEO',
+    }
+
+
+def test_founder_columns_defaults():
+    columns = FounderService().founder_columns({})
+    assert columns['founders'] == [] and columns['founder_source'] == 'none' and columns['founder_bonus'] == 0
@@ -0,0 +1,98 @@
+import pytest
+
+import jobs
+from database import BatchJob, JobItem, get_session
+from jobs import JobTracker, retry_dead_letters
+
+
+def _statuses(job):
+    session = get_session()
+    try:
+        return dict(session.query(JobItem.symbol, JobItem.status).filter_by(job_id=job.job_id))
+    finally:
+        session.close()
+
+
+def _job_status(job):
+    session = get_session()
+    try:
+        return session.get(BatchJob, job.job_id).status
+    finally:
+        session.close()
+
+
+def test_resume_skips_done_symbols_and_adds_new_ones(db):
+    job = JobTracker.start_or_resume('reanalyze', ['AAPL', 'MSFT'])
+    job.mark_done('AAPL')
+
+    resumed = JobTracker.start_or_resume('reanalyze', ['AAPL', 'MSFT', 'NVDA'])
+
+    assert resumed.job_id == job.job_id
+    assert sorted(resumed.runnable()) == ['MSFT', 'NVDA']
+
+
+def test_failed_symbol_waits_for_its_backoff(db, monkeypatch):
+    job = JobTracker.start_or_resume('reanalyze', ['AAPL'])
+    job.mark_failed('AAPL', 'timeout')
+    assert job.runnable() == []
+
+    monkeypatch.setattr(jobs, 'JOB_RETRY_BASE_SECONDS', 0)
+    job.mark_failed('AAPL', 'timeout')
+    assert job.runnable() == ['AAPL']
+
+
+def test_dead_letter_after_max_attempts_then_requeued(db, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_MAX_ATTEMPTS', 2)
+    job = JobTracker.start_or_resume('reanalyze', ['AAPL'])
+    job.mark_failed('AAPL', 'boom')
+    job.mark_failed('AAPL', 'boom')
+
+    assert _statuses(job) == {'AAPL': 'dead'}
+    assert job.finish() == {'dead': 1}
+    assert _job_status(job) == 'completed'
+
+    assert retry_dead_letters('reanalyze') == 1
+    assert _job_status(job) == 'active'
+    assert job.runnable() == ['AAPL']
+
+
+def test_finish_keeps_job_active_while_work_is_left(db):
+    job = JobTracker.start_or_resume('reanalyze', ['AAPL', 'MSFT'])
+    job.mark_done('AAPL')
+    job.finish()
+    assert _job_status(job) == 'active'
+
+    job.mark_done('MSFT')
+    job.finish()
+    assert _job_status(job) == 'completed'
+
+
+def test_other_scope_expires_the_active_job(db):
+    job = JobTracker.start_or_resume('reanalyze', ['AAPL'], scope='prompt-v1')
+    job.mark_done('AAPL')
+
+    fresh = JobTracker.start_or_resume('reanalyze', ['AAPL'], scope='prompt-v2')
+
+    assert fresh.job_id != job.job_id
+    assert _job_status(job) == 'expired'
+    assert fresh.runnable() == ['AAPL']
+    assert JobTracker.start_or_resume('reanalyze', ['AAPL'], scope='prompt-v2').job_id == fresh.job_id
+
+
+def test_prune_readmits_due_symbols_and_drops_the_rest(db):
+    job = JobTracker.start_or_resume('update_database', ['AAPL', 'MSFT', 'NVDA'], prune=True)
+    job.mark_done('AAPL')
+    job.mark_failed('MSFT', 'timeout')
+
+    # Next cycle: AAPL is stale again, MSFT and NVDA are fresh, TSLA is new
+    resumed = JobTracker.start_or_resume('update_database', ['AAPL', 'TSLA'], prune=True)
+
+    assert resumed.job_id == job.job_id
+    assert _statuses(resumed) == {'AAPL': 'pending', 'TSLA': 'pending'}
+    assert sorted(resumed.runnable()) == ['AAPL', 'TSLA']
+
+
+@pytest.mark.parametrize('prune', [False, True])
+def test_symbols_are_deduplicated(db, prune):
+    job = JobTracker.start_or_resume('update_database', ['AAPL', 'AAPL', 'MSFT'], prune=prune)
+    assert sorted(_statuses(job)) == ['AAPL', 'MSFT']
@@ -0,0 +1,125 @@
+import json
+import os
+
+import pytest
+
+import llm_batch
+from database import CompanyAnalysis, JobItem, get_session
+from llm_service import LLMService
+from prompt_config import PromptSnapshot
+
+COMPANIES = [
+    ('GOOGL', 'Alphabet Inc. (Class A) - Technology', 'Alphabet Inc'),
+    ('GOOG', 'Alphabet Inc. (Class C) - Technology', 'Alphabet Inc'),
+    ('AAPL', 'Apple Inc - Technology', 'Apple Inc'),
+    ('MSFT', 'Microsoft Corp - Technology', 'Microsoft Corp'),
+]
+FOUNDERS = {'founders': ['Larry Page', 'Sergey Brin'], 'currentCEO': 'Sundar Pichai', 'currentChairman': 'John Hennessy',
+            'isFounderCEO': False, 'isFounderChairman': False}
+
+
+@pytest.fixture
+def service(db, tmp_path, monkeypatch):
+    """Companies with unknown founders, and a local LLM that fails on Microsoft."""
+    monkeypatch.setattr(llm_batch, 'LLM_BATCH_DIR', str(tmp_path / 'batches'))
+    session = get_session()
+    for symbol, sector, name in COMPANIES:
+        session.add(CompanyAnalysis(symbol=symbol, sector=sector, company_name=name, current_price=100.0,
+                                    pe_ratio=20.0, founder_source='none'))
+    session.commit()
+    session.close()
+
+    service = LLMService()
+    service.provider, service.model, service.api_key, service.client = 'openai', 'gpt-4o', 'test', object()
+    service.prompts = []
+
+    def complete(body, usage=None):
+        prompt = body['messages'][1]['content']
+        service.prompts.append(prompt)
+        if 'Microsoft' in prompt:
+            raise ValueError('upstream error')
+        if 'founders' in prompt:
+            return json.dumps(FOUNDERS)
+        return json.dumps({'score': 81, 'recommendation': 'LONG', 'reasoning': 'moat'})
+    monkeypatch.setattr(service, 'complete', complete)
+    monkeypatch.setattr(service, 'current_prompt', lambda: PromptSnapshot('You are an analyst.', 4))
+    return service
+
+
+def _rows():
+    session = get_session()
+    try:
+        return {c.symbol: c for c in session.query(CompanyAnalysis)}
+    finally:
+        session.close()
+
+
+def _job_statuses(manifest):
+    session = get_session()
+    try:
+        return dict(session.query(JobItem.symbol, JobItem.status).filter_by(job_id=manifest['job']['id']))
+    finally:
+        session.close()
+
+
+def test_reanalysis_round_trip_through_the_local_backend(service):
+    name = llm_batch.submit_batch('reanalyze', backend='local', llm_service=service)
+
+    # One request per issuer: GOOG rides along with GOOGL
+    manifest = llm_batch.load_manifest(name)
+    assert manifest['status'] == 'submitted' and manifest['requests'] == 3
+    assert manifest['items']['GOOGL']['group'] == ['GOOGL', 'GOOG']
+    assert llm_batch.pending_batches() == [name]
+
+    assert llm_batch.poll_batch(name, llm_service=service) == 'applied'
+
+    rows = _rows()
+    assert [rows[s].ai_impact_score for s in ('GOOGL', 'GOOG', 'AAPL')] == [81, 81, 81]
+    assert rows['GOOG'].analysis_prompt_version == 4
+    assert rows['MSFT'].ai_impact_score is None
+    manifest = llm_batch.load_manifest(name)
+    assert manifest['stats'] == {'applied': 2, 'failed': 1, 'missing': 0}
+    assert _job_statuses(manifest) == {'GOOGL': 'done', 'AAPL': 'done', 'MSFT': 'failed'}
+    assert llm_batch.pending_batches() == []
+    # Applying twice is a no-op
+    assert llm_batch.poll_batch(name, llm_service=service) == 'applied'
+
+
+def test_resubmit_skips_checkpointed_issuers(service):
+    llm_batch.poll_batch(llm_batch.submit_batch('reanalyze', backend='local', llm_service=service), llm_service=service)
+    service.prompts.clear()
+
+    # Done issuers are skipped, and MSFT waits for its retry backoff
+    assert llm_batch.submit_batch('reanalyze', backend='local', llm_service=service) is None
+    assert service.prompts == []
+
+
+def test_apply_results_counts_missing_and_invalid_items(service, tmp_path):
+    manifest = {'kind': 'founders', 'items': {'GOOGL': {'group': ['GOOGL', 'GOOG']}, 'AAPL': {'group': ['AAPL']},
+                                              'MSFT': {'group': ['MSFT']}}}
+    path = str(tmp_path / 'output.jsonl')
+    with open(path, 'w') as f:
+        f.write(llm_batch._output_line(1, 'GOOGL', json.dumps(FOUNDERS)) + '\n')
+        f.write(llm_batch._output_line(2, 'AAPL', 'not json') + '\n')
+
+    session = get_session()
+    try:
+        stats = llm_batch.apply_results(manifest, [path], session)
+    finally:
+        session.close()
+
+    assert stats == {'applied': 1, 'failed': 1, 'missing': 1}
+    rows = _rows()
+    assert rows['GOOG'].founders == rows['GOOGL'].founders
+    assert 'Larry Page' in str(rows['GOOG'].founders)
+
+
+def test_founder_round_trip_writes_every_share_class(service):
+    name = llm_batch.submit_batch('founders', backend='local', llm_service=service)
+    assert os.path.exists(llm_batch._batch_path(name, 'input.jsonl'))
+
+    assert llm_batch.poll_batch(name, llm_service=service) == 'applied'
+
+    rows = _rows()
+    assert rows['GOOGL'].founder_source == rows['GOOG'].founder_source != 'none'
+    assert rows['MSFT'].founder_source == 'none'
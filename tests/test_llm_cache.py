@@ -0,0 +1,57 @@
+import llm_cache
+from llm_cache import analysis_key, lookup, store
+
+TEMPLATE = 'Analyze {Symbol}'
+COMPANY = {
+    'Symbol': 'AAPL', 'Name': 'Apple Inc', 'Sector': 'Technology', 'Description': 'Phones and  services.',
+    'Price': 100.0, 'PERatio': 30.0, 'MarketCapitalization': 3e12,
+}
+RESULT = {'score': 80, 'recommendation': 'LONG', 'reasoning': 'moat'}
+
+
+def _key(company=COMPANY, prompt='You are an analyst.', model='openai:gpt-4o', template=TEMPLATE):
+    return analysis_key(prompt, model, template, company)
+
+
+def test_key_ignores_whitespace_and_numeric_inputs():
+    reflowed = dict(COMPANY, Description='Phones and services. ', Price=101.0)
+    assert _key(reflowed, prompt='You are  an analyst.\n') == _key()
+
+
+def test_key_changes_with_prompt_model_template_and_text():
+    key = _key()
+    assert _key(prompt='You are a short seller.') != key
+    assert _key(model='openai:gpt-4o-mini') != key
+    assert _key(template='packed:4:' + TEMPLATE) != key
+    assert _key(dict(COMPANY, Description='Cars.')) != key
+
+
+def test_key_includes_the_news_sentiment_label():
+    bullish = dict(COMPANY, NewsSentiment={'label': 'Bullish', 'score': 0.4})
+    assert _key(bullish) != _key()
+    assert _key(bullish) == _key(dict(COMPANY, NewsSentiment={'label': 'Bullish', 'score': 0.5}))
+
+
+def test_lookup_within_tolerance(db):
+    key = _key()
+    store(key, 'openai:gpt-4o', COMPANY, RESULT)
+
+    assert lookup(key, dict(COMPANY, Price=105.0), tolerance=0.10) == RESULT
+    assert lookup(key, dict(COMPANY, Price=120.0), tolerance=0.10) is None
+    assert lookup(key, dict(COMPANY, PERatio=None), tolerance=0.10) is None
+
+
+def test_lookup_miss_and_overwrite(db):
+    key = _key()
+    assert lookup(key, COMPANY) is None
+
+    store(key, 'openai:gpt-4o', COMPANY, RESULT)
+    store(key, 'openai:gpt-4o', COMPANY, dict(RESULT, score=60))
+    assert lookup(key, COMPANY)['score'] == 60
+
+
+def test_disabled_cache(db, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'ANALYSIS_CACHE_ENABLED', False)
+    key = _key()
+    store(key, 'openai:gpt-4o', COMPANY, RESULT)
+    assert lookup(key, COMPANY) is None
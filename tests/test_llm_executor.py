@@ -0,0 +1,85 @@
+import pytest
+
+from llm_executor import AIMDLimiter, AdaptiveExecutor, LLMThrottled
+from llm_service import is_failed_analysis
+
+OK = {'score': 70, 'recommendation': 'LONG', 'reasoning': 'moat'}
+FAILED = {'score': 50, 'recommendation': 'NEUTRAL', 'reasoning': 'Analysis failed: provider error'}
+
+
+def test_limit_grows_by_one_after_a_full_window():
+    limiter = AIMDLimiter(initial=2, minimum=1, maximum=4)
+    limiter.success()
+    assert limiter.limit == 2
+    limiter.success()
+    assert limiter.limit == 3
+    for _ in range(3):
+        limiter.success()
+    assert limiter.limit == 4
+    for _ in range(10):
+        limiter.success()
+    assert limiter.limit == 4 and limiter.counters['increases'] == 2
+
+
+def test_throttle_halves_the_limit_down_to_the_minimum():
+    limiter = AIMDLimiter(initial=8, minimum=2, maximum=16, decrease_factor=0.5)
+    limiter.throttled(0)
+    assert limiter.limit == 4
+    limiter.throttled(0, timeout=True)
+    limiter.throttled(0)
+    assert limiter.limit == 2
+    assert limiter.counters['decreases'] == 2
+    assert (limiter.counters['throttled'], limiter.counters['timeouts']) == (2, 1)
+
+
+def test_throttled_item_is_requeued_and_retried():
+    calls = {}
+
+    def fn(item):
+        calls[item] = calls.get(item, 0) + 1
+        if item == 'b' and calls[item] == 1:
+            raise LLMThrottled('429', retry_after=0.05)
+        return item.upper()
+
+    results = []
+    limiter = AIMDLimiter(initial=2, minimum=1, maximum=2)
+    stats = AdaptiveExecutor(fn, limiter).run(['a', 'b', 'c'], lambda *r: results.append(r))
+
+    assert sorted(results) == [('a', 'A', None), ('b', 'B', None), ('c', 'C', None)]
+    assert calls['b'] == 2
+    assert stats['throttled'] == 1 and stats['successes'] == 3
+
+
+def test_retries_are_bounded():
+    def fn(item):
+        raise LLMThrottled('429', retry_after=0.01)
+
+    results = []
+    AdaptiveExecutor(fn, AIMDLimiter(initial=1, minimum=1, maximum=1), max_retries=2).run(
+        ['a'], lambda *r: results.append(r))
+
+    (item, result, error), = results
+    assert result is None and error.startswith('throttled 3 times')
+
+
+def test_errors_are_reported_without_growing_the_limit():
+    def fn(item):
+        if item == 'boom':
+            raise ValueError('bad payload')
+        return FAILED
+
+    results = []
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=4)
+    stats = AdaptiveExecutor(fn, limiter, failed=is_failed_analysis).run(
+        ['boom', 'a', 'b', 'c'], lambda *r: results.append(r))
+
+    assert ('boom', None, 'bad payload') in results
+    assert stats['errors'] == 4 and stats['successes'] == 0
+    assert limiter.limit == 1
+
+
+@pytest.mark.parametrize('failed, successes', [(None, 3), (is_failed_analysis, 2)])
+def test_failed_predicate_only_counts_real_answers(failed, successes):
+    answers = {'a': OK, 'b': FAILED, 'c': OK}
+    stats = AdaptiveExecutor(answers.get, AIMDLimiter(initial=1, minimum=1, maximum=4), failed=failed).run('abc')
+    assert stats['successes'] == successes
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from llm_executor import LLMThrottled
+from llm_packing import analyze_packed, cached_packed, chunked, parse_packed, validate_analysis
+from llm_service import LLMService
+
+PROMPT = 'You are an analyst.'
+COMPANIES = [{'Symbol': s, 'Name': f"{s} Inc", 'Sector': 'TECHNOLOGY', 'Description': f"{s} things.", 'Price': 10.0}
+             for s in ('AAA', 'BBB', 'CCC')]
+
+
+def _analysis(symbol, score=70):
+    return {'symbol': symbol, 'score': score, 'recommendation': 'LONG', 'reasoning': f"{symbol} moat"}
+
+
+def test_validate_analysis():
+    assert validate_analysis({'score': '65.0', 'recommendation': ' short', 'reasoning': 'debt'}) == \
+        {'score': 65, 'recommendation': 'SHORT', 'reasoning': 'debt'}
+    assert validate_analysis({'score': 101, 'recommendation': 'LONG', 'reasoning': 'x'}) is None
+    assert validate_analysis({'score': 50, 'recommendation': 'BUY', 'reasoning': 'x'}) is None
+    assert validate_analysis({'score': 50, 'recommendation': 'LONG', 'reasoning': ' '}) is None
+    assert validate_analysis({'score': None, 'recommendation': 'LONG', 'reasoning': 'x'}) is None
+    assert validate_analysis(['score']) is None
+
+
+def test_parse_packed_accepts_the_three_shapes():
+    results = {'results': [_analysis('AAA'), _analysis('BBB')]}
+    assert set(parse_packed(json.dumps(results), ['AAA', 'BBB'])) == {'AAA', 'BBB'}
+    assert set(parse_packed(json.dumps(results['results']), ['AAA', 'BBB'])) == {'AAA', 'BBB'}
+    keyed = {'aaa': {'score': 10, 'recommendation': 'SHORT', 'reasoning': 'x'}}
+    assert parse_packed(json.dumps(keyed), ['AAA'])['AAA']['score'] == 10
+
+
+def test_parse_packed_drops_unknown_duplicate_and_malformed_elements():
+    text = json.dumps({'results': [
+        _analysis('AAA'), _analysis('AAA', 20),      # duplicate: neither is trusted
+        _analysis('ZZZ'),                             # not asked for
+        dict(_analysis('BBB'), score='high'),         # malformed
+        _analysis('CCC'),
+    ]})
+    assert set(parse_packed(text, ['AAA', 'BBB', 'CCC'])) == {'CCC'}
+    assert parse_packed('not json', ['AAA']) == {}
+    assert parse_packed('"text"', ['AAA']) == {}
+
+
+def test_chunked_is_lazy_and_keeps_the_remainder():
+    assert list(chunked(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
+
+
+@pytest.fixture
+def service(db, monkeypatch):
+    service = LLMService()
+    service.provider, service.model, service.api_key, service.client = 'openai', 'gpt-4o', 'test', object()
+    service.bodies = []
+    service.answers = []
+
+    def complete(body, usage=None):
+        service.bodies.append(body)
+        answer = service.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    monkeypatch.setattr(service, 'complete', complete)
+    return service
+
+
+def test_missing_elements_fall_back_to_single_calls(service):
+    service.answers = [json.dumps({'results': [_analysis('AAA'), _analysis('BBB')]}),
+                       json.dumps(_analysis('CCC', 40))]
+    stats = {}
+
+    results = analyze_packed(service, COMPANIES, PROMPT, stats=stats, pack_size=3)
+
+    assert {s: r['score'] for s, r in results.items()} == {'AAA': 70, 'BBB': 70, 'CCC': 40}
+    assert len(service.bodies) == 2 and 'CCC' in service.bodies[1]['messages'][1]['content']
+    assert stats['fallbacks'] == 1
+
+
+def test_packed_results_are_cached_under_their_pack_size(service):
+    service.answers = [json.dumps({'results': [_analysis(c['Symbol']) for c in COMPANIES]})]
+    analyze_packed(service, COMPANIES, PROMPT, pack_size=3)
+
+    assert analyze_packed(service, COMPANIES, PROMPT, pack_size=3).keys() == {'AAA', 'BBB', 'CCC'}
+    assert len(service.bodies) == 1
+    # Never served as a single analysis, nor to runs with another pack size
+    assert service.cached_analysis(COMPANIES[0], PROMPT) is None
+    assert cached_packed(service, COMPANIES[0], PROMPT, pack_size=4) is None
+
+
+def test_failed_pack_falls_back_and_throttle_is_raised(service):
+    service.answers = [ValueError('bad gateway')] + [json.dumps(_analysis(c['Symbol'])) for c in COMPANIES]
+    assert len(analyze_packed(service, COMPANIES, PROMPT, pack_size=3)) == 3
+
+    service.answers = [LLMThrottled('429', retry_after=1)]
+    with pytest.raises(LLMThrottled):
+        analyze_packed(service, COMPANIES, PROMPT, raise_on_throttle=True, use_cache=False, pack_size=3)
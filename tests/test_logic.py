@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from logic import AIScreener, pipeline_job
+from scheduler import Freshness, utcnow
+
+
+class QuoteStub:
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    def global_quote(self, symbol):
+        self.calls.append(symbol)
+        return {'Global Quote': {'05. price': str(self.prices[symbol])}}
+
+
+def test_pipeline_job_shape():
+    job = pipeline_job('GOOGL', 'Alphabet Inc. (Class A) - Tech', share_classes=[('GOOG', 'Alphabet Inc. (Class C) - Tech', None)])
+    assert job == {
+        'symbol': 'GOOGL', 'sector': 'Alphabet Inc. (Class A) - Tech', 'state': None, 'reported': False,
+        'share_classes': [{'symbol': 'GOOG', 'sector': 'Alphabet Inc. (Class C) - Tech', 'state': None}],
+    }
+    assert pipeline_job('AAPL', 'Apple - Tech')['share_classes'] == []
+
+
+def test_quote_stage_prices_every_share_class():
+    screener = AIScreener()
+    screener.market_data = QuoteStub({'GOOGL': 170.5, 'GOOG': 171.0})
+    job = pipeline_job('GOOGL', 'A', share_classes=[('GOOG', 'C', None)])
+
+    screener._quote_stage(job)
+
+    assert (job['price'], job['share_classes'][0]['price']) == (170.5, 171.0)
+    assert job['price_fetched'] and job['share_classes'][0]['price_fetched']
+
+
+def test_quote_stage_reuses_a_recent_price():
+    screener = AIScreener()
+    screener.market_data = QuoteStub({'GOOG': 171.0})
+    fresh = Freshness(None, utcnow() - timedelta(minutes=1), 170.0, None, None)
+    job = pipeline_job('GOOGL', 'A', fresh, share_classes=[('GOOG', 'C', None)])
+
+    screener._quote_stage(job)
+
+    assert screener.market_data.calls == ['GOOG']
+    assert job['price'] == 170.0 and not job['price_fetched']
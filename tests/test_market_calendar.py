@@ -0,0 +1,67 @@
+from datetime import date, datetime
+
+import pytest
+
+from market_calendar import MarketCalendar, easter_sunday
+
+CALENDAR = MarketCalendar()
+
+# NYSE closures of 2025 (including the day of mourning for J. Carter)
+HOLIDAYS_2025 = {
+    date(2025, 1, 1), date(2025, 1, 9), date(2025, 1, 20), date(2025, 2, 17), date(2025, 4, 18),
+    date(2025, 5, 26), date(2025, 6, 19), date(2025, 7, 4), date(2025, 9, 1), date(2025, 11, 27),
+    date(2025, 12, 25),
+}
+
+
+def test_holidays_2025():
+    assert CALENDAR.holidays(2025) == HOLIDAYS_2025
+
+
+def test_early_closes_2025():
+    assert CALENDAR.early_closes(2025) == {date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24)}
+
+
+def test_weekend_holidays_are_observed():
+    # July 4th 2026 is a Saturday: closed on Friday the 3rd, which is then no early close
+    assert not CALENDAR.is_trading_day(date(2026, 7, 3))
+    assert date(2026, 7, 2) not in CALENDAR.early_closes(2026)
+    # New Year's Day on a Saturday is not moved to December 31st
+    assert CALENDAR.is_trading_day(date(2021, 12, 31))
+
+
+def test_easter_sunday():
+    assert easter_sunday(2025) == date(2025, 4, 20)
+    assert easter_sunday(2026) == date(2026, 4, 5)
+
+
+def test_trading_day_navigation():
+    assert CALENDAR.previous_trading_day(date(2025, 1, 21)) == date(2025, 1, 17)
+    assert CALENDAR.next_trading_day(date(2025, 4, 17)) == date(2025, 4, 21)
+
+
+@pytest.mark.parametrize('now, expected', [
+    # Tuesday after the MLK weekend, before the open: last close is Friday's
+    (datetime(2025, 1, 21, 13, 0), datetime(2025, 1, 17, 21, 0)),
+    # Same day after the close (EST: 16:00 = 21:00 UTC)
+    (datetime(2025, 1, 21, 21, 0), datetime(2025, 1, 21, 21, 0)),
+    # Summer time: 16:00 = 20:00 UTC; the 3rd of July closes at 13:00 = 17:00 UTC
+    (datetime(2025, 7, 7, 12, 0), datetime(2025, 7, 3, 17, 0)),
+])
+def test_last_close(now, expected):
+    assert CALENDAR.last_close(now) == expected
+
+
+def test_is_open_and_traded_since():
+    assert CALENDAR.is_open(datetime(2025, 1, 21, 15, 0))
+    assert not CALENDAR.is_open(datetime(2025, 1, 20, 15, 0))
+    assert not CALENDAR.traded_since(datetime(2025, 1, 17, 22, 0), datetime(2025, 1, 20, 15, 0))
+    assert CALENDAR.traded_since(datetime(2025, 1, 17, 20, 0), datetime(2025, 1, 20, 15, 0))
+
+
+def test_extra_file_adds_closures(tmp_path):
+    path = tmp_path / 'calendar.json'
+    path.write_text('{"closed": ["2025-03-04"], "early_close": ["2025-03-05"]}')
+    calendar = MarketCalendar(extra_file=str(path))
+    assert not calendar.is_trading_day(date(2025, 3, 4))
+    assert calendar.session_close(date(2025, 3, 5)) == datetime(2025, 3, 5, 18, 0)
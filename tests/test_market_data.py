@@ -0,0 +1,57 @@
+import os
+
+import pandas as pd
+import pytest
+
+import market_data
+from market_data import LocalFileProvider
+
+OVERVIEW = pd.DataFrame({
+    'Symbol': ['AAPL', 'XYZ'],
+    'Name': ['Apple Inc', 'Xyz Corp'],
+    'Sector': ['TECHNOLOGY', None],
+    'PERatio': ['30', None],
+})
+QUOTES = pd.DataFrame({'symbol': ['AAPL', 'XYZ'], 'price': ['200.5', '12']})
+
+
+def _csv_provider(tmp_path):
+    OVERVIEW.to_csv(tmp_path / 'overview.csv', index=False)
+    QUOTES.to_csv(tmp_path / 'quotes.csv', index=False)
+    return LocalFileProvider(data_dir=str(tmp_path))
+
+
+def _payloads(provider):
+    return ([provider.company_overview(s) for s in ('AAPL', 'XYZ', 'NOPE')],
+            provider.global_quote('XYZ'), provider.bulk_quotes(['AAPL', 'NOPE']))
+
+
+def test_csv_missing_values_are_empty_strings(tmp_path):
+    provider = _csv_provider(tmp_path)
+    assert provider.company_overview('XYZ') == {'Symbol': 'XYZ', 'Name': 'Xyz Corp', 'Sector': '', 'PERatio': ''}
+    assert provider.company_overview('NOPE') == {}
+    assert provider.bulk_quotes(['AAPL', 'NOPE']) == {'data': [{'symbol': 'AAPL', 'close': '200.5'}]}
+
+
+def test_parquet_matches_csv(tmp_path):
+    pytest.importorskip('pyarrow')
+    csv_dir, parquet_dir = tmp_path / 'csv', tmp_path / 'parquet'
+    csv_dir.mkdir()
+    parquet_dir.mkdir()
+    OVERVIEW.to_parquet(parquet_dir / 'overview.parquet', index=False)
+    QUOTES.to_parquet(parquet_dir / 'quotes.parquet', index=False)
+
+    assert _payloads(LocalFileProvider(data_dir=str(parquet_dir))) == _payloads(_csv_provider(csv_dir))
+
+
+def test_parquet_nulls_are_not_read_as_nan(tmp_path, monkeypatch):
+    # Frames as pyarrow hands them back: None in object columns, NaN in float ones
+    frames = {'overview': OVERVIEW.assign(PERatio=[30.0, float('nan')]), 'quotes': QUOTES}
+    for name in frames:
+        (tmp_path / f"{name}.parquet").touch()
+    monkeypatch.setattr(market_data.pd, 'read_parquet', lambda path: frames[os.path.basename(path)[:-len('.parquet')]].copy())
+
+    provider = LocalFileProvider(data_dir=str(tmp_path))
+
+    assert provider.company_overview('XYZ') == {'Symbol': 'XYZ', 'Name': 'Xyz Corp', 'Sector': '', 'PERatio': ''}
+    assert provider.company_overview('AAPL')['PERatio'] == '30.0'
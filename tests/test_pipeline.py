@@ -0,0 +1,78 @@
+import threading
+
+from pipeline import Pipeline, RetryLater, Stage
+
+
+def _run(stages, items, **kwargs):
+    finished = []
+    lock = threading.Lock()
+
+    def on_finish(item, outcome, error):
+        with lock:
+            finished.append((item, outcome, error))
+    stats = Pipeline(stages, on_finish=on_finish, **kwargs).run(items)
+    return stats, finished
+
+
+def test_items_go_through_every_stage_in_order():
+    def stage(name):
+        def fn(item):
+            return item + [name]
+        return fn
+
+    stats, finished = _run([Stage('a', stage('a'), workers=3), Stage('b', stage('b'), workers=2),
+                            Stage('c', stage('c'))], ([i] for i in range(20)))
+
+    assert sorted(item[0] for item, _, _ in finished) == list(range(20))
+    assert all(item[1:] == ['a', 'b', 'c'] and outcome == 'done' for item, outcome, _ in finished)
+    assert [s['processed'] for s in stats.values()] == [20, 20, 20]
+
+
+def test_dropped_and_failed_items_are_reported_once():
+    def check(item):
+        if item == 1:
+            return None
+        if item == 2:
+            raise ValueError('bad row')
+        return item
+
+    stats, finished = _run([Stage('check', check), Stage('keep', lambda item: item)], range(4))
+
+    assert sorted(finished) == [(0, 'done', ''), (1, 'dropped', 'dropped at check'),
+                                (2, 'failed', 'check: bad row'), (3, 'done', '')]
+    assert stats['check'] == dict(stats['check'], processed=2, dropped=1, failed=1)
+    assert stats['keep']['processed'] == 2
+
+
+def test_retry_later_puts_the_item_back_in_the_same_stage():
+    attempts = {}
+
+    def flaky(item):
+        attempts[item] = attempts.get(item, 0) + 1
+        if attempts[item] < 3:
+            raise RetryLater('quota', delay=0.01)
+        return item
+
+    stats, finished = _run([Stage('first', lambda item: item), Stage('flaky', flaky)], ['x', 'y'])
+
+    assert sorted(finished) == [('x', 'done', ''), ('y', 'done', '')]
+    assert attempts == {'x': 3, 'y': 3}
+    assert stats['flaky']['retried'] == 4 and stats['first']['processed'] == 2
+
+
+def test_retry_later_gives_up_after_max_retries():
+    def throttled(item):
+        raise RetryLater('still throttled', delay=0.01)
+
+    stats, finished = _run([Stage('api', throttled, max_retries=2)], ['x'])
+
+    assert finished == [('x', 'failed', 'api: still throttled')]
+    assert (stats['api']['retried'], stats['api']['failed']) == (2, 1)
+
+
+def test_a_failing_callback_does_not_hang_the_run():
+    def on_finish(item, outcome, error):
+        raise RuntimeError('checkpoint store down')
+
+    stats = Pipeline([Stage('only', lambda item: item)], on_finish=on_finish).run(range(3))
+    assert stats['only']['processed'] == 3
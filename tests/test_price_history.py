@@ -0,0 +1,82 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+import price_history
+from price_history import (HISTORY_DTYPE, append_history, from_day, last_day, load_history, risk_metrics,
+                           to_day, update_history)
+
+
+def _records(days, closes=None):
+    closes = closes if closes is not None else [100.0 + i for i in range(len(days))]
+    return np.array([(to_day(d), c, c, c, c, 1000.0) for d, c in zip(days, closes)], dtype=HISTORY_DTYPE)
+
+
+class SeriesStub:
+    def __init__(self, days):
+        self.days = days
+        self.calls = []
+
+    def daily_series(self, symbol, outputsize='compact'):
+        self.calls.append((symbol, outputsize))
+        return {'Time Series (Daily)': {
+            d: {'1. open': '1', '2. high': '1', '3. low': '1', '4. close': str(i + 1), '5. volume': '10'}
+            for i, d in enumerate(self.days)
+        }}
+
+
+def test_day_round_trip():
+    assert from_day(to_day('2025-01-17')) == date(2025, 1, 17)
+
+
+def test_append_sorts_and_skips_known_days(tmp_path):
+    base = str(tmp_path)
+    assert append_history('AAPL', _records(['2025-01-03', '2025-01-02']), base) == 2
+    assert append_history('AAPL', _records(['2025-01-02', '2025-01-03', '2025-01-06']), base) == 1
+    assert append_history('AAPL', _records(['2025-01-06']), base) == 0
+
+    history = load_history('AAPL', base)
+    assert [from_day(d) for d in history['date']] == [date(2025, 1, 2), date(2025, 1, 3), date(2025, 1, 6)]
+    assert last_day('AAPL', base) == to_day('2025-01-06')
+
+
+def test_torn_trailing_record_is_ignored_and_overwritten(tmp_path):
+    base = str(tmp_path)
+    append_history('AAPL', _records(['2025-01-02']), base)
+    with open(price_history.history_path('AAPL', base), 'ab') as f:
+        f.write(b'\x00' * 7)
+    assert len(load_history('AAPL', base)) == 1
+
+    assert append_history('AAPL', _records(['2025-01-03']), base) == 1
+    assert len(load_history('AAPL', base)) == 2
+
+
+def test_update_history_drops_the_partial_bar_and_skips_up_to_date_symbols(tmp_path, monkeypatch):
+    base = str(tmp_path)
+    monkeypatch.setattr(price_history, 'latest_closed_session', lambda now=None: date(2025, 1, 6))
+    provider = SeriesStub(['2025-01-02', '2025-01-03', '2025-01-06', '2025-01-07'])
+
+    assert update_history(['AAPL'], provider, base) == {'AAPL': 3}
+    assert provider.calls == [('AAPL', 'full')]
+    assert last_day('AAPL', base) == to_day('2025-01-06')
+
+    # Already holds the latest closed session: no call
+    assert update_history(['AAPL'], provider, base) == {'AAPL': 0}
+    assert len(provider.calls) == 1
+
+
+def test_risk_metrics():
+    closes = np.array([[100.0, 10.0], [110.0, np.nan], [99.0, 12.0], [121.0, 9.0]])
+    metrics = risk_metrics(closes)
+
+    assert metrics['return'] == pytest.approx([0.21, -0.1])
+    assert metrics['max_drawdown'] == pytest.approx([-0.1, -0.25])
+    expected_vol = np.std(np.diff(np.log(closes[:, 0])), ddof=1) * np.sqrt(252)
+    assert metrics['volatility'][0] == pytest.approx(expected_vol)
+
+
+def test_risk_metrics_without_enough_bars():
+    metrics = risk_metrics(np.array([[100.0, np.nan]]))
+    assert metrics['return'][0] == 0.0
+    assert np.isnan(metrics['volatility']).all()
@@ -0,0 +1,72 @@
+import threading
+import time
+
+from alpha_vantage import ApiKeyPool
+from rate_limiter import BackoffQueue, TokenBucket
+
+
+def test_bucket_spends_its_capacity_then_asks_to_wait(tmp_path):
+    bucket = TokenBucket('test', rate_per_minute=60, capacity=2, state_dir=str(tmp_path))
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert 0 < bucket.try_acquire() <= 1.0
+
+
+def test_bucket_state_is_shared_through_its_file(tmp_path):
+    first = TokenBucket('shared', rate_per_minute=1, capacity=1, state_dir=str(tmp_path))
+    second = TokenBucket('shared', rate_per_minute=1, capacity=1, state_dir=str(tmp_path))
+    assert first.try_acquire() == 0
+    assert second.try_acquire() > 0
+
+
+def test_refund_gives_a_token_back_up_to_capacity(tmp_path):
+    bucket = TokenBucket('refund', rate_per_minute=1, capacity=1, state_dir=str(tmp_path))
+    assert bucket.try_acquire() == 0
+    bucket.refund()
+    bucket.refund()
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() > 0
+
+
+def test_penalize_blocks_the_bucket(tmp_path):
+    bucket = TokenBucket('penalized', rate_per_minute=600, state_dir=str(tmp_path))
+    bucket.penalize(30)
+    assert bucket.try_acquire() > 29
+
+
+def test_daily_quota_does_not_burn_the_minute_token(tmp_path):
+    pool = ApiKeyPool(['k1'], rate_per_minute=1, calls_per_day=1, state_dir=str(tmp_path))
+    assert pool._try_key('k1') == 0
+    # Refill the minute bucket only: the daily one is exhausted
+    pool._minute['k1'].refund()
+    assert pool._try_key('k1') > 0
+    assert pool._minute['k1'].try_acquire() == 0
+
+
+def test_backoff_queue_delays_requeued_items():
+    queue = BackoffQueue(['a', 'b'], base_delay=0.05, max_delay=0.05)
+    assert queue.pop() == ('a', 0)
+    assert queue.requeue('a', 0) == 0.05
+    assert queue.pop() == ('b', 0)
+
+    started = time.time()
+    assert queue.pop() == ('a', 1)
+    assert time.time() - started >= 0.04
+    assert queue.pop() is None
+
+
+def test_backoff_delay_is_exponential_and_capped():
+    queue = BackoffQueue(base_delay=10, max_delay=25)
+    assert [queue.requeue('x', attempt) for attempt in range(3)] == [10, 20, 25]
+    assert len(queue) == 3
+
+
+def test_blocking_pop_waits_for_a_push_and_stops_on_close():
+    queue = BackoffQueue()
+    threading.Timer(0.05, queue.push, args=('a',)).start()
+    assert queue.pop(block=True) == ('a', 0)
+
+    threading.Timer(0.05, queue.close).start()
+    started = time.time()
+    assert queue.pop(block=True) is None
+    assert time.time() - started < 1
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import llm_batch
+from database import CompanyAnalysis, SymbolSentiment, get_session
+from logic import AIScreener
+from news_sentiment import load_sentiment
+from payload_archive import archive_overview
+from prompt_config import PromptSnapshot
+
+PROMPT = PromptSnapshot('You are an analyst.', 3)
+OVERVIEW = {'Symbol': 'AAPL', 'Name': 'Apple Inc', 'Sector': 'TECHNOLOGY', 'Description': 'Phones.',
+            'PERatio': '30', 'MarketCapitalization': '3000000000000'}
+
+
+@pytest.fixture
+def screener(db, monkeypatch):
+    """A screener on one archived company with fresh news, and an LLM that records its prompts."""
+    now = datetime.now(timezone.utc)
+    session = get_session()
+    session.add(CompanyAnalysis(symbol='AAPL', company_name='Apple Inc', sector='Apple Inc - Technology',
+                                current_price=200.0, pe_ratio=30.0, market_cap=3e12))
+    session.add(SymbolSentiment(symbol='AAPL', weight_sum=3.0, score_sum=1.2, reference_at=now,
+                                article_count=3, last_article_at=now))
+    archive_overview(session, 'AAPL', OVERVIEW)
+    session.commit()
+    session.close()
+
+    screener = AIScreener()
+    service = screener.llm_service
+    service.provider, service.model, service.api_key, service.client = 'openai', 'gpt-4o', 'test', object()
+    service.prompts = []
+
+    def complete(body, usage=None):
+        service.prompts.append(body['messages'][1]['content'])
+        return json.dumps({'score': 80, 'recommendation': 'LONG', 'reasoning': 'moat'})
+    monkeypatch.setattr(service, 'complete', complete)
+    monkeypatch.setattr(service, 'current_prompt', lambda: PROMPT)
+    return screener
+
+
+def test_reanalysis_prompt_carries_the_news_line(screener):
+    screener.reanalyze_existing_data()
+
+    assert len(screener.llm_service.prompts) == 1
+    assert 'News sentiment (recent-weighted): Bullish' in screener.llm_service.prompts[0]
+
+
+def test_batch_prompt_carries_the_news_line(screener, tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_batch, 'LLM_BATCH_DIR', str(tmp_path / 'batches'))
+    name = llm_batch.submit_batch('reanalyze', backend='local', llm_service=screener.llm_service)
+
+    with open(llm_batch._batch_path(name, 'input.jsonl')) as f:
+        line = json.loads(f.readline())
+    assert 'News sentiment (recent-weighted): Bullish' in line['body']['messages'][1]['content']
+
+
+def _cycle_company_data():
+    """company_data as the update_database analyze stage builds it."""
+    session = get_session()
+    try:
+        sentiment = load_sentiment(session)
+    finally:
+        session.close()
+    return dict(OVERVIEW, Price=200.0, NewsSentiment=sentiment.get('AAPL'))
+
+
+def test_reanalysis_hits_the_cache_entry_of_the_cycle(screener):
+    service = screener.llm_service
+    company_data = _cycle_company_data()
+    assert company_data['NewsSentiment']
+    service.analyze_company(company_data, PROMPT.text)
+    service.prompts.clear()
+
+    screener.reanalyze_existing_data()
+
+    assert service.prompts == []
+    session = get_session()
+    try:
+        assert session.get(CompanyAnalysis, 'AAPL').ai_impact_score == 80
+    finally:
+        session.close()
+
+
+def test_batch_hits_the_cache_entry_of_the_cycle(screener, tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_batch, 'LLM_BATCH_DIR', str(tmp_path / 'batches'))
+    screener.llm_service.analyze_company(_cycle_company_data(), PROMPT.text)
+
+    assert llm_batch.submit_batch('reanalyze', backend='local', llm_service=screener.llm_service) is None
@@ -0,0 +1,110 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import scheduler
+from market_calendar import MarketCalendar
+from scheduler import Freshness, StalenessQueue, inputs_changed_materially, is_due
+
+CALENDAR = MarketCalendar()
+PRICE_AGE = timedelta(minutes=15)
+# Friday 2026-01-09: the session closes at 21:00 UTC (16:00 New York)
+FRIDAY_INTRADAY = datetime(2026, 1, 9, 15, 0)
+FRIDAY_AFTER_CLOSE = datetime(2026, 1, 9, 22, 0)
+SUNDAY = datetime(2026, 1, 11, 12, 0)
+MONDAY_INTRADAY = datetime(2026, 1, 12, 15, 0)
+
+
+def _state(updated_at=None, market_cap=None):
+    return Freshness(updated_at, None, None, None, market_cap)
+
+
+def test_never_fetched_is_due():
+    assert is_due(None, PRICE_AGE, SUNDAY, CALENDAR)
+
+
+def test_recent_data_is_not_due():
+    assert not is_due(MONDAY_INTRADAY - timedelta(minutes=5), PRICE_AGE, MONDAY_INTRADAY, CALENDAR)
+
+
+def test_weekend_after_the_close_is_not_due():
+    assert not is_due(FRIDAY_AFTER_CLOSE, PRICE_AGE, SUNDAY, CALENDAR)
+
+
+def test_intraday_fetch_is_due_once_the_session_closed():
+    assert is_due(FRIDAY_INTRADAY, PRICE_AGE, SUNDAY, CALENDAR)
+
+
+def test_open_market_makes_stale_data_due():
+    assert is_due(FRIDAY_AFTER_CLOSE, PRICE_AGE, MONDAY_INTRADAY, CALENDAR)
+
+
+def test_holiday_is_not_a_session():
+    # Monday 2026-01-19 is Martin Luther King Jr. Day
+    assert not is_due(datetime(2026, 1, 16, 22, 0), PRICE_AGE, datetime(2026, 1, 19, 18, 0), CALENDAR)
+
+
+def test_calendar_off_falls_back_to_age(monkeypatch):
+    monkeypatch.setattr(scheduler, 'USE_MARKET_CALENDAR', False)
+    assert is_due(FRIDAY_AFTER_CLOSE, PRICE_AGE, SUNDAY, CALENDAR)
+
+
+@pytest.mark.parametrize('new, changed', [
+    ({'Price': 105.0, 'PERatio': 20.0}, False),
+    ({'Price': 115.0, 'PERatio': 20.0}, True),
+    ({'Price': 100.0, 'PERatio': None}, True),
+])
+def test_inputs_changed_materially(new, changed):
+    old = {'Price': 100.0, 'PERatio': 20.0}
+    inputs = dict.fromkeys(scheduler.SCORING_INPUTS)
+    assert inputs_changed_materially(dict(inputs, **old), dict(inputs, **new), tolerance=0.10) is changed
+
+
+def test_inputs_changed_without_previous_inputs():
+    assert inputs_changed_materially(None, {'Price': 1.0})
+
+
+def test_staleness_queue_order():
+    now = MONDAY_INTRADAY
+    universe = {s: f"{s} Inc - Tech" for s in ('OLD_SMALL', 'NEW', 'OLD_BIG', 'FRESH', 'OLDER')}
+    freshness = {
+        'OLD_SMALL': _state(now - timedelta(days=3), market_cap=1e9),
+        'OLD_BIG': _state(now - timedelta(days=3), market_cap=1e12),
+        'OLDER': _state(now - timedelta(days=10), market_cap=1e6),
+        'FRESH': _state(now - timedelta(hours=1), market_cap=1e12),
+    }
+
+    queue = StalenessQueue(universe, freshness, max_age=timedelta(hours=24), now=now)
+
+    assert queue.symbols() == ['NEW', 'OLDER', 'OLD_BIG', 'OLD_SMALL']
+    assert queue.fresh == 1
+    assert len(queue) == 4
+
+
+def test_staleness_queue_drain_budget_and_allowed():
+    universe = {s: f"{s} - Tech" for s in ('A', 'B', 'C', 'D')}
+    queue = StalenessQueue(universe, {}, now=MONDAY_INTRADAY)
+
+    drained = list(queue.drain(max_symbols=2, time_budget=0, allowed={'B', 'C', 'D'}))
+
+    # A is waiting for a retry: skipped without using the budget
+    assert drained == [('B', 'B - Tech'), ('C', 'C - Tech')]
+    assert queue.symbols() == ['D']
+
+
+def test_staleness_queue_with_earnings_calendar():
+    now = MONDAY_INTRADAY
+    universe = {'REPORTED': 'R - Tech', 'QUIET': 'Q - Tech', 'ANCIENT': 'A - Tech'}
+    freshness = {
+        'REPORTED': _state(now - timedelta(days=10)),
+        'QUIET': _state(now - timedelta(days=10)),
+        'ANCIENT': _state(now - timedelta(days=60)),
+    }
+    report_dates = {'REPORTED': [date(2026, 1, 6)], 'QUIET': [date(2025, 10, 20)]}
+
+    queue = StalenessQueue(universe, freshness, now=now, report_dates=report_dates)
+
+    # QUIET has not reported since its fetch; ANCIENT is past the safety max age
+    assert queue.symbols() == ['ANCIENT', 'REPORTED']
+    assert queue.reported == {'REPORTED'}
+    assert queue.fresh == 1
@@ -0,0 +1,40 @@
+import pytest
+
+from sharding import in_shard, parse_shard, shard_from_args, shard_groups, shard_kind, shard_of
+
+SYMBOLS = [f"S{i:04d}" for i in range(2000)] + ['AAPL', 'MSFT', 'GOOGL', 'GOOG', 'BRK.A', 'BRK.B']
+
+
+def test_assignment_is_a_fixed_crc32():
+    # Pinned values: a change here would move symbols between running workers
+    assert [shard_of(s, 4) for s in ('AAPL', 'MSFT', 'GOOGL', 'BRK.B')] == [0, 3, 3, 0]
+    assert shard_of('aapl', 4) == shard_of('AAPL', 4)
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 7, 16])
+def test_every_symbol_lands_in_exactly_one_shard(count):
+    owners = {s: [i for i in range(count) if in_shard(s, (i, count))] for s in SYMBOLS}
+    assert all(len(shards) == 1 for shards in owners.values())
+    # And the split is roughly even
+    sizes = [sum(1 for shards in owners.values() if shards == [i]) for i in range(count)]
+    assert min(sizes) > 0.7 * len(SYMBOLS) / count
+
+
+def test_share_classes_stay_together_whatever_the_listing_order():
+    groups = {'GOOGL': ['GOOGL', 'GOOG'], 'BRK.B': ['BRK.B', 'BRK.A'], 'AAPL': ['AAPL']}
+    reordered = {'GOOG': ['GOOG', 'GOOGL'], 'BRK.A': ['BRK.A', 'BRK.B'], 'AAPL': ['AAPL']}
+    for count in (2, 3, 4):
+        kept = [shard_groups(groups, (i, count)) for i in range(count)]
+        assert sorted(p for shard in kept for p in shard) == sorted(groups)
+        assert [sorted(map(min, shard.values())) for shard in kept] == \
+            [sorted(map(min, shard_groups(reordered, (i, count)).values())) for i in range(count)]
+
+
+def test_specs_and_kinds():
+    assert parse_shard('') is None and parse_shard('1/4') == (1, 4)
+    for bad in ('4/4', '1', 'a/b', '0/0'):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
+    assert shard_from_args(['--shard', '2/3']) == shard_from_args(['--shard=2/3']) == (2, 3)
+    assert shard_kind('update_database', (0, 4)) == 'update_database-shard0of4'
+    assert shard_kind('update_database', None) == 'update_database'
@@ -0,0 +1,48 @@
+import pytest
+
+from universe import group_share_classes, issuer_key, split_description
+
+
+def test_split_description():
+    assert split_description('Alphabet Inc. (Class A) - Communication Services') == (
+        'Alphabet Inc. (Class A)', 'Communication Services')
+    assert split_description('Apple Inc.') == ('Apple Inc.', '')
+
+
+@pytest.mark.parametrize('a, b', [
+    ('Alphabet Inc. (Class A) - Communication Services', 'Alphabet Inc. (Class C) - Communication Services'),
+    ('Alphabet Inc Class A', 'Alphabet Inc - Class C Capital Stock'),
+    ('Fox Corporation - Class A Common Stock', 'FOX CORPORATION, Class B'),
+    ('News Corp Class A', 'News Corp (Class B)'),
+])
+def test_share_classes_of_one_issuer_share_a_key(a, b):
+    assert issuer_key(a)
+    assert issuer_key(a) == issuer_key(b)
+
+
+@pytest.mark.parametrize('name', [
+    None,
+    '',
+    'Apple Inc.',
+    'Apple Inc. - Information Technology',
+    'Acme Class B Industries',
+    'Class A',
+])
+def test_names_without_a_trailing_class_have_no_key(name):
+    assert issuer_key(name) == ''
+
+
+def test_distinct_issuers_are_not_merged():
+    # Same leading words, different names before the class suffix
+    assert issuer_key('Liberty Media Corp Class A') != issuer_key('Liberty Broadband Corp Class A')
+
+
+def test_group_share_classes_keeps_order_and_primary():
+    groups = group_share_classes({
+        'GOOGL': 'Alphabet Inc. (Class A) - Communication Services',
+        'AAPL': 'Apple Inc. - Information Technology',
+        'GOOG': 'Alphabet Inc. (Class C) - Communication Services',
+        'ABNB': None,
+        'XYZ': None,
+    })
+    assert groups == {'GOOGL': ['GOOGL', 'GOOG'], 'AAPL': ['AAPL'], 'ABNB': ['ABNB'], 'XYZ': ['XYZ']}
@@ -0,0 +1,297 @@
+"""
+Screening universe.
+
+UNIVERSE_MODE selects what update_database works on:
+- "sp500"     : the 503 names of sp500.json (default)
+- "us_listed" : every active NASDAQ / NYSE / AMEX stock from LISTING_STATUS,
+                persisted in universe_member by sync_universe()
+
+The sp500.json file is served by a per-process UniverseRegistry (get_registry()):
+parsed once into (symbol, name, sector) entries and reloaded when the file changes.
+
+Share classes of one issuer (GOOGL / GOOG, FOXA / FOX, ...) are grouped by
+group_share_classes() so fundamentals, scoring and founder lookups run once per
+issuer; prices stay per symbol.
+"""
+import csv
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from database import get_session, UniverseMember, CompanyAnalysis
+from sharding import shard_groups
+
+UNIVERSE_MODE = os.getenv('UNIVERSE_MODE', 'sp500')
+UNIVERSE_FILE = os.getenv('UNIVERSE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sp500.json'))
+US_EXCHANGES = ('NASDAQ', 'NYSE', 'AMEX')
+SYNC_BATCH_SIZE = 1000
+# The file's mtime is checked at most this often
+RELOAD_CHECK_SECONDS = 2.0
+
+_registry = None
+_registry_lock = threading.Lock()
+
+# Trailing share-class suffix only: "Alphabet Inc. (Class A)", "Alphabet Inc Class C",
+# "Fox Corporation - Class B Common Stock"; "Acme Class B Industries" is a name, not a class
+_SHARE_CLASS = re.compile(
+    r'\s*[,(-]?\s*\bclass\s+[a-z0-9]{1,2}\b(?:\s+(?:common|capital|ordinary|subordinate|voting|shares?|stock))*\s*\)?\s*$',
+    re.IGNORECASE,
+)
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def split_description(description: str) -> Tuple[str, str]:
+    """ "Alphabet Inc. (Class A) - Communication Services" -> (name, GICS sector)."""
+    name, sep, sector = (description or '').rpartition(' - ')
+    if not sep:
+        return (description or '').strip(), ''
+    return name.strip(), sector.strip()
+
+
+def issuer_key(name: Optional[str]) -> str:
+    """
+    Issuer identity of a share-class security name: the name before its trailing class
+    suffix, case and punctuation dropped. '' for unknown names and for names without a
+    class suffix (warrants, units, preferreds of the same issuer stay separate).
+    """
+    if not name:
+        return ''
+    # LISTING_STATUS puts the class after " - ", the universe file puts the sector there
+    for candidate in (name, split_description(name)[0]):
+        match = _SHARE_CLASS.search(candidate)
+        if match and match.start() > 0:
+            return _NON_ALNUM.sub('', candidate[:match.start()].lower())
+    return ''
+
+
+def group_share_classes(names: Dict[str, Optional[str]]) -> Dict[str, List[str]]:
+    """
+    Group symbols by issuer. `names` maps symbol -> security name or "Name - Sector"
+    description. Returns primary symbol -> all its share classes (primary first), in the
+    order of `names`: the first listed class is the primary. Symbols without a share-class
+    name stand alone.
+    """
+    groups: Dict[str, List[str]] = {}
+    primary_of: Dict[str, str] = {}
+    for symbol, name in names.items():
+        key = issuer_key(name)
+        primary = primary_of.setdefault(key, symbol) if key else symbol
+        groups.setdefault(primary, []).append(symbol)
+    return groups
+
+
+def company_share_classes(companies: Iterable) -> Dict[str, List[str]]:
+    """Issuers of company_analysis rows (anything with symbol, sector and company_name)."""
+    return group_share_classes({c.symbol: c.sector or c.company_name for c in companies})
+
+
+def shard_company_symbols(session, shard) -> set:
+    """Symbols of company_analysis owned by `shard`, share classes of one issuer kept together."""
+    rows = session.query(CompanyAnalysis.symbol, CompanyAnalysis.sector, CompanyAnalysis.company_name).all()
+    return {symbol for symbols in shard_groups(company_share_classes(rows), shard).values() for symbol in symbols}
+
+
+class UniverseEntry(NamedTuple):
+    symbol: str
+    name: str
+    sector: str
+    description: str   # original "Name - Sector" string
+
+
+class UniverseRegistry:
+    """The universe file parsed once per process, reloaded when its mtime changes."""
+
+    def __init__(self, path: str = UNIVERSE_FILE):
+        self.path = path
+        self._entries: Dict[str, UniverseEntry] = {}
+        self._descriptions: Dict[str, str] = {}
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked < RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError as e:
+                if self._mtime is None:
+                    print(f"Erreur lors du chargement de {os.path.basename(self.path)}: {e}")
+                    self._mtime = 0
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, 'r') as f:
+                    raw = json.load(f)
+            except (OSError, ValueError) as e:
+                # File being rewritten: keep serving the previous version
+                print(f"Erreur lors du chargement de {os.path.basename(self.path)}: {e}")
+                return
+            entries = {}
+            for symbol, description in raw.items():
+                name, sector = split_description(description)
+                entries[symbol] = UniverseEntry(symbol, name, sector, description)
+            # Swap whole dicts so readers never see a half-built universe
+            self._entries = entries
+            self._descriptions = {symbol: e.description for symbol, e in entries.items()}
+            self._mtime = mtime
+
+    def entries(self) -> Dict[str, UniverseEntry]:
+        self._refresh()
+        return self._entries
+
+    def descriptions(self) -> Dict[str, str]:
+        """symbol -> "Name - Sector", in file order (read-only, shared)"""
+        self._refresh()
+        return self._descriptions
+
+    def symbols(self) -> List[str]:
+        return list(self.entries())
+
+    def share_classes(self) -> Dict[str, List[str]]:
+        """primary symbol -> the share classes of its issuer (see group_share_classes)"""
+        return group_share_classes(self.descriptions())
+
+    def get(self, symbol: str) -> Optional[UniverseEntry]:
+        return self.entries().get(symbol)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.entries()
+
+    def __len__(self) -> int:
+        return len(self.entries())
+
+
+def get_registry() -> UniverseRegistry:
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = UniverseRegistry()
+        return _registry
+
+
+def stream_listings(provider=None, csv_path: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """
+    Stream LISTING_STATUS rows one by one from the market-data provider, or from a
+    single local dump (LISTING_STATUS_CSV) so the universe can be rebuilt offline.
+    """
+    csv_path = csv_path or os.getenv('LISTING_STATUS_CSV')
+    if csv_path:
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            yield from csv.DictReader(f)
+        return
+    if provider is None:
+        from market_data import get_provider
+        provider = get_provider()
+    yield from provider.listings()
+
+
+def is_us_stock(row: Dict[str, str]) -> bool:
+    return row.get('assetType') == 'Stock' and row.get('exchange') in US_EXCHANGES
+
+
+def sync_universe(rows: Iterable[Dict[str, str]], session=None) -> Dict[str, int]:
+    """
+    Persist the US-stock rows of a LISTING_STATUS stream as the screening universe.
+    Rows are written in batches while the stream is consumed; members missing from
+    the new listing are marked Delisted.
+    """
+    own_session = session is None
+    session = session or get_session()
+    try:
+        known = {symbol for (symbol,) in session.query(UniverseMember.symbol)}
+        seen = set()
+        inserts, updates = [], []
+        stats = {'inserted': 0, 'updated': 0, 'delisted': 0}
+
+        def flush():
+            if inserts:
+                session.bulk_insert_mappings(UniverseMember, inserts)
+                stats['inserted'] += len(inserts)
+            if updates:
+                session.bulk_update_mappings(UniverseMember, updates)
+                stats['updated'] += len(updates)
+            session.commit()
+            inserts.clear()
+            updates.clear()
+
+        for row in rows:
+            if not is_us_stock(row):
+                continue
+            symbol = row['symbol'].strip()
+            if not symbol or symbol in seen:
+                continue
+            seen.add(symbol)
+            mapping = {
+                'symbol': symbol,
+                'name': row.get('name'),
+                'exchange': row.get('exchange'),
+                'asset_type': row.get('assetType'),
+                'ipo_date': row.get('ipoDate'),
+                'status': row.get('status') or 'Active',
+            }
+            (updates if symbol in known else inserts).append(mapping)
+            if len(inserts) + len(updates) >= SYNC_BATCH_SIZE:
+                flush()
+        flush()
+
+        gone = known - seen
+        if gone:
+            stats['delisted'] = (
+                session.query(UniverseMember)
+                .filter(UniverseMember.symbol.in_(list(gone)))
+                .update({UniverseMember.status: 'Delisted'}, synchronize_session=False)
+            )
+            session.commit()
+        print(f"Universe synced: {stats} ({len(seen)} active US stocks)")
+        return stats
+    finally:
+        if own_session:
+            session.close()
+
+
+def load_listed_universe(session=None) -> Dict[str, Optional[str]]:
+    """
+    Active universe members, largest market cap first (unknown caps last).
+    Values are the "Name - Sector" description when the company was already analyzed, else None.
+    """
+    own_session = session is None
+    session = session or get_session()
+    try:
+        rows = (
+            session.query(UniverseMember.symbol, UniverseMember.market_cap, CompanyAnalysis.sector)
+            .outerjoin(CompanyAnalysis, CompanyAnalysis.symbol == UniverseMember.symbol)
+            .filter(UniverseMember.status == 'Active')
+            .all()
+        )
+        rows.sort(key=lambda r: (-(r.market_cap or 0), r.symbol))
+        return {symbol: sector for symbol, _, sector in rows}
+    finally:
+        if own_session:
+            session.close()
+
+
+def listed_names(session, symbols: Optional[Iterable[str]] = None) -> Dict[str, str]:
+    """LISTING_STATUS security names of the universe members (issuer grouping before any OVERVIEW)."""
+    query = session.query(UniverseMember.symbol, UniverseMember.name)
+    if symbols is not None:
+        query = query.filter(UniverseMember.symbol.in_(list(symbols)))
+    return {symbol: name for symbol, name in query if name}
+
+
+def record_market_cap(session, symbol: str, market_cap: float):
+    """Copy a fetched market cap to the universe so the next cycles prioritize large names."""
+    if market_cap:
+        session.query(UniverseMember).filter_by(symbol=symbol).update(
+            {UniverseMember.market_cap: market_cap}, synchronize_session=False
+        )
+
+
+if __name__ == "__main__":
+    sync_universe(stream_listings())